@@ -0,0 +1,215 @@
+"""
+One-pass scanner for the conversation archive.
+
+The ingestion scripts used to find their inputs with several recursive
+globs over ARCHIVE_PATH (chats/*.json, checkpoint*.json, logs.json), each of
+which walks the whole tree. ArchiveScanner walks it once with os.scandir
+and classifies every file by format. It also returns a fingerprint of the
+tree built from each file's path, size and mtime.
+
+Directory listings are cached by directory mtime, which only changes when
+entries are added, removed or renamed (listings of directories modified in
+the last couple of seconds are not cached). Rescanning an unchanged tree
+therefore costs one stat per directory and no directory listing; files are
+only stat'ed when the fingerprint is asked for. The cache can be persisted
+between runs.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCAN_CACHE_PATH = os.path.expanduser("~/.plug_memory/archive_scan.json")
+# Listings of directories modified more recently than this are not cached,
+# since filesystem mtimes are coarse (a clock tick on Linux, 2s on FAT).
+RACY_MTIME_NS = 2_000_000_000
+
+SESSION = "session"  # chats/*.json
+CHECKPOINT = "checkpoint"  # checkpoint*.json
+LOGS = "logs"  # logs.json
+FILE_KINDS = (SESSION, CHECKPOINT, LOGS)
+
+
+def classify(directory: str, name: str) -> Optional[str]:
+    """Returns the kind of conversation file `name` is, or None."""
+    if not name.endswith(".json"):
+        return None
+    if os.path.basename(directory) == "chats":
+        return SESSION
+    if name.startswith("checkpoint"):
+        return CHECKPOINT
+    if name == "logs.json":
+        return LOGS
+    return None
+
+
+class ArchiveScan:
+    """The conversation files found by a scan, by kind."""
+
+    def __init__(self, root: str, kinds: Dict[str, str]):
+        """
+        Args:
+            root: Directory that was scanned
+            kinds: Kind of each conversation file, by path
+        """
+        self.root = root
+        self.kinds = kinds
+        self.files: Dict[str, List[str]] = {kind: [] for kind in FILE_KINDS}
+        for path in sorted(kinds):
+            self.files[kinds[path]].append(path)
+        self._stats: Optional[Dict[str, Tuple[int, int]]] = None
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def session_files(self) -> List[str]:
+        return self.files[SESSION]
+
+    @property
+    def checkpoint_files(self) -> List[str]:
+        return self.files[CHECKPOINT]
+
+    @property
+    def logs_files(self) -> List[str]:
+        return self.files[LOGS]
+
+    def all_files(self) -> List[str]:
+        """Session, then checkpoint, then logs files."""
+        return self.session_files + self.checkpoint_files + self.logs_files
+
+    @property
+    def stats(self) -> Dict[str, Tuple[int, int]]:
+        """(size, mtime_ns) per file, read on first use."""
+        if self._stats is None:
+            self._stats = {}
+            for path in sorted(self.kinds):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Deleted since the directory was listed
+                self._stats[path] = (stat.st_size, stat.st_mtime_ns)
+        return self._stats
+
+    @property
+    def fingerprint(self) -> str:
+        """A hash of every file's path, size and mtime; it changes with any of them."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for path, (size, mtime_ns) in self.stats.items():
+                relpath = os.path.relpath(path, self.root)
+                digest.update(f"{relpath}\0{size}\0{mtime_ns}\n".encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+
+class ArchiveScanner:
+    """Scans an archive in a single walk, reusing listings of unchanged directories."""
+
+    def __init__(self, root: str, cache_path: Optional[str] = None):
+        """
+        Args:
+            root: Archive directory to scan
+            cache_path: JSON file the directory listings are persisted to, so
+                they survive between runs. Without it they are kept in memory.
+        """
+        self.root = root
+        self.cache_path = cache_path
+        self.listings_reused = 0
+        self.directories_listed = 0
+        # dir path -> {"mtime_ns", "dirs": [names], "files": {name: kind}}
+        self._listings: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(
+                f"Ignoring unreadable archive scan cache {self.cache_path}: {e}"
+            )
+            return {}
+        if not isinstance(data, dict) or data.get("root") != self.root:
+            return {}
+        return data.get("listings", {})
+
+    def save(self) -> None:
+        """Atomically persist the directory listings, if there is a cache path."""
+        if self.cache_path is None:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"root": self.root, "listings": self._listings}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _listing(self, directory: str, mtime_ns: int) -> Dict:
+        """Returns the subdirectories and conversation files of a directory."""
+        cached = self._listings.get(directory)
+        if cached is not None and cached["mtime_ns"] == mtime_ns:
+            self.listings_reused += 1
+            return cached
+
+        self.directories_listed += 1
+        dirs, files = [], {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Hidden entries are skipped, like glob's "**" does.
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                    continue
+                kind = classify(directory, entry.name)
+                if kind is not None:
+                    files[entry.name] = kind
+        listing = {"mtime_ns": mtime_ns, "dirs": dirs, "files": files}
+        # A directory modified moments ago may change again within the same
+        # mtime tick, so its listing can't be trusted on the next scan yet.
+        if time.time_ns() - mtime_ns > RACY_MTIME_NS:
+            self._listings[directory] = listing
+        else:
+            self._listings.pop(directory, None)
+        return listing
+
+    def scan(self) -> ArchiveScan:
+        """Walks the archive once and returns the conversation files in it."""
+        kinds: Dict[str, str] = {}
+        seen = set()
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            try:
+                listing = self._listing(directory, os.stat(directory).st_mtime_ns)
+            except OSError as e:
+                logger.warning(f"Skipping unreadable directory {directory}: {e}")
+                continue
+            seen.add(directory)
+            pending.extend(os.path.join(directory, name) for name in listing["dirs"])
+            for name, kind in listing["files"].items():
+                kinds[os.path.join(directory, name)] = kind
+
+        # Forget directories that no longer exist.
+        for directory in set(self._listings) - seen:
+            del self._listings[directory]
+        return ArchiveScan(self.root, kinds)
+
+
+def scan_archive(root: str, cache_path: Optional[str] = None) -> ArchiveScan:
+    """Scans an archive once, optionally persisting the listings to `cache_path`."""
+    scanner = ArchiveScanner(root, cache_path)
+    result = scanner.scan()
+    scanner.save()
+    return result
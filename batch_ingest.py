@@ -1,10 +1,44 @@
 import os
+import logging
 import json
-import glob
-import uuid
-from typing import List, Dict
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Iterable, Iterator, Optional, Set, Tuple
 from sentence_transformers import SentenceTransformer
 import qdrant_client
+from ingest_manifest import IngestManifest, file_fingerprint, make_point_id
+from ingest_journal import IngestJournal
+from ingest_generation import IngestGeneration
+from dedup import DedupIndex
+from content_store import SLIM_PAYLOADS, ContentStore, slim_points
+from stale_points import StalePointCleaner, with_source_version
+from collection_schema import ensure_collection, with_timestamp_epoch
+from embedding_backend import (
+    BACKENDS,
+    EMBEDDING_BACKEND,
+    backend_kwargs,
+    cache_model_name,
+)
+from embedding_daemon import connect_embedding_model
+from upsert_writer import (
+    AdaptiveBatchSizer,
+    UpsertWriter,
+    UPSERT_MAX_IN_FLIGHT,
+    UPSERT_RETRIES,
+    UPSERT_TARGET_BYTES,
+    UPSERT_TARGET_LATENCY,
+)
+from dead_letter import DeadLetterQueue
+from embedding_cache import EmbeddingCache, encode_with_cache
+from json_stream import extract_messages, iter_messages  # noqa: F401
+from archive_scanner import ARCHIVE_SCAN_CACHE_PATH, scan_archive
+import chunking
+from chunking import chunk_text
+from packing import join_pack, pack_messages, packed_message_refs
 
 # --- CONFIGURATION ---
 QDRANT_HOST = "localhost"
@@ -13,6 +47,11 @@ COLLECTION_NAME = "codex_history"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 VECTOR_SIZE = 384
 ARCHIVE_PATH = os.path.expanduser("~/.gemini/tmp")
+EMBED_BATCH_SIZE = 256  # Chunks collected (across files) per model.encode() call
+ENCODE_BATCH_SIZE = 16  # Forward-pass batch size inside a single encode() call
+PIPELINE_QUEUE_SIZE = 8  # Max items buffered between pipeline stages
+MANIFEST_SAVE_EVERY = 25  # Persist the ingest manifest every N completed files
+PARSE_WORKERS = 1  # Processes used to parse and chunk files (1 = in-thread)
 
 # --- HELPER FUNCTIONS ---
 
@@ -22,124 +61,702 @@ def get_qdrant_client():
     return qdrant_client.QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
 
 
-def get_embedding_model():
+def get_embedding_model(backend: Optional[str] = None):
     """Initializes and returns the SentenceTransformer model."""
-    print(f"⏳ Loading embedding model: {EMBEDDING_MODEL}...")
-    model = SentenceTransformer(EMBEDDING_MODEL)
+    backend = backend or EMBEDDING_BACKEND
+    print(f"⏳ Loading embedding model: {EMBEDDING_MODEL} ({backend} backend)...")
+    model = connect_embedding_model(
+        lambda: SentenceTransformer(EMBEDDING_MODEL, **backend_kwargs(backend)),
+        EMBEDDING_MODEL,
+        backend,
+    )
     print("✅ Model loaded.")
     return model
 
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    """Splits a long text into smaller, overlapping chunks."""
-    if not isinstance(text, str):
-        return []
-    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size - overlap)]
+def get_commit_id(file_path: str) -> str:
+    """Extracts the commit_id from a file path (the directory above 'chats')."""
+    path_parts = file_path.split(os.sep)
+    if "chats" in path_parts:
+        chats_index = path_parts.index("chats")
+        if chats_index > 0:
+            return path_parts[chats_index - 1]
+    return "unknown"
+
+
+def message_key(entry: Dict, index: int) -> str:
+    """
+    Returns a key identifying a message within its file. logs.json restarts
+    messageId for every session, so it is qualified with the sessionId;
+    checkpoint messages have no id at all and fall back to their position.
+    """
+    if entry.get("id"):
+        return str(entry["id"])
+    if entry.get("messageId") is not None:
+        return f"{entry.get('sessionId')}:{entry['messageId']}"
+    return f"#{index}"
+
+
+def extract_text(entry: Dict) -> str:
+    """Extracts the text content of a message entry, whatever its format."""
+    if "content" in entry:
+        # session.json format
+        return entry.get("content", "")
+    if "message" in entry:
+        # logs.json format
+        return entry.get("message", "")
+    if "parts" in entry:
+        # checkpoint.json format
+        parts = entry.get("parts", [])
+        if parts and "text" in parts[0]:
+            return parts[0]["text"]
+    return ""
 
 
 # --- MAIN LOGIC ---
 
 
+def iter_message_texts(file_path: str, source: str) -> Iterator[Tuple]:
+    """Yields (session, text, (index, entry)) for each non-empty message of a file."""
+    for index, entry in enumerate(iter_messages(file_path)):
+        if not isinstance(entry, dict):
+            continue
+        text_content = extract_text(entry)
+        if not text_content:
+            continue
+        # logs.json interleaves sessions; other files hold a single one.
+        session = entry.get("sessionId") or source
+        yield session, text_content, (index, entry)
+
+
+def pack_record(
+    file_path: str, source: str, commit_id: str, group: List[Tuple[str, Tuple]]
+) -> Dict:
+    """
+    Builds the record of a chunk holding several short messages. Its payload
+    lists each message's key, timestamp and (start, end) offsets in the
+    content; event_type lists the distinct types it contains, which Qdrant
+    keyword filters match element-wise.
+    """
+    texts = [text for text, _ in group]
+    entries = [entry for _, (_, entry) in group]
+    keys = [message_key(entry, index) for _, (index, entry) in group]
+    content, offsets = join_pack(texts)
+    event_types = [entry.get("type") or entry.get("role") for entry in entries]
+
+    payload = with_timestamp_epoch(
+        {
+            "content": content,
+            "timestamp": entries[0].get("timestamp"),
+            "event_type": list(dict.fromkeys(event_types)),
+            "original_message_id": entries[0].get("id") or entries[0].get("messageId"),
+            "source_file": os.path.basename(file_path),
+            "source_relpath": source,
+            "commit_id": commit_id,
+            "chunk_index": 0,
+            "packed_messages": packed_message_refs(
+                keys, [entry.get("timestamp") for entry in entries], offsets
+            ),
+        }
+    )
+    # Keyed by the first message, so a pack that grows keeps its point.
+    point_id = make_point_id(source, f"pack:{keys[0]}", 0)
+    return {"id": point_id, "payload": payload, "source_path": file_path}
+
+
+def iter_chunk_records(
+    file_path: str, commit_id: str, pack: bool = False
+) -> Iterator[Dict]:
+    """
+    Yields a conversation file's chunks, ready to be embedded. Large files
+    are streamed, so chunks are produced before the whole file has been read.
+    With `pack`, runs of consecutive short messages share a chunk.
+    Raises json.JSONDecodeError or OSError if the file cannot be parsed.
+    """
+    source = os.path.relpath(file_path, ARCHIVE_PATH)
+    messages = iter_message_texts(file_path, source)
+    if pack:
+        groups = pack_messages(messages)
+    else:
+        groups = ([(text, item)] for _, text, item in messages)
+
+    for group in groups:
+        if len(group) > 1:
+            yield pack_record(file_path, source, commit_id, group)
+            continue
+
+        text_content, (index, entry) = group[0]
+        key = message_key(entry, index)
+        for i, chunk in enumerate(chunk_text(text_content)):
+            # Content-derived ID: re-ingesting the file overwrites this point.
+            point_id = make_point_id(source, key, i)
+
+            payload = with_timestamp_epoch(
+                {
+                    "content": chunk,
+                    "timestamp": entry.get("timestamp"),
+                    "event_type": entry.get("type") or entry.get("role"),
+                    "original_message_id": entry.get("id") or entry.get("messageId"),
+                    "source_file": os.path.basename(file_path),
+                    "source_relpath": source,
+                    "commit_id": commit_id,
+                    "chunk_index": i,
+                }
+            )
+            yield {"id": point_id, "payload": payload, "source_path": file_path}
+
+
+def build_chunk_records(
+    file_path: str, commit_id: str, pack: bool = False
+) -> List[Dict]:
+    """Reads a conversation file and returns its chunks, ready to be embedded."""
+    try:
+        return list(iter_chunk_records(file_path, commit_id, pack))
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"⚠️  Could not read or parse {os.path.basename(file_path)}: {e}")
+        return []
+
+
+def embed_records(
+    records: List[Dict],
+    model: SentenceTransformer,
+    batch_size: int = ENCODE_BATCH_SIZE,
+    cache: Optional[EmbeddingCache] = None,
+) -> List[Dict]:
+    """
+    Embeds chunk records with a single encode call and returns Qdrant points.
+    SentenceTransformer sorts the texts by length before splitting them into
+    forward passes of `batch_size`, so larger calls waste less on padding.
+    With a cache, only chunks that were never embedded before are encoded.
+    """
+    if not records:
+        return []
+    vectors = encode_with_cache(
+        model, [r["payload"]["content"] for r in records], cache, batch_size
+    )
+    return [
+        {
+            "id": r["id"],
+            "vector": vector.tolist(),
+            "payload": r["payload"],
+            "source_path": r.get("source_path"),
+            "seq": r.get("seq"),
+        }
+        for r, vector in zip(records, vectors)
+    ]
+
+
 def process_conversation_file(
-    file_path: str, model: SentenceTransformer, commit_id: str
+    file_path: str,
+    model: SentenceTransformer,
+    commit_id: str,
+    batch_size: int = ENCODE_BATCH_SIZE,
 ) -> List[Dict]:
     """Reads a session JSON file, extracts data, and creates points for Qdrant."""
-    points_to_upsert = []
+    return embed_records(build_chunk_records(file_path, commit_id), model, batch_size)
+
+
+# --- PIPELINE ---
+
+
+def _parse_file(
+    file_path: str, with_fingerprint: bool, pack: bool = False
+) -> Tuple[str, Optional[Dict], List[Dict]]:
+    """
+    Fingerprints, parses and chunks one file in a worker process. Returns no
+    fingerprint if the file could not be read or parsed, so it is not marked
+    as done.
+    """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError) as e:
+        fingerprint = file_fingerprint(file_path) if with_fingerprint else None
+        records = list(iter_chunk_records(file_path, get_commit_id(file_path), pack))
+    except (json.JSONDecodeError, OSError) as e:
         print(f"⚠️  Could not read or parse {os.path.basename(file_path)}: {e}")
-        return []
+        return file_path, None, []
+    return file_path, fingerprint, records
+
+
+def _init_parse_worker(chunk_mode: str) -> None:
+    """Spawned workers start from a fresh import; keep the parent's chunk mode."""
+    chunking.CHUNK_MODE = chunk_mode
+
+
+def _iter_parsed_files(
+    files: Iterable[str], workers: int, with_fingerprint: bool, pack: bool = False
+) -> Iterator[Tuple[str, Optional[Dict], Iterable[Dict]]]:
+    """
+    Yields (path, fingerprint, chunk records) per file. In this thread the
+    records are a lazy generator, so large files stream; from the process
+    pool they arrive as a list. At most two files per worker are in flight,
+    so a slow consumer also throttles the pool instead of letting parsed
+    chunks pile up in memory.
+    """
+    if workers <= 1:
+        for file_path in files:
+            try:
+                fingerprint = file_fingerprint(file_path) if with_fingerprint else None
+            except OSError as e:
+                # Deleted or rotated since the archive was scanned.
+                print(f"⚠️  Could not read or parse {os.path.basename(file_path)}: {e}")
+                yield file_path, None, []
+                continue
+            yield file_path, fingerprint, iter_chunk_records(
+                file_path, get_commit_id(file_path), pack
+            )
+        return
+
+    # Spawned, not forked: this runs in the parser thread after torch and the
+    # tokenizer have started their own threads, and forking then can deadlock.
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_parse_worker,
+        initargs=(chunking.CHUNK_MODE,),
+    )
+    in_flight = set()
+    try:
+        for file_path in files:
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            in_flight.add(pool.submit(_parse_file, file_path, with_fingerprint, pack))
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+_DONE = object()  # Sentinel that marks the end of a pipeline stage
+
+
+def _sequenced(records: Iterable[Dict], skip: Set[int]) -> Iterator[Dict]:
+    """Numbers a file's chunk records in order, leaving out those in `skip`."""
+    for seq, record in enumerate(records):
+        if seq not in skip:
+            record["seq"] = seq
+            yield record
+
+
+def _slices(items: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """Groups an iterable into lists of at most `size` items."""
+    part = []
+    for item in items:
+        part.append(item)
+        if len(part) >= size:
+            yield part
+            part = []
+    if part:
+        yield part
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Puts an item on a bounded queue, giving up if the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
-    # Handle different file formats
-    messages = []
-    if isinstance(data, list):
-        # Check if it's logs.json format (has sessionId, messageId, type, message)
-        if data and "sessionId" in data[0]:
-            # logs.json format
-            messages = data
-        else:
-            # checkpoint.json format (array of role/parts messages)
-            messages = data
-    elif isinstance(data, dict):
-        # session.json format (has messages array)
-        messages = data.get("messages", [])
-
-    for entry in messages:
-        # Extract text content based on format
-        text_content = ""
-        if "content" in entry:
-            # session.json format
-            text_content = entry.get("content", "")
-        elif "message" in entry:
-            # logs.json format
-            text_content = entry.get("message", "")
-        elif "parts" in entry:
-            # checkpoint.json format
-            parts = entry.get("parts", [])
-            if parts and "text" in parts[0]:
-                text_content = parts[0]["text"]
 
-        if not text_content:
+def _get(q: queue.Queue, stop: threading.Event):
+    """Gets an item from a queue, returning the sentinel if the pipeline stops."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
             continue
+    return _DONE
+
+
+def run_pipeline(
+    conversation_files: Iterable[str],
+    model: SentenceTransformer,
+    client,
+    batch_size: int = EMBED_BATCH_SIZE,
+    encode_batch_size: int = ENCODE_BATCH_SIZE,
+    manifest: Optional[IngestManifest] = None,
+    workers: int = PARSE_WORKERS,
+    max_in_flight: int = UPSERT_MAX_IN_FLIGHT,
+    cache: Optional[EmbeddingCache] = None,
+    pack: bool = False,
+    journal: Optional[IngestJournal] = None,
+    resume: bool = False,
+    dedup: Optional[DedupIndex] = None,
+    retries: int = 0,
+    dead_letter: Optional[DeadLetterQueue] = None,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    content_store: Optional[ContentStore] = None,
+    cleaner: Optional[StalePointCleaner] = None,
+    generation: Optional[IngestGeneration] = None,
+) -> int:
+    """
+    Ingests files through three overlapping stages: a parser thread that reads
+    and chunks files, the encoder (this thread) that embeds chunks in batches
+    that may span several files, and an UpsertWriter that sends those batches
+    to Qdrant without waiting for indexing. The parser feeds a bounded queue
+    and the writer bounds its in-flight requests, so a slow stage throttles
+    the others instead of buffering the whole archive. Returns the points
+    upserted.
+
+    With a manifest, files whose fingerprint is unchanged are skipped, and a
+    file is recorded only once all of its points have been upserted. With
+    more than one worker, parsing and chunking run in a process pool that
+    feeds the same bounded queue. With `pack`, consecutive short messages
+    are packed into shared chunks.
+
+    With a journal, every acknowledged batch is recorded against the file
+    versions it came from, and with `resume` the chunks a previous run
+    already committed are skipped before they are embedded. With a dedup
+    index, chunks that duplicate one already ingested are skipped too.
+
+    Failed upserts are retried `retries` times with backoff. Batches that
+    still fail abort the run, unless a dead-letter queue is given: then they
+    are saved there with their vectors, and their files count as complete.
+    With a batch sizer, upserts are cut to its adaptive size instead of
+    following the encode batches. With a content store, chunk text is
+    kept there and left out of the Qdrant payloads.
+
+    With a cleaner, the points of each file are stamped with its content
+    hash, and once a file is complete its points from other versions of the
+    file are deleted.
+
+    With a generation counter, it is bumped after every accepted batch, so
+    cached search results are dropped as the new points arrive.
+    """
+    chunk_queue: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    # Points still to be upserted per file, files still being parsed, and
+    # the fingerprint to record in the manifest once a file is complete.
+    remaining: Dict[str, int] = {}
+    parsing = set()
+    fingerprints: Dict[str, Optional[Dict]] = {}
+    completed = [0]
+    finished: List[str] = []  # Recorded in the manifest since the last save
+    superseded: List[Tuple[str, str]] = []  # Complete files to clean up after
+    lock = threading.Lock()
+
+    def save_progress():
+        manifest.save()
+        # Their journal entries aren't needed once the manifest is on disk.
+        if journal is not None:
+            journal.forget(finished)
+        finished.clear()
+
+    def file_done(file_path: str):
+        del remaining[file_path]
+        fingerprint = fingerprints.pop(file_path, None)
+        if cleaner is not None and fingerprint is not None:
+            superseded.append((file_path, fingerprint["sha256"]))
+        if manifest is None or fingerprint is None:
+            return
+        manifest.record(file_path, fingerprint)
+        finished.append(file_path)
+        completed[0] += 1
+        if completed[0] % MANIFEST_SAVE_EVERY == 0:
+            save_progress()
+
+    def delete_superseded():
+        # Runs in this thread once a file's new points are all acknowledged;
+        # Qdrant applies the delete after them.
+        with lock:
+            done, superseded[:] = list(superseded), []
+        for file_path, sha256 in done:
+            try:
+                deleted = cleaner.delete_superseded(
+                    os.path.relpath(file_path, ARCHIVE_PATH),
+                    sha256,
+                    os.path.basename(file_path),
+                    get_commit_id(file_path),
+                )
+            except Exception as e:
+                print(f"⚠️  Could not delete stale points of {file_path}: {e}")
+                continue
+            if deleted:
+                print(
+                    f"🧹 Deleted {deleted} stale points of {os.path.basename(file_path)}"
+                )
 
-        chunks = chunk_text(text_content)
-        for i, chunk in enumerate(chunks):
-            vector = model.encode(chunk).tolist()
-
-            # CORRECTED: Generate a new, valid UUID for each point.
-            point_id = str(uuid.uuid4())
-
-            payload = {
-                "content": chunk,
-                "timestamp": entry.get("timestamp"),
-                "event_type": entry.get("type") or entry.get("role"),
-                "original_message_id": entry.get("id") or entry.get("messageId"),
-                "source_file": os.path.basename(file_path),
-                "commit_id": commit_id,
-                "chunk_index": i,
-            }
-
-            points_to_upsert.append(
-                {"id": point_id, "vector": vector, "payload": payload}
+    def changed_files() -> Iterator[str]:
+        for file_path in conversation_files:
+            if manifest is not None and manifest.is_unchanged(file_path):
+                print(f"⏭️  Unchanged, skipping: {os.path.basename(file_path)}")
+                continue
+            yield file_path
+
+    def parse_stage():
+        try:
+            with_fingerprint = (
+                manifest is not None or journal is not None or cleaner is not None
+            )
+            parsed = _iter_parsed_files(
+                changed_files(), workers, with_fingerprint, pack
             )
+            for file_path, fingerprint, records in parsed:
+                if stop.is_set():
+                    return
+                print(
+                    f"\n--- Processing: {os.path.basename(file_path)} (from commit {get_commit_id(file_path)}) ---"
+                )
+                with lock:
+                    fingerprints[file_path] = fingerprint
+                    remaining[file_path] = 0
+                    parsing.add(file_path)
+
+                # Number the chunks, dropping those a previous run committed.
+                skip = set()
+                if resume and journal is not None and fingerprint is not None:
+                    skip = journal.committed(file_path, fingerprint["sha256"])
+                    if skip:
+                        print(f"⏩ Resuming: {len(skip)} chunks already committed.")
+                records = _sequenced(records, skip)
+                if cleaner is not None and fingerprint is not None:
+                    records = with_source_version(records, fingerprint["sha256"])
+                if dedup is not None:
+                    records = dedup.filter(records)
+
+                # Hand chunks to the encoder in slices as they are parsed.
+                count = 0
+                try:
+                    for part in _slices(records, batch_size):
+                        with lock:
+                            remaining[file_path] += len(part)
+                        count += len(part)
+                        if not _put(chunk_queue, part, stop):
+                            return
+                except (json.JSONDecodeError, OSError) as e:
+                    print(
+                        f"⚠️  Could not read or parse {os.path.basename(file_path)}: {e}"
+                    )
+                    with lock:
+                        # Retry the file next run instead of marking it done.
+                        fingerprints[file_path] = None
+
+                with lock:
+                    parsing.discard(file_path)
+                    if remaining[file_path] == 0:
+                        file_done(file_path)
+                if not count:
+                    print("No valid entries found in this file.")
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(chunk_queue, _DONE, stop)
+
+    def settled(points: List[Dict]):
+        with lock:
+            if journal is not None:
+                batches: Dict[Tuple[str, str], List[int]] = {}
+                for p in points:
+                    fingerprint = fingerprints.get(p["source_path"])
+                    if fingerprint is not None and p.get("seq") is not None:
+                        key = (p["source_path"], fingerprint["sha256"])
+                        batches.setdefault(key, []).append(p["seq"])
+                journal.record(batches)
+            for p in points:
+                remaining[p["source_path"]] -= 1
+                if remaining[p["source_path"]] == 0 and p["source_path"] not in parsing:
+                    file_done(p["source_path"])
+
+    def committed(points: List[Dict]):
+        settled(points)
+        print(f"Upserted {len(points)} points to Qdrant.")
 
-    return points_to_upsert
+    def dead_lettered(points: List[Dict], error: Exception):
+        # The vectors are kept on disk for `dead_letter.py replay`, so the
+        # file needs no re-embedding.
+        settled(points)
+        print(f"⚠️  Saved {len(points)} points to the dead-letter queue: {error}")
+
+    parser = threading.Thread(target=parse_stage, name="ingest-parser", daemon=True)
+    parser.start()
+    writer = UpsertWriter(
+        client,
+        COLLECTION_NAME,
+        max_in_flight=max_in_flight,
+        on_commit=committed,
+        retries=retries,
+        dead_letter=dead_letter,
+        on_dead_letter=dead_lettered,
+        batch_sizer=batch_sizer,
+        generation=generation,
+    )
 
+    pending: List[Dict] = []
+    try:
+        while True:
+            records = _get(chunk_queue, stop)
+            if records is not _DONE:
+                pending.extend(records)
+            while len(pending) >= batch_size or (records is _DONE and pending):
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                points = embed_records(batch, model, encode_batch_size, cache)
+                if content_store is not None:
+                    points = slim_points(points, content_store)
+                # Blocks while max_in_flight batches are unacknowledged.
+                writer.submit(points)
+                if cleaner is not None:
+                    delete_superseded()
+            if records is _DONE or stop.is_set():
+                break
+        writer.close()
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        stop.set()
+        parser.join()
+        if errors:
+            writer.abort()
+        if manifest is not None:
+            save_progress()
+        if cleaner is not None:
+            delete_superseded()
+
+    if errors:
+        raise errors[0]
+    return writer.points_written
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Batch ingest conversation logs")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help="Number of chunks collected per model.encode() call",
+    )
+    parser.add_argument(
+        "--encode-batch-size",
+        type=int,
+        default=ENCODE_BATCH_SIZE,
+        help="Forward-pass batch size used inside each encode() call",
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=BACKENDS,
+        default=EMBEDDING_BACKEND,
+        help="Embedding backend: torch, onnx, or the int8-quantized onnx-int8",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-ingest every file, ignoring the ingest manifest",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=PARSE_WORKERS,
+        help="Processes used to parse and chunk files in parallel",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=UPSERT_MAX_IN_FLIGHT,
+        help="Upsert requests allowed in flight before the embedder blocks",
+    )
+    parser.add_argument(
+        "--upsert-target-mb",
+        type=float,
+        default=UPSERT_TARGET_BYTES / (1024 * 1024),
+        help="Request body budget for one upsert batch, in MB",
+    )
+    parser.add_argument(
+        "--upsert-target-latency",
+        type=float,
+        default=UPSERT_TARGET_LATENCY,
+        help="Seconds an upsert batch should take; batches are sized to match",
+    )
+    parser.add_argument(
+        "--upsert-retries",
+        type=int,
+        default=UPSERT_RETRIES,
+        help="Retries of a failed upsert batch before it goes to the dead-letter queue",
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Always re-encode chunks instead of reading the on-disk cache",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Embed chunks even if they duplicate an already ingested chunk",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip chunks an interrupted run already committed, per the ingest journal",
+    )
+    parser.add_argument(
+        "--slim-payloads",
+        action="store_true",
+        default=SLIM_PAYLOADS,
+        help="Keep chunk text in the local content store instead of in Qdrant",
+    )
+    parser.add_argument(
+        "--no-cleanup",
+        action="store_true",
+        help="Keep the points of rewritten and deleted files",
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        help="Pack consecutive short messages of a session into shared chunks",
+    )
+    return parser.parse_args(argv)
+
+
+def delete_removed_files(
+    cleaner: StalePointCleaner, manifest: IngestManifest, files: List[str]
+) -> int:
+    """
+    Deletes the points of every file in the manifest that is no longer in
+    the archive and drops it from the manifest. Returns the points deleted.
+    """
+    present = {os.path.abspath(f) for f in files}
+    deleted = 0
+    for file_path in list(manifest.entries):
+        if file_path in present or os.path.exists(file_path):
+            continue
+        deleted += cleaner.delete_file(
+            os.path.relpath(file_path, ARCHIVE_PATH),
+            os.path.basename(file_path),
+            get_commit_id(file_path),
+        )
+        manifest.forget(file_path)
+    manifest.save()
+    return deleted
 
-def main():
+
+def main(argv: Optional[List[str]] = None):
     """Main function to run the batch ingestion process."""
+    args = parse_args(argv)
+    # Show the upsert writer's batch sizes and throughput, without a line
+    # per HTTP request from the Qdrant client.
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
     client = get_qdrant_client()
-    model = get_embedding_model()
+    model = get_embedding_model(args.embedding_backend)
 
-    # 1. Create the collection if it doesn't exist
-    try:
-        client.get_collection(collection_name=COLLECTION_NAME)
+    # 1. Create the collection and its payload indexes if they don't exist
+    if ensure_collection(client, COLLECTION_NAME, VECTOR_SIZE):
+        print(f"✅ Collection '{COLLECTION_NAME}' created.")
+    else:
         print(f"ℹ️  Collection '{COLLECTION_NAME}' already exists.")
-    except Exception:
-        print(f"⏳ Collection '{COLLECTION_NAME}' not found. Creating it...")
-        client.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=qdrant_client.http.models.VectorParams(
-                size=VECTOR_SIZE, distance=qdrant_client.http.models.Distance.COSINE
-            ),
-        )
-        print("✅ Collection created.")
 
     # 2. Find all JSON files that might contain conversation data
     print(f"🔍 Scanning for conversation files in {ARCHIVE_PATH}...")
-    # Include session files, checkpoint files, and logs.json files
-    conversation_files = []
-    conversation_files.extend(
-        glob.glob(os.path.join(ARCHIVE_PATH, "**", "chats", "*.json"), recursive=True)
-    )
-    conversation_files.extend(
-        glob.glob(os.path.join(ARCHIVE_PATH, "**", "checkpoint*.json"), recursive=True)
-    )
-    conversation_files.extend(
-        glob.glob(os.path.join(ARCHIVE_PATH, "**", "logs.json"), recursive=True)
-    )
+    # Session files, checkpoint files and logs.json files, in one walk
+    scan = scan_archive(ARCHIVE_PATH, ARCHIVE_SCAN_CACHE_PATH)
+    conversation_files = scan.all_files()
 
     if not conversation_files:
         print("❌ No conversation files found. Please check the ARCHIVE_PATH.")
@@ -147,46 +764,84 @@ def main():
 
     print(f"✅ Found {len(conversation_files)} conversation files to process.")
 
-    total_points = 0
-    # 3. Process each file and upsert to Qdrant
-    for file_path in conversation_files:
-        # Extract commit_id from path - handle different directory structures
-        path_parts = file_path.split(os.sep)
-        if "chats" in path_parts:
-            chats_index = path_parts.index("chats")
-            if chats_index > 0:
-                commit_id = path_parts[chats_index - 1]
-            else:
-                commit_id = "unknown"
-        else:
-            commit_id = "unknown"
+    # 3. Parse, embed and upsert every file through the pipeline
+    manifest = IngestManifest()
+    if args.force:
+        manifest.entries.clear()
+    cache = (
+        None
+        if args.no_embedding_cache
+        else EmbeddingCache(cache_model_name(EMBEDDING_MODEL, args.embedding_backend))
+    )
+    journal = IngestJournal()
+    dedup = None if args.no_dedup else DedupIndex()
+    dead_letter = DeadLetterQueue()
+    content_store = ContentStore() if args.slim_payloads else None
+    generation = IngestGeneration()
+    sizer = AdaptiveBatchSizer(
+        target_bytes=int(args.upsert_target_mb * 1024 * 1024),
+        target_latency=args.upsert_target_latency,
+    )
+    cleaner = (
+        None
+        if args.no_cleanup
+        else StalePointCleaner(
+            client, COLLECTION_NAME, content_store, dedup, generation
+        )
+    )
+    if cleaner is not None:
+        removed = delete_removed_files(cleaner, manifest, conversation_files)
+        if removed:
+            print(f"🗑️  Deleted {removed} points of files no longer in the archive.")
+    if not args.resume:
+        journal.clear()
+    start = time.perf_counter()
+    total_points = run_pipeline(
+        conversation_files,
+        model,
+        client,
+        args.batch_size,
+        args.encode_batch_size,
+        manifest=manifest,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        cache=cache,
+        pack=args.pack,
+        journal=journal,
+        resume=args.resume,
+        dedup=dedup,
+        retries=args.upsert_retries,
+        dead_letter=dead_letter,
+        batch_sizer=sizer,
+        content_store=content_store,
+        cleaner=cleaner,
+        generation=generation,
+    )
+    elapsed = time.perf_counter() - start
 
+    print(f"\n\n🎉🎉🎉 Grand Forging Complete! 🎉🎉🎉")
+    print(f"Total points upserted to the Codex: {total_points}")
+    if elapsed > 0:
+        print(f"Throughput: {total_points / elapsed:.1f} chunks/sec")
+    stats = sizer.summary()
+    if stats["batches"]:
         print(
-            f"\n--- Processing: {os.path.basename(file_path)} (from commit {commit_id}) ---"
+            f"Upsert batches: {stats['min_size']}-{stats['max_size']} points "
+            f"(mean {stats['mean_size']:.0f}, final {stats['final_size']}), "
+            f"{stats['mean_latency']:.2f}s per request, "
+            f"{stats['mb_per_sec']:.1f} MB/sec"
         )
-
-        points = process_conversation_file(file_path, model, commit_id)
-
-        if not points:
-            print("No valid entries found in this file.")
-            continue
-
-        # Upsert points in batches
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[
-                qdrant_client.http.models.PointStruct(
-                    id=p["id"], vector=p["vector"], payload=p["payload"]
-                )
-                for p in points
-            ],
-            wait=True,
+    if cache is not None:
+        print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses")
+    if dedup is not None:
+        print(f"Duplicate chunks skipped: {dedup.duplicates}")
+    if cleaner is not None and cleaner.deleted:
+        print(f"Stale points deleted: {cleaner.deleted}")
+    if len(dead_letter):
+        print(
+            f"⚠️  {len(dead_letter)} failed batches are in the dead-letter queue; "
+            "run `python dead_letter.py replay` once Qdrant is healthy."
         )
-        total_points += len(points)
-        print(f"Upserted {len(points)} points to Qdrant.")
-
-    print(f"\n\n🎉🎉🎉 Grand Forging Complete! 🎉🎉🎉")
-    print(f"Total points newly added to the Codex: {total_points}")
     # Verify final count
     count_result = client.count(collection_name=COLLECTION_NAME, exact=True)
     print(f"Final verification count from Qdrant: {count_result.count}")
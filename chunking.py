@@ -0,0 +1,148 @@
+"""
+Text chunking shared by the ingestion scripts and the data processor.
+
+all-MiniLM-L6-v2 only looks at the first 256 word pieces of its input, so
+fixed 1000-character chunks are often silently truncated: the tail of each
+chunk costs encoder time but never becomes searchable. Token mode uses the
+model's fast tokenizer offsets to cut chunks that fit the model's sequence
+length, with a token-based overlap, and keeps chunk boundaries on word
+boundaries. Character mode is the original 1000/200 slicing, and is used as
+a fallback when the tokenizer cannot be loaded.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+CHUNK_MODE = "tokens"  # "tokens" or "chars"
+MODEL_MAX_SEQ_LENGTH = 256  # SentenceTransformer max_seq_length for the model
+# [CLS] and [SEP] are added by the model, so they don't count towards a chunk.
+MAX_CHUNK_TOKENS = MODEL_MAX_SEQ_LENGTH - 2
+CHUNK_OVERLAP_TOKENS = 32
+CHAR_CHUNK_SIZE = 1000
+CHAR_CHUNK_OVERLAP = 200
+
+_tokenizers: Dict[str, Optional[object]] = {}
+
+
+def get_tokenizer(model_name: str = EMBEDDING_MODEL):
+    """
+    Loads (once per process) the fast tokenizer of a sentence-transformers
+    model, or returns None if it is unavailable.
+    """
+    if model_name not in _tokenizers:
+        repo = (
+            model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        )
+        try:
+            from transformers import AutoTokenizer
+
+            _tokenizers[model_name] = AutoTokenizer.from_pretrained(repo, use_fast=True)
+        except Exception as e:
+            logger.warning(
+                f"Could not load tokenizer for {model_name}, chunking by characters: {e}"
+            )
+            _tokenizers[model_name] = None
+    return _tokenizers[model_name]
+
+
+def chunk_text_by_chars(
+    text: str, chunk_size: int = CHAR_CHUNK_SIZE, overlap: int = CHAR_CHUNK_OVERLAP
+) -> List[str]:
+    """Splits a long text into fixed-size, overlapping character chunks."""
+    if not isinstance(text, str):
+        return []
+    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size - overlap)]
+
+
+def _same_word(word_ids: List[Optional[int]], index: int) -> bool:
+    """True if the token at `index` continues the word of the token before it."""
+    return word_ids[index] is not None and word_ids[index] == word_ids[index - 1]
+
+
+def chunk_text_by_tokens(
+    text: str,
+    tokenizer,
+    max_tokens: int = MAX_CHUNK_TOKENS,
+    overlap: int = CHUNK_OVERLAP_TOKENS,
+) -> List[str]:
+    """
+    Splits a text into chunks of at most `max_tokens` tokens that overlap by
+    about `overlap` tokens. Chunks are slices of the original text taken from
+    the tokenizer's offsets, and only split a word when it alone is longer
+    than `max_tokens`.
+    """
+    if not isinstance(text, str) or not text.strip():
+        return []
+    encoding = tokenizer(
+        text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+    )
+    offsets = encoding["offset_mapping"]
+    word_ids = encoding.word_ids()
+    n = len(offsets)
+    if n <= max_tokens:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < n:
+        end = min(start + max_tokens, n)
+        # Don't end the chunk in the middle of a word.
+        trimmed = end
+        while trimmed < n and trimmed > start and _same_word(word_ids, trimmed):
+            trimmed -= 1
+        if trimmed > start:
+            end = trimmed
+        chunks.append(text[offsets[start][0] : offsets[end - 1][1]])
+        if end >= n:
+            break
+
+        # Start the next chunk `overlap` tokens back, on a word boundary.
+        # If that word begins in this chunk's first word, skip forward instead.
+        next_start = max(end - overlap, start + 1)
+        word_start = next_start
+        while word_start > start and _same_word(word_ids, word_start):
+            word_start -= 1
+        if word_start > start:
+            next_start = word_start
+        else:
+            while next_start < end and _same_word(word_ids, next_start):
+                next_start += 1
+        start = next_start
+    return chunks
+
+
+def active_tokenizer(mode: Optional[str] = None):
+    """The tokenizer chunk_text() uses in `mode`, or None when chunking by characters."""
+    if (mode or CHUNK_MODE) == "tokens":
+        return get_tokenizer()
+    return None
+
+
+def chunk_text(text: str, mode: Optional[str] = None) -> List[str]:
+    """
+    Splits a message into chunks for embedding, by tokens or by characters
+    depending on `mode` (defaults to CHUNK_MODE).
+    """
+    tokenizer = active_tokenizer(mode)
+    if tokenizer is not None:
+        return chunk_text_by_tokens(text, tokenizer)
+    return chunk_text_by_chars(text)
+
+
+def text_length(text: str, mode: Optional[str] = None) -> int:
+    """Returns the length of a text in the units chunk_text() uses: tokens or characters."""
+    tokenizer = active_tokenizer(mode)
+    if tokenizer is None:
+        return len(text)
+    return len(tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+
+
+def single_chunk_limit(mode: Optional[str] = None) -> int:
+    """Returns the longest text_length() that chunk_text() keeps as one chunk."""
+    if active_tokenizer(mode) is not None:
+        return MAX_CHUNK_TOKENS
+    return CHAR_CHUNK_SIZE - CHAR_CHUNK_OVERLAP
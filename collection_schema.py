@@ -0,0 +1,204 @@
+"""
+Bootstrap and migration of the Codex collection's payload schema.
+
+Qdrant only filters quickly on payload fields it has an index for; without
+one, a filtered search checks the payload of every candidate point. The
+collection gets keyword indexes on the fields queries and the stale-point
+cleanup select by, and a float index on `timestamp_epoch`, the message
+timestamp in seconds since the epoch. The raw `timestamp` payload is an ISO
+string that Qdrant can't compare, so every ingest path now also writes
+`timestamp_epoch`, and points ingested before that are backfilled:
+
+    python collection_schema.py migrate
+"""
+
+import argparse
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import qdrant_client
+from qdrant_client.http import models
+
+logger = logging.getLogger(__name__)
+
+QDRANT_HOST = "localhost"
+QDRANT_PORT = 6333
+COLLECTION_NAME = "codex_history"
+VECTOR_SIZE = 384
+TIMESTAMP_FIELD = "timestamp_epoch"
+KEYWORD_INDEXES = ("source_file", "commit_id", "event_type", "source_relpath")
+BACKFILL_BATCH_SIZE = 1000  # Points read and updated per request
+MILLISECONDS_THRESHOLD = 1e11  # Larger numeric timestamps are in milliseconds
+
+
+def timestamp_epoch(value: Any) -> Optional[float]:
+    """
+    Converts a message timestamp (an ISO 8601 string, or seconds or
+    milliseconds since the epoch) to seconds since the epoch, or None.
+    Naive ISO timestamps are taken as UTC.
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+        if abs(seconds) > MILLISECONDS_THRESHOLD:
+            seconds /= 1000
+        return seconds
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    try:
+        return timestamp_epoch(float(text))
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def with_timestamp_epoch(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds `timestamp_epoch` to a point payload if its timestamp parses."""
+    epoch = timestamp_epoch(payload.get("timestamp"))
+    if epoch is not None:
+        payload[TIMESTAMP_FIELD] = epoch
+    return payload
+
+
+def payload_indexes() -> Dict[str, models.PayloadSchemaType]:
+    """The payload index of every indexed field."""
+    indexes = {field: models.PayloadSchemaType.KEYWORD for field in KEYWORD_INDEXES}
+    indexes[TIMESTAMP_FIELD] = models.PayloadSchemaType.FLOAT
+    return indexes
+
+
+def ensure_payload_indexes(client, collection_name: str = COLLECTION_NAME) -> List[str]:
+    """Creates the payload indexes that are missing. Returns the fields indexed."""
+    try:
+        existing = client.get_collection(collection_name).payload_schema or {}
+    except Exception as e:
+        logger.warning(f"Could not read the payload schema of {collection_name}: {e}")
+        existing = {}
+    created = []
+    for field_name, schema in payload_indexes().items():
+        if field_name in existing:
+            continue
+        try:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=schema,
+            )
+        except Exception as e:
+            logger.warning(f"Could not create payload index on {field_name}: {e}")
+            continue
+        created.append(field_name)
+    return created
+
+
+def create_collection_if_missing(
+    client, collection_name: str = COLLECTION_NAME, vector_size: int = VECTOR_SIZE
+) -> bool:
+    """Creates the collection if it doesn't exist. Returns whether it did."""
+    if client.collection_exists(collection_name):
+        return False
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(
+            size=vector_size, distance=models.Distance.COSINE
+        ),
+    )
+    return True
+
+
+def ensure_collection(
+    client, collection_name: str = COLLECTION_NAME, vector_size: int = VECTOR_SIZE
+) -> bool:
+    """
+    Creates the collection if it doesn't exist, then its missing payload
+    indexes. Returns whether the collection was created.
+    """
+    created = create_collection_if_missing(client, collection_name, vector_size)
+    ensure_payload_indexes(client, collection_name)
+    return created
+
+
+def backfill_timestamps(
+    client,
+    collection_name: str = COLLECTION_NAME,
+    batch_size: int = BACKFILL_BATCH_SIZE,
+) -> int:
+    """
+    Sets `timestamp_epoch` on every point that has a parseable `timestamp`
+    but no epoch yet, one batched update per page of points. Returns the
+    number of points updated.
+    """
+    missing = models.Filter(
+        must=[
+            models.IsEmptyCondition(is_empty=models.PayloadField(key=TIMESTAMP_FIELD))
+        ]
+    )
+    updated, offset = 0, None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=missing,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["timestamp"],
+            with_vectors=False,
+        )
+        operations = []
+        for point in points:
+            epoch = timestamp_epoch((point.payload or {}).get("timestamp"))
+            if epoch is None:
+                continue
+            operations.append(
+                models.SetPayloadOperation(
+                    set_payload=models.SetPayload(
+                        payload={TIMESTAMP_FIELD: epoch}, points=[point.id]
+                    )
+                )
+            )
+        if operations:
+            client.batch_update_points(
+                collection_name=collection_name, update_operations=operations, wait=True
+            )
+            updated += len(operations)
+        if offset is None:
+            return updated
+
+
+def migrate(client, collection_name: str = COLLECTION_NAME) -> Dict[str, Any]:
+    """Brings an existing collection up to the current payload schema."""
+    created = create_collection_if_missing(client, collection_name)
+    indexed = ensure_payload_indexes(client, collection_name)
+    return {
+        "created": created,
+        "indexed": indexed,
+        "backfilled": backfill_timestamps(client, collection_name),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Set up the Codex payload schema")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    args = parser.parse_args(argv)
+
+    client = qdrant_client.QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    print(f"⏳ Migrating '{args.collection}'...")
+    result = migrate(client, args.collection)
+    if result["created"]:
+        print(f"✅ Created collection '{args.collection}'.")
+    if result["indexed"]:
+        print(f"✅ Indexed payload fields: {', '.join(result['indexed'])}")
+    print(f"✅ Backfilled {TIMESTAMP_FIELD} on {result['backfilled']} points.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+"""
+Storage and index tuning for the Codex collection.
+
+batch_ingest.py creates the collection with Qdrant's defaults: an HNSW graph
+with m=16 and ef_construct=100, and float32 vectors and payloads in RAM.
+This tool changes those settings:
+
+    python collection_tuning.py show
+    python collection_tuning.py apply --quantization int8 --on-disk
+    python collection_tuning.py rebuild --m 32 --ef-construct 200 --replace
+
+`apply` updates the collection in place and Qdrant re-optimizes its segments
+in the background. `rebuild` copies every point into a new collection with
+the settings (vectors are copied, nothing is re-embedded) and compares the
+two: estimated memory, disk use when the storage directory is known, search
+latency, and how many of the original top-k results the new collection
+still returns, once Qdrant has finished indexing the copy. With --replace,
+the collection name becomes an alias of the copy, so readers and writers
+switch over without waiting for a refill.
+
+Pause ingestion (the Scribe, batch_ingest.py, ingest_additional.py) during
+a rebuild with --replace: anything ingested after the copy starts goes to
+the old collection and would be dropped with it. The ingest generation
+shows such writes, so --replace refuses to start if something was ingested
+in the last RECENT_INGEST_SECONDS and refuses to switch if anything was
+ingested during the rebuild. The first switch also deletes the original
+collection just before the alias takes its name, so readers briefly find
+no collection.
+
+With int8 scalar quantization the HNSW search runs on 1-byte vectors kept in
+RAM, and the best candidates are rescored with the original float32 vectors,
+which can then live on disk.
+"""
+
+import os
+import time
+import argparse
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import qdrant_client
+from qdrant_client.http import models
+
+from collection_schema import ensure_payload_indexes
+from ingest_generation import IngestGeneration
+from upsert_writer import upsert_with_retry
+
+QDRANT_HOST = "localhost"
+QDRANT_PORT = 6333
+COLLECTION_NAME = "codex_history"
+QDRANT_STORAGE_PATH = "./qdrant_storage"  # Mounted by the docker run in the README
+HNSW_M = 16  # Qdrant's defaults
+HNSW_EF_CONSTRUCT = 100
+QUANTIZATION_QUANTILE = 0.99  # Outliers beyond this quantile are clipped
+RESCORE_OVERSAMPLING = 2.0  # Quantized candidates rescored per requested hit
+COPY_BATCH_SIZE = 256
+BENCHMARK_QUERIES = 100
+BENCHMARK_LIMIT = 10
+INDEX_WAIT_SECONDS = 600  # How long to wait for Qdrant to index the copy
+INDEX_POLL_SECONDS = 1.0
+RECENT_INGEST_SECONDS = 60  # --replace waits for this much ingest quiet
+FLOAT_BYTES = 4
+HNSW_LINK_BYTES = 4  # Bytes per graph edge
+
+
+def collection_settings(
+    vector_size: int,
+    m: int = HNSW_M,
+    ef_construct: int = HNSW_EF_CONSTRUCT,
+    on_disk: bool = False,
+    on_disk_payload: bool = False,
+    quantization: Optional[str] = None,
+) -> Dict[str, Any]:
+    """The create_collection() arguments for a set of tuning options."""
+    settings: Dict[str, Any] = {
+        "vectors_config": models.VectorParams(
+            size=vector_size, distance=models.Distance.COSINE, on_disk=on_disk
+        ),
+        "hnsw_config": models.HnswConfigDiff(m=m, ef_construct=ef_construct),
+        "on_disk_payload": on_disk_payload,
+    }
+    if quantization == "int8":
+        settings["quantization_config"] = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=QUANTIZATION_QUANTILE,
+                always_ram=True,
+            )
+        )
+    return settings
+
+
+def search_params(quantized: bool) -> Optional[models.SearchParams]:
+    """Search parameters that rescore quantized candidates with full vectors."""
+    if not quantized:
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=True, oversampling=RESCORE_OVERSAMPLING
+        )
+    )
+
+
+def describe(
+    client, collection_name: str, storage_path: str = QDRANT_STORAGE_PATH
+) -> Dict[str, Any]:
+    """The tuning-relevant settings and size of a collection."""
+    info = client.get_collection(collection_name)
+    params = info.config.params
+    vectors = params.vectors
+    hnsw = info.config.hnsw_config
+    quantized = info.config.quantization_config is not None
+    points = info.points_count or 0
+    dim = vectors.size
+    m = (vectors.hnsw_config.m if vectors.hnsw_config else None) or hnsw.m
+
+    # Vectors Qdrant keeps in RAM: the quantized copies if there are any,
+    # plus the float32 originals unless they are on disk.
+    ram = 0 if vectors.on_disk else points * dim * FLOAT_BYTES
+    if quantized:
+        ram += points * dim
+    # Layer 0 of the graph has up to 2m links per point.
+    ram += points * 2 * m * HNSW_LINK_BYTES
+    return {
+        "name": collection_name,
+        "points": points,
+        "segments": info.segments_count,
+        "m": m,
+        "ef_construct": hnsw.ef_construct,
+        "on_disk": bool(vectors.on_disk),
+        "on_disk_payload": bool(params.on_disk_payload),
+        "quantization": "int8" if quantized else None,
+        "estimated_ram_bytes": ram,
+        "disk_bytes": disk_usage(collection_name, storage_path),
+    }
+
+
+def disk_usage(
+    collection_name: str, storage_path: str = QDRANT_STORAGE_PATH
+) -> Optional[int]:
+    """Bytes the collection takes in Qdrant's storage directory, if it's local."""
+    root = os.path.join(storage_path, "collections", collection_name)
+    if not os.path.isdir(root):
+        return None
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                continue
+    return total
+
+
+def copy_points(
+    client, source: str, target: str, batch_size: int = COPY_BATCH_SIZE
+) -> int:
+    """Copies every point, vectors included, from one collection to another."""
+    copied, offset = 0, None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if records:
+            points = [
+                models.PointStruct(id=r.id, vector=r.vector, payload=r.payload)
+                for r in records
+            ]
+            upsert_with_retry(client, target, points, wait=True)
+            copied += len(points)
+        if offset is None:
+            return copied
+
+
+def wait_until_indexed(
+    client,
+    collection_name: str,
+    timeout: float = INDEX_WAIT_SECONDS,
+    poll: float = INDEX_POLL_SECONDS,
+) -> bool:
+    """
+    Waits until Qdrant reports the collection green, i.e. it has finished
+    building the HNSW graph and quantizing the segments. Returns False if
+    that takes longer than `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get_collection(collection_name).status
+        if status == models.CollectionStatus.GREEN:
+            return True
+        if status == models.CollectionStatus.GREY:
+            # Optimizations are pending but only start on the next update.
+            client.update_collection(
+                collection_name=collection_name,
+                optimizers_config=models.OptimizersConfigDiff(),
+            )
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll)
+
+
+def aliased_collection(client, alias: str) -> Optional[str]:
+    """The collection an alias points to, or None if `alias` is not one."""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def default_target(client, collection_name: str) -> str:
+    """<collection>_tuned, numbered if that name is taken (say, by the live copy)."""
+    target, number = f"{collection_name}_tuned", 1
+    while client.collection_exists(target):
+        number += 1
+        target = f"{collection_name}_tuned_{number}"
+    return target
+
+
+def switch_alias(client, alias: str, target: str) -> None:
+    """
+    Points `alias` at `target` and drops the collection it pointed to.
+    Once the name is an alias, the switch is a single atomic update. The
+    first time, the name is still a real collection, which has to be
+    deleted before the alias can take it over.
+    """
+    previous = aliased_collection(client, alias)
+    operations: List[Any] = []
+    if previous is None:
+        client.delete_collection(alias)
+    else:
+        operations.append(
+            models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=alias)
+            )
+        )
+    operations.append(
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=target, alias_name=alias)
+        )
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+    if previous is not None and previous != target:
+        client.delete_collection(previous)
+
+
+def sample_queries(client, collection_name: str, count: int) -> List[List[float]]:
+    """Stored vectors to benchmark with, so no model needs to be loaded."""
+    records, _ = client.scroll(
+        collection_name=collection_name,
+        limit=count,
+        with_payload=False,
+        with_vectors=True,
+    )
+    return [r.vector for r in records]
+
+
+def benchmark_search(
+    client,
+    collection_name: str,
+    queries: List[List[float]],
+    limit: int = BENCHMARK_LIMIT,
+    params: Optional[models.SearchParams] = None,
+) -> Dict[str, Any]:
+    """Search latency over `queries`, and the ids each one returned."""
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = client.query_points(
+            collection_name=collection_name,
+            query=query,
+            limit=limit,
+            search_params=params,
+            with_payload=False,
+        )
+        latencies.append(time.perf_counter() - start)
+        results.append([point.id for point in response.points])
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "mean_ms": float(latencies_ms.mean()),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "results": results,
+    }
+
+
+def overlap(reference: List[List[Any]], candidate: List[List[Any]]) -> float:
+    """Mean fraction of each reference top-k that the candidate also returned."""
+    scores = [
+        len(set(ref) & set(cand)) / len(ref)
+        for ref, cand in zip(reference, candidate)
+        if ref
+    ]
+    return float(np.mean(scores)) if scores else 1.0
+
+
+def apply_settings(client, collection_name: str, args: argparse.Namespace) -> None:
+    """Changes the settings given on the command line in place."""
+    quantization: Any = None
+    if args.quantization == "int8":
+        quantization = collection_settings(1, quantization="int8")[
+            "quantization_config"
+        ]
+    elif args.quantization == "none":
+        quantization = models.Disabled.DISABLED
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=args.on_disk)},
+        hnsw_config=models.HnswConfigDiff(m=args.m, ef_construct=args.ef_construct),
+        collection_params=models.CollectionParamsDiff(
+            on_disk_payload=args.on_disk_payload
+        ),
+        quantization_config=quantization,
+    )
+
+
+def tuned_settings(args: argparse.Namespace, current: Dict[str, Any]) -> Dict[str, Any]:
+    """The options given on the command line, the current ones otherwise."""
+    quantization = args.quantization or current["quantization"]
+    return {
+        "m": args.m or current["m"],
+        "ef_construct": args.ef_construct or current["ef_construct"],
+        "on_disk": current["on_disk"] if args.on_disk is None else args.on_disk,
+        "on_disk_payload": (
+            current["on_disk_payload"]
+            if args.on_disk_payload is None
+            else args.on_disk_payload
+        ),
+        "quantization": None if quantization == "none" else quantization,
+    }
+
+
+def create_tuned(
+    client, collection_name: str, vector_size: int, settings: Dict[str, Any]
+) -> None:
+    client.create_collection(
+        collection_name=collection_name,
+        **collection_settings(vector_size, **settings),
+    )
+    ensure_payload_indexes(client, collection_name)
+
+
+def ingest_is_recent(
+    generation: IngestGeneration, quiet: float = RECENT_INGEST_SECONDS
+) -> bool:
+    """True if something was ingested in the last `quiet` seconds."""
+    changed = generation.last_changed()
+    return changed is not None and time.time() - changed < quiet
+
+
+def rebuild(
+    client,
+    collection_name: str,
+    target: str,
+    args: argparse.Namespace,
+    generation: Optional[IngestGeneration] = None,
+) -> Dict[str, Any]:
+    """
+    Copies the collection into `target` with the new settings and compares
+    the two once `target` is indexed. With args.replace, the collection name
+    then becomes an alias of `target`, unless the ingest generation moved
+    during the rebuild: the new points would be missing from `target`, so
+    report["replaced"] is False and `target` is kept.
+    """
+    generation = generation or IngestGeneration()
+    started = generation.current()
+    # A collection replaced before is an alias; measure what it points to.
+    source = aliased_collection(client, collection_name) or collection_name
+    before = describe(client, source, args.storage)
+    settings = tuned_settings(args, before)
+    vector_size = client.get_collection(source).config.params.vectors.size
+    create_tuned(client, target, vector_size, settings)
+    copied = copy_points(client, source, target)
+    indexed = wait_until_indexed(client, target, args.index_timeout)
+    after = describe(client, target, args.storage)
+
+    queries = sample_queries(client, source, args.queries)
+    old = benchmark_search(
+        client,
+        source,
+        queries,
+        args.limit,
+        search_params(before["quantization"] is not None),
+    )
+    new = benchmark_search(
+        client,
+        target,
+        queries,
+        args.limit,
+        search_params(settings["quantization"] is not None),
+    )
+    report = {
+        "copied": copied,
+        "indexed": indexed,
+        "before": before,
+        "after": after,
+        "old_search": old,
+        "new_search": new,
+        "overlap": overlap(old["results"], new["results"]),
+    }
+    report["replaced"] = False
+    if args.replace and generation.current() == started:
+        switch_alias(client, collection_name, target)
+        report["replaced"] = True
+    return report
+
+
+def _format_bytes(size: Optional[int]) -> str:
+    return "n/a" if size is None else f"{size / (1024 * 1024):.1f} MB"
+
+
+def print_description(description: Dict[str, Any]) -> None:
+    print(
+        f"📦 {description['name']}: {description['points']} points in "
+        f"{description['segments']} segments | HNSW m={description['m']}, "
+        f"ef_construct={description['ef_construct']} | vectors on disk: "
+        f"{description['on_disk']}, payload on disk: "
+        f"{description['on_disk_payload']} | quantization: "
+        f"{description['quantization'] or 'none'}"
+    )
+    print(
+        f"   Estimated RAM for vectors and graph: "
+        f"{_format_bytes(description['estimated_ram_bytes'])}, "
+        f"disk: {_format_bytes(description['disk_bytes'])}"
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tune the Codex collection")
+    parser.add_argument("command", choices=["show", "apply", "rebuild"])
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    # Options that are not given keep the collection's current setting.
+    parser.add_argument(
+        "--m", type=int, help=f"HNSW links per node (Qdrant's default: {HNSW_M})"
+    )
+    parser.add_argument(
+        "--ef-construct",
+        type=int,
+        help="HNSW candidates considered while building the graph "
+        f"(default: {HNSW_EF_CONSTRUCT})",
+    )
+    parser.add_argument(
+        "--on-disk",
+        action=argparse.BooleanOptionalAction,
+        help="Keep the float32 vectors on disk (memory-mapped)",
+    )
+    parser.add_argument(
+        "--on-disk-payload",
+        action=argparse.BooleanOptionalAction,
+        help="Keep payloads on disk; indexed fields stay fast",
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=["int8", "none"],
+        help="int8 scalar quantization, with rescoring by the full vectors",
+    )
+    parser.add_argument(
+        "--target",
+        help="Collection rebuilt into (default: <collection>_tuned)",
+    )
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="After the rebuild, make the collection name an alias of the rebuild",
+    )
+    parser.add_argument(
+        "--index-timeout",
+        type=float,
+        default=INDEX_WAIT_SECONDS,
+        help="Seconds to wait for Qdrant to index the rebuild before comparing",
+    )
+    parser.add_argument(
+        "--storage",
+        default=QDRANT_STORAGE_PATH,
+        help="Qdrant's storage directory, to report disk use",
+    )
+    parser.add_argument("--queries", type=int, default=BENCHMARK_QUERIES)
+    parser.add_argument("--limit", type=int, default=BENCHMARK_LIMIT)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    client = qdrant_client.QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+
+    if args.command == "show":
+        print_description(describe(client, args.collection, args.storage))
+        return
+
+    if args.command == "apply":
+        apply_settings(client, args.collection, args)
+        print(
+            f"✅ Settings applied to '{args.collection}'; "
+            "Qdrant re-optimizes its segments in the background."
+        )
+        print_description(describe(client, args.collection, args.storage))
+        return
+
+    generation = IngestGeneration()
+    if args.replace and ingest_is_recent(generation):
+        print(
+            f"❌ Something was ingested in the last {RECENT_INGEST_SECONDS}s. "
+            "Stop the Scribe and any ingest runs before rebuilding with --replace."
+        )
+        return
+
+    target = args.target or default_target(client, args.collection)
+    print(f"⏳ Rebuilding '{args.collection}' into '{target}'...")
+    report = rebuild(client, args.collection, target, args, generation)
+    print(f"✅ Copied {report['copied']} points.")
+    if not report["indexed"]:
+        print(
+            f"⚠️  '{target}' was still being indexed after {args.index_timeout:.0f}s; "
+            "its figures below are not final."
+        )
+    print_description(report["before"])
+    print_description(report["after"])
+    old, new = report["old_search"], report["new_search"]
+    print(
+        f"🔍 Search latency: {old['mean_ms']:.2f} ms -> {new['mean_ms']:.2f} ms mean, "
+        f"{old['p95_ms']:.2f} ms -> {new['p95_ms']:.2f} ms p95"
+    )
+    print(f"🎯 Top-{args.limit} overlap with the original: {report['overlap']:.1%}")
+    if report["replaced"]:
+        # Cached results may come from the collection that was dropped.
+        generation.bump()
+        print(f"✅ '{args.collection}' now points to '{target}'.")
+    elif args.replace:
+        print(
+            f"❌ Points were ingested into '{args.collection}' during the rebuild, "
+            f"so it was not switched over; '{target}' is kept. Pause ingestion "
+            "and rerun."
+        )
+    else:
+        print(
+            f"ℹ️  '{target}' kept for inspection; rerun with --replace to switch "
+            f"'{args.collection}' over."
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Local sidecar store for chunk text.
+
+By default every Qdrant point carries its chunk text in payload["content"],
+so Qdrant's memory and the size of every search response grow with the
+corpus. With slim payloads, the ingestion scripts write the text here
+instead, zstd-compressed in SQLite and keyed by point id, and Qdrant keeps
+only the small filterable fields. Readers fetch the text of their final
+top-k hits in one batched lookup.
+
+Chunks are short, so compressing them one by one gains little; once enough
+chunks are stored, a shared zstd dictionary is trained from them and used
+for the chunks that follow (about half the size of plain zstd on chat text).
+
+Slim payloads are enabled with PLUG_MEMORY_SLIM_PAYLOADS=1 (or
+--slim-payloads for batch_ingest.py). Readers handle both kinds of points.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+CONTENT_STORE_PATH = os.path.expanduser("~/.plug_memory/content_store.db")
+SLIM_PAYLOADS = os.environ.get("PLUG_MEMORY_SLIM_PAYLOADS", "") not in ("", "0")
+COMPRESSION_LEVEL = 3
+DICTIONARY_SIZE = 64 * 1024
+DICTIONARY_TRAINING_CHUNKS = 2000  # Chunks stored before a dictionary is trained
+SQLITE_MAX_VARIABLES = 500
+
+
+class ContentStore:
+    """zstd-compressed chunk text in SQLite, keyed by Qdrant point id."""
+
+    def __init__(self, path: str = CONTENT_STORE_PATH, level: int = COMPRESSION_LEVEL):
+        self.path = path
+        self.level = level
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS content (
+                point_id TEXT PRIMARY KEY,
+                dict_id INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS dictionaries (
+                dict_id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL
+            )""")
+        self._conn.commit()
+
+        self._decompressors: Dict[int, zstandard.ZstdDecompressor] = {
+            0: zstandard.ZstdDecompressor()
+        }
+        self._dict_id = 0
+        self._compressor = self._make_compressor()
+        self._load_dictionaries()
+
+    def _add_dictionary(self, dict_id: int, data: bytes) -> None:
+        dictionary = zstandard.ZstdCompressionDict(data)
+        self._decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        self._dictionary = dictionary
+        self._dict_id = dict_id
+
+    def _load_dictionaries(self) -> None:
+        """
+        Loads the dictionaries this instance hasn't seen yet. Another process
+        (the Scribe, batch_ingest) may have trained one since it was opened.
+        """
+        rows = self._conn.execute(
+            "SELECT dict_id, data FROM dictionaries WHERE dict_id > ? ORDER BY dict_id",
+            (max(self._decompressors),),
+        ).fetchall()
+        for dict_id, data in rows:
+            self._add_dictionary(dict_id, data)
+        if rows:
+            self._compressor = self._make_compressor()
+
+    def _make_compressor(self) -> zstandard.ZstdCompressor:
+        if self._dict_id:
+            return zstandard.ZstdCompressor(
+                level=self.level, dict_data=self._dictionary
+            )
+        return zstandard.ZstdCompressor(level=self.level)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM content").fetchone()[0]
+
+    def _maybe_train_dictionary(self) -> None:
+        if self._dict_id:
+            return
+        # Check and train under the write lock, so that concurrent writers
+        # end up sharing one dictionary instead of each inserting their own.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._load_dictionaries()
+            if not self._dict_id:
+                self._train_dictionary()
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            raise
+
+    def _train_dictionary(self) -> None:
+        rows = self._conn.execute(
+            "SELECT data FROM content WHERE dict_id = 0 LIMIT ?",
+            (DICTIONARY_TRAINING_CHUNKS,),
+        ).fetchall()
+        if len(rows) < DICTIONARY_TRAINING_CHUNKS:
+            return
+        plain = self._decompressors[0]
+        samples = [plain.decompress(row[0]) for row in rows]
+        try:
+            dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, samples)
+        except zstandard.ZstdError as e:
+            logger.warning(f"Could not train a content dictionary: {e}")
+            return
+        cursor = self._conn.execute(
+            "INSERT INTO dictionaries (data) VALUES (?)", (dictionary.as_bytes(),)
+        )
+        self._add_dictionary(cursor.lastrowid, dictionary.as_bytes())
+        self._compressor = self._make_compressor()
+        logger.info(
+            f"Trained content dictionary {self._dict_id} from {len(rows)} chunks"
+        )
+
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """Stores (point_id, text) pairs, replacing any previous text."""
+        with self._lock:
+            self._maybe_train_dictionary()
+            rows = [
+                (
+                    str(point_id),
+                    self._dict_id,
+                    self._compressor.compress(text.encode("utf-8")),
+                )
+                for point_id, text in items
+            ]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO content VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def get_many(self, point_ids: Sequence[str]) -> Dict[str, str]:
+        """Returns the text of every id that is stored, in one lookup per 500 ids."""
+        found: Dict[str, str] = {}
+        ids = [str(point_id) for point_id in point_ids]
+        with self._lock:
+            for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+                part = ids[start : start + SQLITE_MAX_VARIABLES]
+                rows = self._conn.execute(
+                    "SELECT point_id, dict_id, data FROM content "
+                    f"WHERE point_id IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for point_id, dict_id, data in rows:
+                    if dict_id not in self._decompressors:
+                        self._load_dictionaries()
+                    text = self._decompressors[dict_id].decompress(data)
+                    found[point_id] = text.decode("utf-8")
+        return found
+
+    def delete(self, point_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM content WHERE point_id = ?",
+                [(str(point_id),) for point_id in point_ids],
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def slim_points(points: List[Dict], store: ContentStore) -> List[Dict]:
+    """
+    Moves the content of upsert-ready points into the sidecar and returns
+    the points with the text left out of their payloads.
+    """
+    store.put_many((p["id"], p["payload"]["content"]) for p in points)
+    slim = []
+    for point in points:
+        payload = {k: v for k, v in point["payload"].items() if k != "content"}
+        slim.append({**point, "payload": payload})
+    return slim
+
+
+def hit_contents(hits: Sequence, get_store: Callable[[], ContentStore]) -> List[str]:
+    """
+    The chunk text of each search hit: from its payload, or, for points with
+    slim payloads, from the sidecar in a single batched lookup. The store is
+    only opened if some hit needs it.
+    """
+    payloads = [hit.payload or {} for hit in hits]
+    missing = [str(hit.id) for hit, p in zip(hits, payloads) if "content" not in p]
+    stored = get_store().get_many(missing) if missing else {}
+    return [
+        p["content"] if "content" in p else stored.get(str(hit.id), "")
+        for hit, p in zip(hits, payloads)
+    ]
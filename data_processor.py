@@ -9,8 +9,19 @@ from typing import List, Dict, Optional, Iterator, Any
 from pathlib import Path
 import logging
 
+from archive_scanner import ArchiveScanner
+from chunking import (
+    CHUNK_OVERLAP_TOKENS,
+    MAX_CHUNK_TOKENS,
+    active_tokenizer,
+    chunk_text_by_chars,
+    chunk_text_by_tokens,
+)
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_SESSION_PATTERN = "**/chats/session-*.json"
+
 
 class ConversationDataProcessor:
     """Handles processing of conversation data using pandas for efficiency."""
@@ -18,17 +29,26 @@ class ConversationDataProcessor:
     def __init__(self, archive_path: str):
         self.archive_path = Path(archive_path)
         self._validate_path()
+        self._scanner = ArchiveScanner(str(self.archive_path))
 
     def _validate_path(self) -> None:
         """Validate that the archive path exists."""
         if not self.archive_path.exists():
             raise ValueError(f"Archive path does not exist: {self.archive_path}")
 
-    def find_session_files(
-        self, pattern: str = "**/chats/session-*.json"
-    ) -> List[Path]:
-        """Find all session files matching the pattern recursively."""
-        return list(self.archive_path.glob(pattern))
+    def find_session_files(self, pattern: str = DEFAULT_SESSION_PATTERN) -> List[Path]:
+        """
+        Find all session files matching the pattern recursively. The default
+        pattern is served by a single archive scan, which reuses the listings
+        of directories that haven't changed since the last call.
+        """
+        if pattern != DEFAULT_SESSION_PATTERN:
+            return list(self.archive_path.glob(pattern))
+        return [
+            Path(path)
+            for path in self._scanner.scan().session_files
+            if os.path.basename(path).startswith("session-")
+        ]
 
     def load_session_file(self, file_path: Path) -> pd.DataFrame:
         """Load a single session file into a pandas DataFrame."""
@@ -95,8 +115,18 @@ class ConversationDataProcessor:
         text_column: str = "content",
         chunk_size: int = 1000,
         overlap: int = 200,
+        tokenizer=None,
+        max_tokens: int = MAX_CHUNK_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
     ) -> pd.DataFrame:
-        """Efficiently chunk text content using pandas operations."""
+        """
+        Efficiently chunk text content using pandas operations.
+
+        Chunks are cut to fit the embedding model's sequence length using
+        `max_tokens` and `overlap_tokens`, with the given fast tokenizer or
+        else the model's (see chunking.CHUNK_MODE). Without one they are
+        `chunk_size` characters long.
+        """
         if text_column not in df.columns:
             logger.warning(f"Text column '{text_column}' not found in DataFrame")
             return df
@@ -107,14 +137,14 @@ class ConversationDataProcessor:
         if valid_df.empty:
             return df
 
+        if tokenizer is None:
+            tokenizer = active_tokenizer()
+
         # Function to chunk a single text
         def _chunk_single_text(text: str) -> List[str]:
-            if not isinstance(text, str):
-                return []
-            return [
-                text[i : i + chunk_size]
-                for i in range(0, len(text), chunk_size - overlap)
-            ]
+            if tokenizer is not None:
+                return chunk_text_by_tokens(text, tokenizer, max_tokens, overlap_tokens)
+            return chunk_text_by_chars(text, chunk_size, overlap)
 
         # Apply chunking to each row
         chunks_data = []
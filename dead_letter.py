@@ -0,0 +1,191 @@
+"""
+Dead-letter queue for upsert batches that Qdrant would not take.
+
+When a batch still fails after the UpsertWriter's retries, its points are
+written here with their vectors, so nothing that was embedded is lost and a
+later replay does not need to run the model again:
+
+    python dead_letter.py status
+    python dead_letter.py replay
+
+A replayed batch is removed from the queue once Qdrant has accepted it.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import qdrant_client
+
+from ingest_generation import IngestGeneration
+from upsert_writer import (
+    UPSERT_RETRIES,
+    bump_generation,
+    to_point_struct,
+    upsert_with_retry,
+)
+
+logger = logging.getLogger(__name__)
+
+QDRANT_HOST = "localhost"
+QDRANT_PORT = 6333
+DEAD_LETTER_PATH = os.path.expanduser("~/.plug_memory/dead_letter.db")
+
+
+class DeadLetterQueue:
+    """SQLite store of failed upsert batches, vectors included."""
+
+    def __init__(self, path: str = DEAD_LETTER_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS batches (
+                batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection_name TEXT NOT NULL,
+                failed_at INTEGER NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT,
+                points TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vectors BLOB NOT NULL
+            )""")
+        self._conn.commit()
+
+    def add(self, collection_name: str, points: List[Dict], error: Exception) -> None:
+        """Persists a failed batch of {"id", "vector", "payload"} points."""
+        vectors = np.asarray([p["vector"] for p in points], dtype=np.float32)
+        rows = [{"id": p["id"], "payload": p["payload"]} for p in points]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO batches "
+                "(collection_name, failed_at, attempts, error, points, dim, vectors) "
+                "VALUES (?, ?, 1, ?, ?, ?, ?)",
+                (
+                    collection_name,
+                    int(time.time()),
+                    str(error),
+                    json.dumps(rows),
+                    vectors.shape[1],
+                    vectors.tobytes(),
+                ),
+            )
+            self._conn.commit()
+        logger.warning(f"Saved a failed batch of {len(points)} points for replay")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM batches").fetchone()[0]
+
+    def point_count(self) -> int:
+        with self._lock:
+            rows = self._conn.execute("SELECT points FROM batches").fetchall()
+        return sum(len(json.loads(row[0])) for row in rows)
+
+    def batches(self) -> Iterator[Tuple[int, str, List[Dict]]]:
+        """Yields (batch_id, collection_name, points) in the order they failed."""
+        with self._lock:
+            ids = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT batch_id FROM batches ORDER BY batch_id"
+                )
+            ]
+        for batch_id in ids:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT collection_name, points, dim, vectors FROM batches "
+                    "WHERE batch_id = ?",
+                    (batch_id,),
+                ).fetchone()
+            if row is None:
+                continue
+            collection_name, rows, dim, blob = row
+            vectors = np.frombuffer(blob, dtype=np.float32).reshape(-1, dim)
+            points = [
+                {"id": r["id"], "vector": vector.tolist(), "payload": r["payload"]}
+                for r, vector in zip(json.loads(rows), vectors)
+            ]
+            yield batch_id, collection_name, points
+
+    def remove(self, batch_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+            self._conn.commit()
+
+    def record_failure(self, batch_id: int, error: Exception) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE batches SET attempts = attempts + 1, error = ? "
+                "WHERE batch_id = ?",
+                (str(error), batch_id),
+            )
+            self._conn.commit()
+
+    def replay(
+        self, client, retries: int = UPSERT_RETRIES, generation=None
+    ) -> Tuple[int, int]:
+        """
+        Upserts every queued batch with wait=True and drops the ones Qdrant
+        accepted, bumping `generation` after each. Returns (points replayed,
+        batches still failing).
+        """
+        replayed, failed = 0, 0
+        for batch_id, collection_name, points in self.batches():
+            try:
+                upsert_with_retry(
+                    client,
+                    collection_name,
+                    [to_point_struct(p) for p in points],
+                    wait=True,
+                    retries=retries,
+                )
+            except Exception as e:
+                logger.error(f"Replay of dead-letter batch {batch_id} failed: {e}")
+                self.record_failure(batch_id, e)
+                failed += 1
+                continue
+            self.remove(batch_id)
+            if generation is not None:
+                bump_generation(generation)
+            replayed += len(points)
+        return replayed, failed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect or replay failed upserts")
+    parser.add_argument("command", choices=["status", "replay"])
+    parser.add_argument("--path", default=DEAD_LETTER_PATH)
+    parser.add_argument("--retries", type=int, default=UPSERT_RETRIES)
+    args = parser.parse_args(argv)
+
+    queue = DeadLetterQueue(args.path)
+    if not len(queue):
+        print("✅ The dead-letter queue is empty.")
+        return
+    print(f"📦 {len(queue)} failed batches ({queue.point_count()} points) queued.")
+    if args.command == "status":
+        return
+
+    client = qdrant_client.QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    replayed, failed = queue.replay(client, args.retries, IngestGeneration())
+    print(f"✅ Replayed {replayed} points.")
+    if failed:
+        print(f"❌ {failed} batches still failing; they stay queued.")
+
+
+if __name__ == "__main__":
+    main()
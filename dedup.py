@@ -0,0 +1,254 @@
+"""
+Near-duplicate chunk suppression for the ingestion scripts.
+
+checkpoint*.json and logs.json mostly repeat what is already in the session
+files, so ingesting them again doubles the embedding cost and fills the top
+results of a query with copies. DedupIndex keeps an on-disk signature for
+every chunk that was let through: a hash of its normalized text for exact
+matches, and a MinHash of its word shingles for near-duplicates. A chunk
+that matches an existing chunk is skipped before it reaches the encoder, and
+the index records which point it duplicates.
+
+MinHash candidates are found with locality-sensitive hashing: the signature
+is cut into bands, and chunks sharing any band are compared. With 16 bands
+of 4 values, pairs with a shingle Jaccard similarity above ~0.5 usually
+become candidates, and a candidate is a duplicate if its estimated
+similarity reaches MINHASH_THRESHOLD.
+"""
+
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+
+from embedding_cache import chunk_hash, normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEDUP_INDEX_PATH = os.path.expanduser("~/.plug_memory/dedup_index.db")
+MINHASH_THRESHOLD = 0.8  # Estimated Jaccard similarity for a near-duplicate
+MINHASH_MIN_WORDS = 8  # Shorter chunks are only matched exactly
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+BANDS = 16  # NUM_PERMUTATIONS / BANDS values per band
+SQLITE_MAX_VARIABLES = 500
+
+# Per-permutation seeds; each permutation hashes a shingle as mix(hash ^ seed).
+_SEEDS = (
+    np.random.RandomState(42)
+    .randint(0, np.iinfo(np.int64).max, size=NUM_PERMUTATIONS, dtype=np.int64)
+    .astype(np.uint64)
+)
+
+
+def _feature_hash(feature: str) -> int:
+    """A stable 64-bit hash (Python's hash() is salted per process)."""
+    return int.from_bytes(
+        hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    """The splitmix64 finalizer, applied elementwise (uint64 arithmetic wraps)."""
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """
+    Returns the MinHash signature of a text's word shingles, or None if the
+    text is too short for near-duplicate matching to be meaningful.
+    """
+    words = normalize_text(text).lower().split()
+    if len(words) < MINHASH_MIN_WORDS:
+        return None
+    shingles = {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+    hashes = np.array([_feature_hash(s) for s in shingles], dtype=np.uint64)
+    permuted = _mix(hashes[:, None] ^ _SEEDS[None, :])
+    # The low 32 bits of each minimum are plenty to compare signatures.
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(a == b))
+
+
+def _band_keys(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit key per band, so all bands share a single index."""
+    rows = signature.reshape(BANDS, -1)
+    keys = []
+    for band, values in enumerate(rows):
+        digest = hashlib.blake2b(
+            band.to_bytes(2, "big") + values.tobytes(), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+class DedupIndex:
+    """SQLite-backed signature index of the chunks that have been ingested."""
+
+    def __init__(
+        self,
+        path: str = DEDUP_INDEX_PATH,
+        threshold: float = MINHASH_THRESHOLD,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.duplicates = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS signatures (
+                point_id TEXT PRIMARY KEY,
+                exact_hash TEXT NOT NULL,
+                minhash BLOB
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS signatures_exact ON signatures (exact_hash)"
+        )
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS bands (
+                band_key INTEGER NOT NULL,
+                point_id TEXT NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_key ON bands (band_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_point ON bands (point_id)")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS duplicates (
+                point_id TEXT PRIMARY KEY,
+                duplicate_of TEXT NOT NULL,
+                source_path TEXT
+            )""")
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def _find(
+        self, point_id: str, exact: str, signature: Optional[np.ndarray]
+    ) -> Optional[str]:
+        rows = self._conn.execute(
+            "SELECT point_id FROM signatures WHERE exact_hash = ?", (exact,)
+        ).fetchall()
+        matches = [row[0] for row in rows]
+        if signature is not None:
+            keys = _band_keys(signature)
+            candidates = self._conn.execute(
+                "SELECT point_id, minhash FROM signatures WHERE point_id IN ("
+                f"SELECT point_id FROM bands WHERE band_key IN ({','.join('?' * len(keys))}))",
+                keys,
+            )
+            for candidate, blob in candidates:
+                other = np.frombuffer(blob, dtype=np.uint32)
+                if similarity(signature, other) >= self.threshold:
+                    matches.append(candidate)
+        # A chunk that is already in the index is the original, not a copy.
+        if point_id in matches:
+            return None
+        return matches[0] if matches else None
+
+    def _add(self, point_id: str, exact: str, signature: Optional[np.ndarray]) -> None:
+        self._conn.execute("DELETE FROM bands WHERE point_id = ?", (point_id,))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)",
+            (point_id, exact, None if signature is None else signature.tobytes()),
+        )
+        if signature is not None:
+            self._conn.executemany(
+                "INSERT INTO bands VALUES (?, ?)",
+                [(key, point_id) for key in _band_keys(signature)],
+            )
+
+    def find_duplicate(self, point_id: str, text: str) -> Optional[str]:
+        """Returns the id of an indexed chunk `text` duplicates, if any."""
+        with self._lock:
+            return self._find(point_id, chunk_hash(text), minhash(text))
+
+    def add(self, point_id: str, text: str) -> None:
+        """Indexes a chunk that is being ingested."""
+        with self._lock:
+            self._add(point_id, chunk_hash(text), minhash(text))
+            self._conn.commit()
+
+    def filter(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Yields the chunk records that are not duplicates, indexing each one as
+        it goes, so copies later in the same run are caught too. Duplicates
+        are recorded against the point they copy.
+        """
+        try:
+            for record in records:
+                text = record["payload"]["content"]
+                exact, signature = chunk_hash(text), minhash(text)
+                with self._lock:
+                    original = self._find(record["id"], exact, signature)
+                    if original is None:
+                        self._add(record["id"], exact, signature)
+                    else:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO duplicates VALUES (?, ?, ?)",
+                            (record["id"], original, record.get("source_path")),
+                        )
+                        self.duplicates += 1
+                if original is None:
+                    yield record
+        finally:
+            with self._lock:
+                self._conn.commit()
+
+    def referenced(self, point_ids: Iterable[str]) -> Set[str]:
+        """
+        The points among `point_ids` that a chunk outside of them was skipped
+        as a duplicate of, and so still stand in for that chunk.
+        """
+        ids = {str(point_id) for point_id in point_ids}
+        found: Set[str] = set()
+        keys = sorted(ids)
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                part = keys[start : start + SQLITE_MAX_VARIABLES]
+                rows = self._conn.execute(
+                    "SELECT point_id, duplicate_of FROM duplicates "
+                    f"WHERE duplicate_of IN ({','.join('?' * len(part))})",
+                    part,
+                )
+                found.update(original for copy, original in rows if copy not in ids)
+        return found
+
+    def remove(self, point_ids: Iterable[str]) -> None:
+        """Forgets deleted points, so their text is no longer a duplicate."""
+        keys = [(str(point_id),) for point_id in point_ids]
+        with self._lock:
+            self._conn.executemany("DELETE FROM signatures WHERE point_id = ?", keys)
+            self._conn.executemany("DELETE FROM bands WHERE point_id = ?", keys)
+            self._conn.executemany(
+                "DELETE FROM duplicates WHERE point_id = ? OR duplicate_of = ?",
+                [(key, key) for (key,) in keys],
+            )
+            self._conn.commit()
+
+    def duplicate_of(self, point_id: str) -> Optional[str]:
+        """Returns the point a skipped duplicate chunk was linked to."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT duplicate_of FROM duplicates WHERE point_id = ?", (point_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,197 @@
+"""
+Selectable embedding backends for all-MiniLM-L6-v2.
+
+Every script loads the model through SentenceTransformer(EMBEDDING_MODEL,
+**backend_kwargs()), so the backend is chosen in one place:
+
+- "torch": the full-precision PyTorch model (the default).
+- "onnx": the same model exported to ONNX, run by onnxruntime.
+- "onnx-int8": the dynamically int8-quantized ONNX export, which is the
+  fastest option on CPU-only machines.
+
+The ONNX backends need `optimum[onnxruntime]`. The backend is selected with
+the PLUG_MEMORY_EMBEDDING_BACKEND environment variable (or --embedding-backend
+for batch_ingest.py). Quantized vectors are close to, but not the same as,
+the torch ones, so the embedding cache keys them separately.
+
+Run `python embedding_backend.py parity` to compare a backend against torch
+on cosine similarity, and `python embedding_backend.py benchmark` to measure
+encode latency and throughput.
+"""
+
+import os
+import time
+import argparse
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.environ.get("PLUG_MEMORY_EMBEDDING_BACKEND", "torch")
+# ONNX files published in the sentence-transformers/all-MiniLM-L6-v2 repo.
+# The quint8 AVX2 export runs on any x86-64 CPU from the last decade; the
+# avx512/avx512_vnni/arm64 variants can be faster where supported.
+ONNX_MODEL_FILE = "onnx/model.onnx"
+ONNX_INT8_MODEL_FILE = "onnx/model_quint8_avx2.onnx"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+PARITY_MIN_COSINE = 0.99  # Worst-case cosine to the torch vector to accept a backend
+BENCHMARK_BATCH_SIZE = 16
+
+
+def _check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {backend!r}; expected one of {BACKENDS}"
+        )
+
+
+def backend_kwargs(backend: Optional[str] = None) -> Dict:
+    """Keyword arguments that make SentenceTransformer load `backend`."""
+    backend = backend or EMBEDDING_BACKEND
+    _check_backend(backend)
+    if backend == "torch":
+        return {}
+    file_name = ONNX_INT8_MODEL_FILE if backend == "onnx-int8" else ONNX_MODEL_FILE
+    return {"backend": "onnx", "model_kwargs": {"file_name": file_name}}
+
+
+def cache_model_name(model_name: str, backend: Optional[str] = None) -> str:
+    """The embedding cache key for vectors of `model_name` from `backend`."""
+    backend = backend or EMBEDDING_BACKEND
+    _check_backend(backend)
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def load_model(model_name: str = EMBEDDING_MODEL, backend: Optional[str] = None):
+    """Loads `model_name` with the given (or configured) backend."""
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name, **backend_kwargs(backend))
+
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def parity_check(reference, candidate, texts: Sequence[str]) -> Dict[str, float]:
+    """
+    Encodes `texts` with both models and compares each pair of vectors.
+    Returns the min/mean/p01 cosine similarity and whether the worst case
+    reaches PARITY_MIN_COSINE.
+    """
+    expected = np.asarray(
+        reference.encode(list(texts), batch_size=BENCHMARK_BATCH_SIZE)
+    )
+    actual = np.asarray(candidate.encode(list(texts), batch_size=BENCHMARK_BATCH_SIZE))
+    cosines = _cosines(expected, actual)
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "p01_cosine": float(np.percentile(cosines, 1)),
+        "mean_cosine": float(cosines.mean()),
+        "passed": bool(cosines.min() >= PARITY_MIN_COSINE),
+    }
+
+
+def benchmark(
+    model,
+    texts: Sequence[str],
+    batch_size: int = BENCHMARK_BATCH_SIZE,
+    queries: int = 50,
+) -> Dict[str, float]:
+    """
+    Measures single-text encode latency (like a query) and batched
+    throughput (like ingestion) for one model.
+    """
+    texts = list(texts)
+    model.encode(texts[:batch_size], batch_size=batch_size)  # Warm-up
+
+    latencies = []
+    for i in range(min(queries, len(texts))):
+        start = time.perf_counter()
+        model.encode(texts[i])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "texts_per_sec": len(texts) / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def sample_texts(count: int) -> List[str]:
+    """
+    Chunks from the local archive, to compare backends on realistic input.
+    Falls back to generated sentences when there is no archive.
+    """
+    from archive_scanner import ARCHIVE_SCAN_CACHE_PATH, scan_archive
+    from batch_ingest import ARCHIVE_PATH, iter_message_texts
+    from chunking import chunk_text
+
+    texts: List[str] = []
+    scan = scan_archive(ARCHIVE_PATH, ARCHIVE_SCAN_CACHE_PATH)
+    for file_path in scan.session_files:
+        try:
+            for _, text, _ in iter_message_texts(file_path, file_path):
+                texts.extend(chunk_text(text))
+                if len(texts) >= count:
+                    return texts[:count]
+        except Exception as e:
+            logger.debug(f"Skipping {file_path}: {e}")
+    words = "memory vector query session commit chunk model index search token".split()
+    while len(texts) < count:
+        n = len(texts)
+        texts.append(
+            " ".join(words[(n * 7 + i * 3) % len(words)] for i in range(8 + n % 40))
+        )
+    return texts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare embedding backends")
+    parser.add_argument("command", choices=["parity", "benchmark"])
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="onnx-int8",
+        help="Backend to compare against torch (parity) or to measure (benchmark)",
+    )
+    parser.add_argument("--texts", type=int, default=512, help="Texts to encode")
+    args = parser.parse_args(argv)
+
+    texts = sample_texts(args.texts)
+    print(f"⏳ Loading {EMBEDDING_MODEL} with the torch and {args.backend} backends...")
+    reference = load_model(EMBEDDING_MODEL, "torch")
+    candidate = load_model(EMBEDDING_MODEL, args.backend)
+
+    if args.command == "parity":
+        result = parity_check(reference, candidate, texts)
+        status = "✅" if result["passed"] else "❌"
+        print(
+            f"{status} {args.backend} vs torch over {result['texts']} texts: "
+            f"min cosine {result['min_cosine']:.4f}, "
+            f"p01 {result['p01_cosine']:.4f}, mean {result['mean_cosine']:.4f} "
+            f"(threshold {PARITY_MIN_COSINE})"
+        )
+        return
+
+    for name, model in (("torch", reference), (args.backend, candidate)):
+        result = benchmark(model, texts)
+        print(
+            f"📊 {name:>9}: query p50 {result['query_p50_ms']:.1f} ms, "
+            f"p95 {result['query_p95_ms']:.1f} ms, "
+            f"batch {result['texts_per_sec']:.0f} texts/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Persistent on-disk embedding cache shared by the ingestion scripts.
+
+Vectors are stored in SQLite keyed by (model name, hash of the normalized
+chunk text), so text the model has already embedded - repeated checkpoint
+content, reruns, re-ingests after a config change - is read back from disk
+instead of going through SentenceTransformer.encode again. The cache is
+bounded: once it holds more than max_entries vectors, the least recently
+used ones are evicted.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.path.expanduser("~/.plug_memory/embedding_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = 1_000_000  # ~1.6 GB of 384-d float32 vectors
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace, which the tokenizer ignores anyway."""
+    return " ".join(text.split())
+
+
+def chunk_hash(text: str) -> str:
+    """Returns the cache key for a chunk of text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed cache of embedding vectors for a single model."""
+
+    def __init__(
+        self,
+        model_name: str,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ):
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, hash)
+            ) WITHOUT ROWID""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector for each text, or None where it is missing."""
+        keys = [chunk_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), 500):
+                part = unique[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? "
+                    f"AND hash IN ({','.join('?' * len(part))})",
+                    [self.model_name, *part],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time_ns()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, self.model_name, h) for h in found],
+                )
+                self._conn.commit()
+
+        results = []
+        for key in keys:
+            blob = found.get(key)
+            results.append(None if blob is None else np.frombuffer(blob, np.float32))
+        hit_count = sum(r is not None for r in results)
+        self.hits += hit_count
+        self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        """Store vectors for the given texts, evicting old entries if needed."""
+        if not texts:
+            return
+        now = time.time_ns()
+        rows = [
+            (
+                self.model_name,
+                chunk_hash(text),
+                np.asarray(vector, dtype=np.float32).tobytes(),
+                now,
+            )
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries down to 90% of max_entries."""
+        excess = self._size - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, hash) IN ("
+            "SELECT model, hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Evicted {excess} embeddings from the cache")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def encode_with_cache(
+    model,
+    texts: Sequence[str],
+    cache: Optional[EmbeddingCache] = None,
+    batch_size: int = 32,
+) -> np.ndarray:
+    """
+    Encodes texts like model.encode(texts), but only sends the texts that are
+    missing from the cache through the model, and caches their vectors.
+    """
+    if cache is None:
+        return model.encode(list(texts), batch_size=batch_size, show_progress_bar=False)
+
+    cached = cache.get_many(texts)
+    # Texts that are missing, deduplicated so repeats are encoded only once.
+    missing = {}
+    for i, vector in enumerate(cached):
+        if vector is None:
+            missing.setdefault(chunk_hash(texts[i]), []).append(i)
+    if missing:
+        to_encode = [texts[indexes[0]] for indexes in missing.values()]
+        new_vectors = model.encode(
+            to_encode, batch_size=batch_size, show_progress_bar=False
+        )
+        cache.put_many(to_encode, new_vectors)
+        for indexes, vector in zip(missing.values(), new_vectors):
+            for i in indexes:
+                cached[i] = np.asarray(vector, dtype=np.float32)
+    return np.vstack(cached) if cached else np.empty((0, 0), dtype=np.float32)
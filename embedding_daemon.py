@@ -0,0 +1,314 @@
+"""
+Shared embedding daemon for all Plug Memory components.
+
+The API server, the Scribe, the query scripts, the hybrid memory classes and
+the ingest scripts used to load their own copy of the embedding model:
+hundreds of MB of RSS and seconds of start-up per process. The daemon loads
+one model and serves encode requests over a Unix socket. Requests that
+arrive together are encoded in one model.encode() call.
+
+Components get their model through connect_embedding_model(). It returns an
+EmbeddingClient, which has the same encode() as SentenceTransformer, when the
+daemon is running with the same model and backend, and otherwise loads the
+model in-process as before. A client whose daemon goes away falls back to
+in-process encoding too.
+
+Wire format: every message is a 4-byte big-endian length followed by the
+body. A request is a JSON object ({"op": "encode", "texts": [...],
+"batch_size": n} or {"op": "info"}). An encode response is a JSON header
+({"shape": [rows, dim]} or {"error": "..."}) followed by the float32 vectors.
+"""
+
+import os
+import json
+import time
+import struct
+import socket
+import argparse
+import logging
+import threading
+import socketserver
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from embedding_backend import EMBEDDING_BACKEND, EMBEDDING_MODEL, load_model
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_SOCKET_PATH = os.path.expanduser("~/.plug_memory/embedding.sock")
+MAX_COALESCED_TEXTS = 512  # Texts from concurrent requests encoded in one call
+DAEMON_RETRY_SECONDS = 30  # After a failure, use the local model this long
+CLIENT_TIMEOUT = 120  # Seconds to wait for the daemon to answer a request
+CONNECT_RETRIES = 50  # Attempts while the daemon's accept backlog is full
+
+_HEADER = struct.Struct(">I")
+
+
+def _send(sock: socket.socket, body: bytes) -> None:
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        part = sock.recv(min(size - len(data), 1 << 20))
+        if not part:
+            raise ConnectionError("Embedding daemon closed the connection")
+        data.extend(part)
+    return bytes(data)
+
+
+def _recv(sock: socket.socket) -> bytes:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return _recv_exact(sock, size)
+
+
+class _EncodeQueue:
+    """Runs every encode through one thread, merging requests that queue up."""
+
+    def __init__(self, model, max_texts: int = MAX_COALESCED_TEXTS):
+        self.model = model
+        self.max_texts = max_texts
+        self.calls = 0
+        self._queue: Queue = Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        future: Future = Future()
+        self._queue.put((texts, batch_size, future))
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            group = [self._queue.get()]
+            count = len(group[0][0])
+            while count < self.max_texts:
+                try:
+                    item = self._queue.get_nowait()
+                except Empty:
+                    break
+                group.append(item)
+                count += len(item[0])
+
+            texts = [text for item in group for text in item[0]]
+            try:
+                vectors = np.asarray(
+                    self.model.encode(
+                        texts,
+                        batch_size=max(item[1] for item in group),
+                        show_progress_bar=False,
+                    ),
+                    dtype=np.float32,
+                )
+                self.calls += 1
+            except Exception as e:
+                for _, _, future in group:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for item_texts, _, future in group:
+                future.set_result(vectors[start : start + len(item_texts)])
+                start += len(item_texts)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        server: EmbeddingDaemon = self.server  # type: ignore[assignment]
+        while True:
+            try:
+                request = json.loads(_recv(self.request))
+            except (ConnectionError, OSError):
+                return
+            if request.get("op") == "info":
+                _send(self.request, json.dumps(server.info).encode("utf-8"))
+                continue
+            try:
+                vectors = server.encoder.encode(
+                    list(request["texts"]), int(request.get("batch_size", 32))
+                )
+            except Exception as e:
+                logger.error(f"Encode failed: {e}")
+                _send(self.request, json.dumps({"error": str(e)}).encode("utf-8"))
+                continue
+            header = {"shape": list(vectors.shape)}
+            _send(self.request, json.dumps(header).encode("utf-8"))
+            _send(self.request, vectors.tobytes())
+
+
+class EmbeddingDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves encode requests for one loaded model on a Unix socket."""
+
+    daemon_threads = True
+    request_queue_size = 128  # Connections waiting to be accepted
+
+    def __init__(
+        self,
+        model,
+        socket_path: str = EMBEDDING_SOCKET_PATH,
+        model_name: str = EMBEDDING_MODEL,
+        backend: Optional[str] = None,
+    ):
+        directory = os.path.dirname(socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(socket_path):
+            # A socket left behind by a daemon that did not shut down cleanly.
+            if _daemon_info(socket_path) is not None:
+                raise RuntimeError(f"An embedding daemon is already on {socket_path}")
+            os.unlink(socket_path)
+        self.socket_path = socket_path
+        self.info = {"model": model_name, "backend": backend or EMBEDDING_BACKEND}
+        self.encoder = _EncodeQueue(model)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def _connect(sock: socket.socket, socket_path: str) -> None:
+    """
+    Connects to the daemon. A Unix socket with a timeout is non-blocking, so
+    a connect while the accept backlog is full fails with EAGAIN instead of
+    waiting; retry it briefly.
+    """
+    for attempt in range(CONNECT_RETRIES):
+        try:
+            sock.connect(socket_path)
+            return
+        except BlockingIOError:
+            if attempt == CONNECT_RETRIES - 1:
+                raise
+            time.sleep(0.01)
+
+
+def _daemon_info(socket_path: str, timeout: float = 2.0) -> Optional[Dict]:
+    """The model and backend of the daemon on `socket_path`, or None."""
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            _connect(sock, socket_path)
+            _send(sock, b'{"op": "info"}')
+            return json.loads(_recv(sock))
+    except (OSError, ValueError):
+        return None
+
+
+class EmbeddingClient:
+    """
+    Encodes through the embedding daemon, with SentenceTransformer's encode()
+    signature. If the daemon stops answering, `load_local` is used to load
+    the model in-process.
+    """
+
+    def __init__(
+        self,
+        load_local: Callable[[], object],
+        socket_path: str = EMBEDDING_SOCKET_PATH,
+        timeout: float = CLIENT_TIMEOUT,
+    ):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._load_local = load_local
+        self._local = None
+        self._local_lock = threading.Lock()
+        self._daemon_down_until = 0.0
+
+    def _local_model(self):
+        with self._local_lock:
+            if self._local is None:
+                logger.warning("Embedding daemon unavailable; loading model locally")
+                self._local = self._load_local()
+            return self._local
+
+    def _encode_remote(self, texts: List[str], batch_size: int) -> np.ndarray:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            _connect(sock, self.socket_path)
+            request = {"op": "encode", "texts": texts, "batch_size": batch_size}
+            _send(sock, json.dumps(request).encode("utf-8"))
+            header = json.loads(_recv(sock))
+            if "error" in header:
+                raise RuntimeError(f"Embedding daemon error: {header['error']}")
+            data = _recv(sock)
+        return np.frombuffer(data, dtype=np.float32).reshape(header["shape"])
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        show_progress_bar: Optional[bool] = None,
+        **kwargs,
+    ) -> np.ndarray:
+        # Options the daemon doesn't implement go straight to the local model.
+        if kwargs or time.monotonic() < self._daemon_down_until:
+            return self._local_model().encode(
+                sentences,
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                **kwargs,
+            )
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        try:
+            vectors = self._encode_remote(texts, batch_size)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Embedding daemon request failed: {e}")
+            self._daemon_down_until = time.monotonic() + DAEMON_RETRY_SECONDS
+            return self._local_model().encode(
+                sentences, batch_size=batch_size, show_progress_bar=show_progress_bar
+            )
+        return vectors[0] if single else vectors
+
+
+def connect_embedding_model(
+    load_local: Callable[[], object],
+    model_name: str = EMBEDDING_MODEL,
+    backend: Optional[str] = None,
+    socket_path: str = EMBEDDING_SOCKET_PATH,
+):
+    """
+    Returns a client of the embedding daemon if it is serving `model_name`
+    with `backend`, and otherwise the model loaded in-process by `load_local`.
+    """
+    info = _daemon_info(socket_path)
+    expected = {"model": model_name, "backend": backend or EMBEDDING_BACKEND}
+    if info == expected:
+        logger.info(f"Using the embedding daemon on {socket_path}")
+        return EmbeddingClient(load_local, socket_path)
+    if info is not None:
+        logger.warning(
+            f"Embedding daemon serves {info}, not {expected}; loading model locally"
+        )
+    return load_local()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Shared embedding daemon")
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET_PATH)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"⏳ Loading embedding model: {EMBEDDING_MODEL} ({args.backend} backend)...")
+    model = load_model(EMBEDDING_MODEL, args.backend)
+    server = EmbeddingDaemon(model, args.socket, EMBEDDING_MODEL, args.backend)
+    print(f"✅ Embedding daemon listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping embedding daemon.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
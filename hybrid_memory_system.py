@@ -10,6 +10,8 @@ from langchain.prompts import PromptTemplate
 from langchain.schema import BaseRetriever
 import qdrant_client
 from sentence_transformers import SentenceTransformer
+from embedding_backend import backend_kwargs
+from embedding_daemon import connect_embedding_model
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,7 +25,10 @@ class HybridMemorySystem:
         self.qdrant_client = qdrant_client
 
         # Initialize embedding model
-        self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedding_model = connect_embedding_model(
+            lambda: SentenceTransformer("all-MiniLM-L6-v2", **backend_kwargs()),
+            "all-MiniLM-L6-v2",
+        )
 
         # Initialize LangChain vector store
         self.vector_store = Qdrant(
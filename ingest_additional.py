@@ -4,12 +4,35 @@ Additional ingestion script for checkpoint and logs files
 """
 
 import os
-import json
-import glob
+import logging
 import uuid
-from typing import List, Dict
+import itertools
+from typing import Dict, Iterator, List, Optional
 from sentence_transformers import SentenceTransformer
 import qdrant_client
+from batch_ingest import (
+    EMBED_BATCH_SIZE,
+    _slices,
+    embed_records,
+    iter_message_texts,
+    message_key,
+    pack_record,
+)
+from archive_scanner import ARCHIVE_SCAN_CACHE_PATH, scan_archive
+from chunking import chunk_text
+from dedup import DedupIndex
+from content_store import SLIM_PAYLOADS, ContentStore, slim_points
+from embedding_backend import backend_kwargs, cache_model_name
+from embedding_daemon import connect_embedding_model
+from embedding_cache import EmbeddingCache
+from json_stream import iter_messages
+from ingest_manifest import file_content_hash, make_point_id
+from packing import pack_messages
+from upsert_writer import AdaptiveBatchSizer, UpsertWriter, UPSERT_RETRIES
+from dead_letter import DeadLetterQueue
+from stale_points import StalePointCleaner, with_source_version
+from ingest_generation import IngestGeneration
+from collection_schema import with_timestamp_epoch
 
 # --- CONFIGURATION ---
 QDRANT_HOST = "localhost"
@@ -18,6 +41,7 @@ COLLECTION_NAME = "codex_history"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 VECTOR_SIZE = 384
 ARCHIVE_PATH = os.path.expanduser("~/.gemini/tmp")
+PACK_SHORT_MESSAGES = False  # Pack consecutive short messages into shared chunks
 
 
 def get_qdrant_client():
@@ -26,98 +50,165 @@ def get_qdrant_client():
 
 def get_embedding_model():
     print(f"⏳ Loading embedding model: {EMBEDDING_MODEL}...")
-    model = SentenceTransformer(EMBEDDING_MODEL)
+    model = connect_embedding_model(
+        lambda: SentenceTransformer(EMBEDDING_MODEL, **backend_kwargs()),
+        EMBEDDING_MODEL,
+    )
     print("✅ Model loaded.")
     return model
 
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    if not isinstance(text, str):
-        return []
-    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size - overlap)]
-
-
-def process_additional_files(model: SentenceTransformer) -> List[Dict]:
-    """Process checkpoint and logs files that weren't included in original ingestion."""
-    points_to_upsert = []
+def process_additional_files(
+    model: SentenceTransformer,
+    writer: UpsertWriter,
+    cache: Optional[EmbeddingCache] = None,
+    pack: bool = PACK_SHORT_MESSAGES,
+    dedup: Optional[DedupIndex] = None,
+    content_store: Optional[ContentStore] = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+) -> Dict[str, str]:
+    """
+    Process checkpoint and logs files that weren't included in original ingestion.
+    Each file's chunks are embedded in slices of `batch_size` and handed to
+    the writer as they are made, so memory stays flat and embedding overlaps
+    with the upserts. Points are stamped with their file's content hash, like
+    batch_ingest.py does; returns that hash for every file whose chunks were
+    all submitted, so its points from other versions can be deleted.
+    With `pack`, consecutive short messages of a session share a chunk. With a
+    dedup index, chunks that repeat already ingested content are skipped. With
+    a content store, chunk text is kept there instead of in the payloads.
+    """
+    versions: Dict[str, str] = {}
 
     # Find checkpoint and logs files
-    checkpoint_files = glob.glob(
-        os.path.join(ARCHIVE_PATH, "**", "checkpoint*.json"), recursive=True
-    )
-    logs_files = glob.glob(
-        os.path.join(ARCHIVE_PATH, "**", "logs.json"), recursive=True
-    )
-
-    all_files = checkpoint_files + logs_files
+    scan = scan_archive(ARCHIVE_PATH, ARCHIVE_SCAN_CACHE_PATH)
+    all_files = scan.checkpoint_files + scan.logs_files
     print(f"Found {len(all_files)} additional files to process")
 
     for file_path in all_files:
         print(f"Processing {os.path.basename(file_path)}...")
 
+        source = os.path.relpath(file_path, ARCHIVE_PATH)
+        try:
+            version = file_content_hash(file_path)
+        except OSError as e:
+            print(f"Error reading {file_path}: {e}")
+            continue
+        records = with_source_version(_file_records(file_path, source, pack), version)
+        # Checkpoints repeat a lot of session content: drop the copies before
+        # they are embedded, and most of the rest come from the embedding cache.
+        if dedup is not None:
+            records = dedup.filter(records)
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            for part in _slices(records, batch_size):
+                points = embed_records(part, model, cache=cache)
+                if content_store is not None:
+                    points = slim_points(points, content_store)
+                # Blocks while the writer has too many unacknowledged batches.
+                writer.submit(points)
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
             continue
+        versions[file_path] = version
 
-        # Handle different file formats
-        messages = []
-        if isinstance(data, list):
-            if data and "sessionId" in data[0]:
-                # logs.json format
-                messages = data
-            else:
-                # checkpoint.json format
-                messages = data
-
-        for entry in messages:
-            # Extract text content
-            text_content = ""
-            if "message" in entry:
-                # logs.json format
-                text_content = entry.get("message", "")
-            elif "parts" in entry:
-                # checkpoint.json format
-                parts = entry.get("parts", [])
-                if parts and "text" in parts[0]:
-                    text_content = parts[0]["text"]
-
-            if not text_content:
-                continue
-
-            chunks = chunk_text(text_content)
-            for i, chunk in enumerate(chunks):
-                vector = model.encode(chunk).tolist()
-                point_id = str(uuid.uuid4())
-
-                # Extract commit_id from path
-                path_parts = file_path.split(os.sep)
-                commit_id = "unknown"
-                if ".gemini" in path_parts and "tmp" in path_parts:
-                    gemini_index = path_parts.index("tmp")
-                    if gemini_index + 1 < len(path_parts):
-                        commit_id = path_parts[gemini_index + 1]
-
-                payload = {
-                    "content": chunk,
-                    "timestamp": entry.get("timestamp"),
-                    "event_type": entry.get("type") or entry.get("role"),
-                    "original_message_id": entry.get("messageId") or str(uuid.uuid4()),
-                    "source_file": os.path.basename(file_path),
-                    "commit_id": commit_id,
-                    "chunk_index": i,
-                }
-
-                points_to_upsert.append(
-                    {"id": point_id, "vector": vector, "payload": payload}
-                )
-
-    return points_to_upsert
+    if dedup is not None:
+        print(f"Skipped {dedup.duplicates} duplicate chunks")
+    if cache is not None:
+        print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses")
+    return versions
+
+
+def delete_superseded(cleaner: StalePointCleaner, versions: Dict[str, str]) -> int:
+    """Deletes the points of each file that came from its other versions."""
+    deleted = 0
+    for file_path, version in versions.items():
+        try:
+            deleted += cleaner.delete_superseded(
+                os.path.relpath(file_path, ARCHIVE_PATH),
+                version,
+                os.path.basename(file_path),
+                _commit_id(file_path),
+            )
+        except Exception as e:
+            print(f"⚠️  Could not delete stale points of {file_path}: {e}")
+    return deleted
+
+
+def _file_records(file_path: str, source: str, pack: bool) -> Iterator[Dict]:
+    """Yields a file's chunk records, streaming its messages."""
+    if pack:
+        yield from _packed_records(file_path, source)
+        return
+    # Streams large logs.json/checkpoint arrays instead of loading them whole
+    for index, entry in enumerate(iter_messages(file_path)):
+        if not isinstance(entry, dict):
+            continue
+        yield from _entry_records(file_path, source, index, entry)
+
+
+def _commit_id(file_path: str) -> str:
+    """Extracts the commit_id from a path (the directory under .gemini/tmp)."""
+    path_parts = file_path.split(os.sep)
+    commit_id = "unknown"
+    if ".gemini" in path_parts and "tmp" in path_parts:
+        gemini_index = path_parts.index("tmp")
+        if gemini_index + 1 < len(path_parts):
+            commit_id = path_parts[gemini_index + 1]
+    return commit_id
+
+
+def _packed_records(file_path: str, source: str) -> Iterator[Dict]:
+    """Yields a file's chunk records, packing consecutive short messages."""
+    for group in pack_messages(iter_message_texts(file_path, source)):
+        if len(group) > 1:
+            yield pack_record(file_path, source, _commit_id(file_path), group)
+        else:
+            _, (index, entry) = group[0]
+            yield from _entry_records(file_path, source, index, entry)
+
+
+def _entry_records(file_path: str, source: str, index: int, entry: Dict) -> List[Dict]:
+    """Builds the chunk records of one logs/checkpoint message entry."""
+    records = []
+    # Extract text content
+    text_content = ""
+    if "message" in entry:
+        # logs.json format
+        text_content = entry.get("message", "")
+    elif "parts" in entry:
+        # checkpoint.json format
+        parts = entry.get("parts", [])
+        if parts and "text" in parts[0]:
+            text_content = parts[0]["text"]
+
+    if not text_content:
+        return records
+
+    commit_id = _commit_id(file_path)
+    chunks = chunk_text(text_content)
+    for i, chunk in enumerate(chunks):
+        point_id = make_point_id(source, message_key(entry, index), i)
+        payload = with_timestamp_epoch(
+            {
+                "content": chunk,
+                "timestamp": entry.get("timestamp"),
+                "event_type": entry.get("type") or entry.get("role"),
+                "original_message_id": entry.get("messageId") or str(uuid.uuid4()),
+                "source_file": os.path.basename(file_path),
+                "commit_id": commit_id,
+                "source_relpath": source,
+                "chunk_index": i,
+            }
+        )
+        records.append({"id": point_id, "payload": payload})
+
+    return records
 
 
 def main():
+    # Log batch-size changes as the upserts run; httpx logs every request.
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
     client = get_qdrant_client()
     model = get_embedding_model()
 
@@ -131,36 +222,73 @@ def main():
         )
         return
 
-    # Process additional files
-    points = process_additional_files(model)
+    # Process additional files, upserting in adaptively sized batches
+    # without waiting for each one to be indexed
+    cache = EmbeddingCache(cache_model_name(EMBEDDING_MODEL))
+    # Chunk text goes to the local content store, not into Qdrant.
+    content_store = ContentStore() if SLIM_PAYLOADS else None
+    done = itertools.count(1)
+    sizer = AdaptiveBatchSizer()
+
+    def committed(batch):
+        print(f"Upserted batch {next(done)} ({len(batch)} points)")
 
-    if not points:
+    def dead_lettered(batch, error):
+        print(
+            f"Error upserting batch of {len(batch)} points: {error} "
+            "(saved to the dead-letter queue)"
+        )
+
+    def failed(batch, error):
+        print(f"Error upserting batch of {len(batch)} points: {error}")
+
+    dead_letter = DeadLetterQueue()
+    dedup = DedupIndex()
+    generation = IngestGeneration()
+    with UpsertWriter(
+        client,
+        COLLECTION_NAME,
+        on_commit=committed,
+        on_error=failed,
+        retries=UPSERT_RETRIES,
+        dead_letter=dead_letter,
+        on_dead_letter=dead_lettered,
+        batch_sizer=sizer,
+        generation=generation,
+    ) as writer:
+        versions = process_additional_files(
+            model,
+            writer,
+            cache,
+            dedup=dedup,
+            content_store=content_store,
+        )
+
+    submitted = writer.points_written + writer.points_dead_lettered
+    if not submitted:
         print("No additional points to add.")
         return
 
-    print(f"Adding {len(points)} points to collection...")
+    print(f"Added {submitted} points to collection.")
+    # Every point is acknowledged now; drop what rewritten files left behind.
+    cleaner = StalePointCleaner(
+        client, COLLECTION_NAME, content_store, dedup, generation
+    )
+    deleted = delete_superseded(cleaner, versions)
+    if deleted:
+        print(f"🧹 Deleted {deleted} stale points of rewritten files")
+    stats = sizer.summary()
+    print(
+        f"Upsert batches: {stats['min_size']}-{stats['max_size']} points "
+        f"(mean {stats['mean_size']:.0f}, {stats['mean_latency']:.2f}s each), "
+        f"{stats['points_per_sec']:.0f} points/sec"
+    )
 
-    # Upsert in batches
-    batch_size = 50  # Smaller batches
-    for i in range(0, len(points), batch_size):
-        batch = points[i : i + batch_size]
-        try:
-            client.upsert(
-                collection_name=COLLECTION_NAME,
-                points=[
-                    qdrant_client.http.models.PointStruct(
-                        id=p["id"], vector=p["vector"], payload=p["payload"]
-                    )
-                    for p in batch
-                ],
-                wait=True,
-            )
-            print(
-                f"Upserted batch {i // batch_size + 1}/{(len(points) + batch_size - 1) // batch_size}"
-            )
-        except Exception as e:
-            print(f"Error upserting batch {i // batch_size + 1}: {e}")
-            continue
+    if writer.points_dead_lettered:
+        print(
+            f"⚠️  {writer.points_dead_lettered} points are in the dead-letter queue; "
+            "run `python dead_letter.py replay` once Qdrant is healthy."
+        )
 
     final_count = client.count(collection_name=COLLECTION_NAME, exact=True)
     print(f"✅ Final collection count: {final_count.count}")
@@ -0,0 +1,61 @@
+"""
+Ingest generation counter shared by the ingestion scripts and the readers.
+
+Every ingestion path bumps the counter once Qdrant has accepted a change to
+the collection: an upsert batch, a replayed dead-letter batch, a deletion of
+stale points. Readers that cache search results remember the generation
+they were computed at and drop them when it changes, so a cached result is
+never older than the last change, whichever process made it.
+
+The counter is a small file; bumps take an exclusive lock on a sidecar lock
+file and replace the counter atomically, so concurrent writers never lose an
+increment and readers never see a partial write.
+"""
+
+import os
+import fcntl
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+INGEST_GENERATION_PATH = os.path.expanduser("~/.plug_memory/ingest_generation")
+
+
+class IngestGeneration:
+    """A monotonically increasing counter stored in a file."""
+
+    def __init__(self, path: str = INGEST_GENERATION_PATH):
+        self.path = path
+
+    def current(self) -> int:
+        """The current generation; 0 if nothing has been ingested yet."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable ingest generation {self.path}: {e}")
+            return -1  # Matches no cached generation
+
+    def last_changed(self) -> Optional[float]:
+        """When the counter was last bumped (a Unix time), or None if never."""
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def bump(self) -> int:
+        """Increments the counter and returns the new generation."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            generation = max(self.current(), 0) + 1
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(generation))
+            os.replace(tmp_path, self.path)
+        return generation
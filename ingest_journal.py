@@ -0,0 +1,121 @@
+"""
+Durable progress journal for bulk ingestion.
+
+The ingest manifest only learns about a file once all of its points are in
+Qdrant, so a crash or a Qdrant restart in the middle of a large file used to
+mean re-embedding it from the start. The journal records, as each upsert
+batch is acknowledged, which chunks of which file version (by content hash)
+it contained. `batch_ingest.py --resume` skips those chunks before they
+reach the encoder. Entries are dropped once the manifest has recorded the
+file as complete.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+INGEST_JOURNAL_PATH = os.path.expanduser("~/.plug_memory/ingest_journal.db")
+
+
+def _runs(seqs: Iterable[int]) -> List[Tuple[int, int]]:
+    """Collapses sequence numbers into sorted, inclusive (first, last) runs."""
+    runs: List[List[int]] = []
+    for seq in sorted(set(seqs)):
+        if runs and seq == runs[-1][1] + 1:
+            runs[-1][1] = seq
+        else:
+            runs.append([seq, seq])
+    return [(first, last) for first, last in runs]
+
+
+class IngestJournal:
+    """SQLite record of the chunks of each file version that Qdrant has committed."""
+
+    def __init__(self, path: str = INGEST_JOURNAL_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS committed_batches (
+                source_path TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                first_seq INTEGER NOT NULL,
+                last_seq INTEGER NOT NULL,
+                committed_at INTEGER NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS committed_batches_file "
+            "ON committed_batches (source_path, sha256)"
+        )
+        self._conn.commit()
+
+    def record(self, batches: Dict[Tuple[str, str], Iterable[int]]) -> None:
+        """
+        Records one acknowledged upsert batch, given the sequence numbers it
+        held for each (source path, sha256) file version.
+        """
+        now = time.time_ns()
+        rows = [
+            (os.path.abspath(source_path), sha256, first, last, now)
+            for (source_path, sha256), seqs in batches.items()
+            for first, last in _runs(seqs)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO committed_batches "
+                "(source_path, sha256, first_seq, last_seq, committed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def committed(self, source_path: str, sha256: str) -> Set[int]:
+        """Returns the sequence numbers already committed for a file version."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT first_seq, last_seq FROM committed_batches "
+                "WHERE source_path = ? AND sha256 = ?",
+                (os.path.abspath(source_path), sha256),
+            ).fetchall()
+        seqs: Set[int] = set()
+        for first, last in rows:
+            seqs.update(range(first, last + 1))
+        return seqs
+
+    def forget(self, source_paths: Iterable[str]) -> None:
+        """Drops the entries of files that no longer need them."""
+        keys = [(os.path.abspath(p),) for p in source_paths]
+        if not keys:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM committed_batches WHERE source_path = ?", keys
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Drops every entry, e.g. before a run that doesn't resume."""
+        with self._lock:
+            self._conn.execute("DELETE FROM committed_batches")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM committed_batches"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,122 @@
+"""
+Persistent ingest manifest and deterministic point IDs.
+
+The manifest remembers, per source file, the size, mtime and content hash
+that were last ingested, so reruns can skip unchanged files. Point IDs are
+derived from the source file, message id and chunk index, so re-ingesting a
+file overwrites its existing points instead of duplicating them.
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = os.path.expanduser("~/.plug_memory/ingest_manifest.json")
+
+# Fixed namespace so the same chunk always maps to the same point ID.
+POINT_ID_NAMESPACE = uuid.UUID("5b0e7a52-3c1d-4f0e-9d2a-8f6c1e2b7d41")
+
+
+def make_point_id(source: str, message_key: Any, chunk_index: int) -> str:
+    """Returns a stable UUID for a chunk of a message in a source file."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}|{message_key}|{chunk_index}"))
+
+
+def file_content_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path: str) -> Dict[str, Any]:
+    """Returns the current size, mtime and content hash of a file."""
+    stat = os.stat(file_path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_content_hash(file_path),
+    }
+
+
+class IngestManifest:
+    """Tracks which version of each source file has been ingested."""
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the manifest from disk, starting empty if it is missing or corrupt."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable ingest manifest {self.path}: {e}")
+            return {}
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.abspath(file_path)
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Return the manifest entry for a file, if any."""
+        return self.entries.get(self._key(file_path))
+
+    def fingerprint(self, file_path: str) -> Dict[str, Any]:
+        """Return the current size, mtime and content hash of a file."""
+        return file_fingerprint(file_path)
+
+    def is_unchanged(self, file_path: str) -> bool:
+        """
+        Check whether a file matches its last ingested version. Matching size
+        and mtime is trusted without reading the file; the content hash is
+        only computed when the stat changed but the size did not.
+        """
+        entry = self.get(file_path)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return False
+
+        if stat.st_size != entry.get("size"):
+            return False
+        if stat.st_mtime_ns == entry.get("mtime_ns"):
+            return True
+        if file_content_hash(file_path) == entry.get("sha256"):
+            # Touched but not modified: remember the new mtime.
+            entry["mtime_ns"] = stat.st_mtime_ns
+            return True
+        return False
+
+    def record(self, file_path: str, fingerprint: Dict[str, Any], **extra) -> None:
+        """Record a file as ingested at the given fingerprint."""
+        entry = dict(fingerprint)
+        entry.update(extra)
+        self.entries[self._key(file_path)] = entry
+
+    def forget(self, file_path: str) -> None:
+        """Drop a file from the manifest."""
+        self.entries.pop(self._key(file_path), None)
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,153 @@
+"""
+Streaming reader for conversation JSON files.
+
+logs.json and checkpoint files can be large, and json.load() has to hold the
+whole document in memory before the first message can be chunked. This
+module yields message entries one at a time from either a top-level array or
+a {"messages": [...]} object, reading the file in blocks, so memory stays
+flat regardless of file size. Small files still go through json.load(),
+which is faster when memory is not a concern.
+"""
+
+import os
+import json
+from typing import Any, Dict, Iterator, List, TextIO
+
+STREAMING_THRESHOLD_BYTES = 8 * 1024 * 1024  # Files below this are json.load()ed
+READ_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+def extract_messages(data) -> List[Dict]:
+    """Returns the list of message entries for any of the supported file formats."""
+    if isinstance(data, list):
+        # logs.json (sessionId/messageId/type/message) and checkpoint.json
+        # (role/parts) are both plain arrays of messages
+        return data
+    if isinstance(data, dict):
+        # session.json format (has messages array)
+        return data.get("messages", [])
+    return []
+
+
+class _StreamReader:
+    """Incrementally decodes JSON values from a text file."""
+
+    def __init__(self, f: TextIO, read_size: int = READ_SIZE):
+        self._f = f
+        self._read_size = read_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_size: int = 0) -> bool:
+        """Read another block, dropping consumed input. Returns False at EOF."""
+        if self._eof:
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        block = self._f.read(max(self._read_size, min_size))
+        if not block:
+            self._eof = True
+            return False
+        self._buf += block
+        return True
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buf, self._pos)
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # Most likely the value continues past the buffer. Read at least
+                # as much again, so a huge value costs O(n log n), not O(n^2).
+                if not self._fill(len(self._buf) - self._pos):
+                    raise
+                continue
+            # A number or literal ending exactly at the buffer edge may be cut off.
+            if end == len(self._buf) and self._buf[end - 1] not in '"]}':
+                if self._fill():
+                    continue
+            self._pos = end
+            return obj
+
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the elements of the array starting at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                self._pos -= 1
+                raise self._error("Expecting ',' or ']'")
+
+
+def stream_messages(file_path: str) -> Iterator[Dict]:
+    """Yield message entries from a file without loading it all into memory."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        reader = _StreamReader(f)
+        first = reader.peek()
+        if first == "[":
+            yield from reader.iter_array()
+            return
+        if first != "{":
+            raise reader._error("Expecting '[' or '{'")
+
+        # Walk the object's keys, streaming "messages" and skipping the rest.
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "messages" and reader.peek() == "[":
+                yield from reader.iter_array()
+            else:
+                reader.value()
+            if reader.peek() == "}":
+                return
+            reader.expect(",")
+
+
+def iter_messages(
+    file_path: str, threshold: int = STREAMING_THRESHOLD_BYTES
+) -> Iterator[Dict]:
+    """
+    Yield the message entries of a conversation file, streaming it if it is
+    larger than `threshold` bytes. Raises json.JSONDecodeError or OSError like
+    json.load() would, possibly after some messages have been yielded.
+    """
+    if os.path.getsize(file_path) < threshold:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        yield from extract_messages(data)
+    else:
+        yield from stream_messages(file_path)
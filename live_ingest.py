@@ -1,13 +1,27 @@
 
 import os
+import logging
 import time
 import json
-import uuid
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional, Tuple
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from sentence_transformers import SentenceTransformer
 import qdrant_client
+from batch_ingest import embed_records, message_key
+from chunking import chunk_text
+from dedup import DedupIndex
+from content_store import SLIM_PAYLOADS, ContentStore, slim_points
+from embedding_backend import backend_kwargs, cache_model_name
+from embedding_daemon import connect_embedding_model
+from embedding_cache import EmbeddingCache
+from ingest_manifest import IngestManifest, make_point_id
+from upsert_writer import AdaptiveBatchSizer, UpsertWriter, UPSERT_RETRIES
+from dead_letter import DeadLetterQueue
+from ingest_generation import IngestGeneration
+from stale_points import StalePointCleaner
+from collection_schema import ensure_payload_indexes, with_timestamp_epoch
 
 # --- CONFIGURATION (from our previous scripts) ---
 QDRANT_HOST = "localhost"
@@ -16,11 +30,25 @@ COLLECTION_NAME = "codex_history"
 EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
 VECTOR_SIZE = 384
 ARCHIVE_PATH = os.path.expanduser("~/.gemini/tmp")
+# Remembers how many messages of each session file have been ingested.
+SCRIBE_STATE_PATH = os.path.expanduser("~/.plug_memory/scribe_state.json")
+DEBOUNCE_SECONDS = 1.0  # Events for the same file within this window are merged
+SCRIBE_WORKERS = 2  # Ingestion worker threads sharing the model and client
+STATUS_INTERVAL = 30  # Seconds between queue status lines while busy
 
 # --- QDRANT AND MODEL SINGLETONS ---
 # We only want to load these once to save resources.
 _qdrant_client = None
 _embedding_model = None
+_embedding_cache = None
+_dedup_index = None
+_dead_letter = None
+_batch_sizer = None
+_content_store = None
+_stale_point_cleaner = None
+_ingest_generation = None
+_scribe_state = None
+_state_lock = threading.Lock()
 
 def get_qdrant_client():
     global _qdrant_client
@@ -32,96 +60,350 @@ def get_embedding_model():
     global _embedding_model
     if _embedding_model is None:
         print(f"⏳ One-time load of embedding model: {EMBEDDING_MODEL}...")
-        _embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        _embedding_model = connect_embedding_model(
+            lambda: SentenceTransformer(EMBEDDING_MODEL, **backend_kwargs()), EMBEDDING_MODEL)
         print("✅ Model loaded and ready.")
     return _embedding_model
 
-# --- PROCESSING LOGIC (adapted from batch_ingest.py) ---
+def get_embedding_cache():
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(cache_model_name(EMBEDDING_MODEL))
+    return _embedding_cache
+
+def get_dedup_index():
+    global _dedup_index
+    if _dedup_index is None:
+        _dedup_index = DedupIndex()
+    return _dedup_index
+
+def get_dead_letter_queue():
+    global _dead_letter
+    if _dead_letter is None:
+        _dead_letter = DeadLetterQueue()
+    return _dead_letter
+
+def get_batch_sizer():
+    # Shared by every file's writer, so batch sizes adapt across files.
+    global _batch_sizer
+    if _batch_sizer is None:
+        _batch_sizer = AdaptiveBatchSizer()
+    return _batch_sizer
+
+def get_content_store():
+    # Only used with slim payloads; otherwise the text stays in Qdrant.
+    global _content_store
+    if _content_store is None and SLIM_PAYLOADS:
+        _content_store = ContentStore()
+    return _content_store
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    if not isinstance(text, str):
-        return []
-    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size - overlap)]
+def get_ingest_generation():
+    # Bumped after every change, so the API server drops cached results.
+    global _ingest_generation
+    if _ingest_generation is None:
+        _ingest_generation = IngestGeneration()
+    return _ingest_generation
+
+def get_stale_point_cleaner():
+    global _stale_point_cleaner
+    if _stale_point_cleaner is None:
+        _stale_point_cleaner = StalePointCleaner(
+            get_qdrant_client(), COLLECTION_NAME, get_content_store(), get_dedup_index(),
+            get_ingest_generation())
+    return _stale_point_cleaner
+
+def get_scribe_state():
+    global _scribe_state
+    if _scribe_state is None:
+        _scribe_state = IngestManifest(SCRIBE_STATE_PATH)
+    return _scribe_state
+
+# --- PROCESSING LOGIC (adapted from batch_ingest.py) ---
 
 def process_and_ingest_file(file_path: str):
-    """Processes a single session file and upserts its content to Qdrant."""
-    print(f"\n📜 New Scroll Detected: {os.path.basename(file_path)}")
+    """
+    Ingests the messages of a session file that have not been ingested yet.
+    Gemini rewrites session files in place as a conversation grows, so the
+    Scribe remembers how many messages it has seen per file and only embeds
+    the new ones. The last message seen is re-processed too, in case it was
+    still being written; if unchanged, its vector comes from the cache.
+
+    When a file is ingested from the start, the points left over from its
+    previous version are deleted afterwards; when it is gone, all of its
+    points are.
+    """
+    state = get_scribe_state()
+    with _state_lock:
+        if state.is_unchanged(file_path):
+            return
+        entry_state = dict(state.get(file_path) or {})
+
+    commit_id = os.path.basename(os.path.dirname(os.path.dirname(file_path)))
+    source = os.path.relpath(file_path, ARCHIVE_PATH)
+    if not os.path.exists(file_path):
+        # The file may have been ingested by batch_ingest.py rather than by
+        # the Scribe, so its points are looked up even without Scribe state.
+        deleted = get_stale_point_cleaner().delete_file(source, os.path.basename(file_path), commit_id)
+        if entry_state:
+            with _state_lock:
+                state.forget(file_path)
+                state.save()
+        if entry_state or deleted:
+            print(f"\n🗑️  Scroll Removed: {os.path.basename(file_path)} ({deleted} memories deleted)")
+        return
+
     client = get_qdrant_client()
     model = get_embedding_model()
-    points_to_upsert = []
+    records = []
 
     try:
+        fingerprint = state.fingerprint(file_path)
         with open(file_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
     except (json.JSONDecodeError, FileNotFoundError, PermissionError) as e:
         print(f"⚠️  Could not read or parse file: {e}")
         return
 
-    commit_id = os.path.basename(os.path.dirname(os.path.dirname(file_path)))
     messages = data.get("messages", [])
-    for entry in messages:
+    ingested = entry_state.get("messages_ingested", 0)
+    if ingested > len(messages):
+        # The file was rewritten with fewer messages: start over.
+        ingested = 0
+    start = max(ingested - 1, 0)
+    # Points of a file ingested from the start carry its new version; appended
+    # messages join the version their file was first ingested at.
+    version = entry_state.get("source_version") if ingested else None
+    version = version or fingerprint["sha256"]
+
+    if ingested:
+        print(f"\n📜 Scroll Updated: {os.path.basename(file_path)} (+{len(messages) - ingested} messages)")
+    else:
+        print(f"\n📜 New Scroll Detected: {os.path.basename(file_path)}")
+
+    for index in range(start, len(messages)):
+        entry = messages[index]
         text_content = entry.get("content", "")
         if not text_content:
             continue
 
         chunks = chunk_text(text_content)
         for i, chunk in enumerate(chunks):
-            vector = model.encode(chunk).tolist()
-            point_id = str(uuid.uuid4())
-            payload = {
+            point_id = make_point_id(source, message_key(entry, index), i)
+            payload = with_timestamp_epoch({
                 "content": chunk,
                 "timestamp": entry.get("timestamp"),
                 "event_type": entry.get("type"),
                 "original_message_id": entry.get("id"),
                 "source_file": os.path.basename(file_path),
                 "commit_id": commit_id,
+                "source_relpath": source,
+                "source_version": version,
                 "chunk_index": i
-            }
-            points_to_upsert.append(qdrant_client.http.models.PointStruct(
-                id=point_id, vector=vector, payload=payload
-            ))
+            })
+            records.append({"id": point_id, "payload": payload})
 
+    # Skip chunks that repeat content already in the Codex.
+    dedup = get_dedup_index()
+    if dedup is not None:
+        records = list(dedup.filter(records))
+    points_to_upsert = embed_records(records, model, cache=get_embedding_cache())
+    content_store = get_content_store()
+    if content_store is not None and points_to_upsert:
+        points_to_upsert = slim_points(points_to_upsert, content_store)
     if points_to_upsert:
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=points_to_upsert,
-            wait=True
-        )
+        # Batches Qdrant still rejects after the retries are kept, vectors
+        # included, for `dead_letter.py replay`.
+        with UpsertWriter(client, COLLECTION_NAME, retries=UPSERT_RETRIES,
+                          dead_letter=get_dead_letter_queue(),
+                          batch_sizer=get_batch_sizer(),
+                          generation=get_ingest_generation()) as writer:
+            writer.submit(points_to_upsert)
         print(f"✨ Ingested {len(points_to_upsert)} new memories into the Codex.")
+    if not ingested:
+        deleted = get_stale_point_cleaner().delete_superseded(
+            source, version, os.path.basename(file_path), commit_id)
+        if deleted:
+            print(f"🧹 Deleted {deleted} memories of the previous version.")
+
+    with _state_lock:
+        state.record(file_path, fingerprint, messages_ingested=len(messages),
+                     source_version=version)
+        state.save()
+
+# --- DEBOUNCED INGESTION QUEUE ---
+
+class IngestQueue:
+    """
+    Coalescing queue of files waiting to be ingested. Repeated events for a
+    path within the debounce window collapse into a single job, and a path
+    is never handed to two workers at once: events that arrive while it is
+    being processed schedule one follow-up job.
+    """
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS):
+        self.debounce = debounce
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Tuple[float, float]] = {}  # path -> (due, first event)
+        self._active = set()
+        self._closed = False
+        self.events = 0
+        self.processed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def put(self, path: str):
+        """Schedule a path, pushing back its deadline if it is already queued."""
+        now = time.monotonic()
+        with self._cond:
+            self.events += 1
+            _, first_seen = self._pending.get(path, (None, now))
+            self._pending[path] = (now + self.debounce, first_seen)
+            self._cond.notify()
+
+    def get(self) -> Optional[Tuple[str, float]]:
+        """Block until a path is due, returning (path, first event time), or None once closed."""
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                ready = [(due, path) for path, (due, _) in self._pending.items() if path not in self._active]
+                if ready:
+                    due, path = min(ready)
+                    if due <= now:
+                        _, first_seen = self._pending.pop(path)
+                        self._active.add(path)
+                        return path, first_seen
+                    self._cond.wait(due - now)
+                else:
+                    self._cond.wait()
+            return None
+
+    def task_done(self, path: str, first_seen: float):
+        """Mark a job finished and record how long after its first event it completed."""
+        lag = time.monotonic() - first_seen
+        with self._cond:
+            self._active.discard(path)
+            self.processed += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, jobs in progress and ingest lag, for monitoring."""
+        with self._cond:
+            now = time.monotonic()
+            oldest = min((first for _, first in self._pending.values()), default=now)
+            return {
+                "depth": len(self._pending),
+                "in_progress": len(self._active),
+                "events": self.events,
+                "processed": self.processed,
+                "oldest_pending_seconds": now - oldest,
+                "last_lag_seconds": self.last_lag,
+                "max_lag_seconds": self.max_lag,
+            }
+
+def ingest_worker(ingest_queue: IngestQueue):
+    """Drains the queue, ingesting one file at a time with the shared model and client."""
+    while True:
+        job = ingest_queue.get()
+        if job is None:
+            return
+        path, first_seen = job
+        try:
+            process_and_ingest_file(path)
+        except Exception as e:
+            print(f"⚠️  Failed to ingest {os.path.basename(path)}: {e}")
+        finally:
+            ingest_queue.task_done(path, first_seen)
+
+def start_workers(ingest_queue: IngestQueue, count: int = SCRIBE_WORKERS) -> List[threading.Thread]:
+    workers = [
+        threading.Thread(target=ingest_worker, args=(ingest_queue,), name=f"scribe-{i}", daemon=True)
+        for i in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
 
 # --- WATCHDOG EVENT HANDLER ---
 
+def is_session_file(path: str) -> bool:
+    return path.endswith('.json') and 'session-' in os.path.basename(path)
+
 class SessionFileHandler(FileSystemEventHandler):
-    """Event handler that triggers when a new session file is created."""
+    """
+    Event handler that queues a session file whenever it is created, grows,
+    is moved or is deleted; the worker finds out which.
+    """
+    def __init__(self, ingest_queue: IngestQueue):
+        super().__init__()
+        self.ingest_queue = ingest_queue
+
     def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith('.json') and 'session-' in os.path.basename(event.src_path):
-            # Wait a moment for the file to be fully written
-            time.sleep(1)
-            process_and_ingest_file(event.src_path)
+        if not event.is_directory and is_session_file(event.src_path):
+            self.ingest_queue.put(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory and is_session_file(event.src_path):
+            self.ingest_queue.put(event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory and is_session_file(event.src_path):
+            self.ingest_queue.put(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        if is_session_file(event.src_path):
+            self.ingest_queue.put(event.src_path)
+        if is_session_file(event.dest_path):
+            self.ingest_queue.put(event.dest_path)
 
 # --- MAIN EXECUTION ---
 
 def main():
     """Starts the watchdog observer to monitor the archive directory."""
+    # The Scribe reports its upsert batch sizes through logging, so enable
+    # INFO here but keep the HTTP client quiet.
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
     print("Initializing Scribe...")
     # Load models once at the start
     get_embedding_model()
-    get_qdrant_client()
+    ensure_payload_indexes(get_qdrant_client(), COLLECTION_NAME)
     print(f"👁️  The Scribe is now watching the archives at: {ARCHIVE_PATH}")
     print("Press Ctrl+C to stop the Scribe.")
 
-    event_handler = SessionFileHandler()
+    ingest_queue = IngestQueue()
+    workers = start_workers(ingest_queue)
+    event_handler = SessionFileHandler(ingest_queue)
     observer = Observer()
     observer.schedule(event_handler, ARCHIVE_PATH, recursive=True)
     observer.start()
 
     try:
+        last_status = time.monotonic()
         while True:
             time.sleep(1)
+            stats = ingest_queue.stats()
+            if time.monotonic() - last_status >= STATUS_INTERVAL and (stats["depth"] or stats["in_progress"]):
+                print(
+                    f"📊 Queue: {stats['depth']} waiting, {stats['in_progress']} in progress, "
+                    f"{stats['processed']} done | oldest waiting {stats['oldest_pending_seconds']:.1f}s, "
+                    f"last lag {stats['last_lag_seconds']:.1f}s, max lag {stats['max_lag_seconds']:.1f}s"
+                )
+                last_status = time.monotonic()
     except KeyboardInterrupt:
         observer.stop()
+        ingest_queue.close()
         print("\n🛑 Scribe has been stopped.")
     observer.join()
+    for worker in workers:
+        worker.join()
 
 if __name__ == "__main__":
     main()
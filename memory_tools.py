@@ -1,22 +1,42 @@
+import atexit
+from typing import Any, Dict, List, Optional
 import qdrant_client
+from qdrant_client.http import models
 from sentence_transformers import SentenceTransformer
+from embedding_backend import backend_kwargs, cache_model_name
+from embedding_daemon import connect_embedding_model
+from collection_schema import TIMESTAMP_FIELD, timestamp_epoch
+from content_store import ContentStore, hit_contents
+from ingest_generation import IngestGeneration
+from query_cache import QUERY_CACHE_PATH, QueryEmbeddingCache, ResultCache, result_key
 
 # --- CONFIGURATION ---
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
 COLLECTION_NAME = "codex_history"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_LIMIT = 3
+MAX_LIMIT = 100
+MAX_BATCH_QUERIES = 32
+MATCH_FILTERS = ("source_file", "commit_id", "event_type")
+FILTER_KEYS = ("since", "until") + MATCH_FILTERS
 
 # --- Reusable Components ---
 # We cache these so they don't reload on every function call within the same process.
 _model = None
 _client = None
+_content_store = None
+_query_cache = None
+_result_cache = None
 
 
 def _get_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer(EMBEDDING_MODEL)
+        _model = connect_embedding_model(
+            lambda: SentenceTransformer(EMBEDDING_MODEL, **backend_kwargs()),
+            EMBEDDING_MODEL,
+        )
     return _model
 
 
@@ -27,45 +47,253 @@ def _get_client():
     return _client
 
 
+def _get_content_store():
+    global _content_store
+    if _content_store is None:
+        _content_store = ContentStore()
+    return _content_store
+
+
+def _get_query_cache():
+    # Repeat queries skip the model; saved on exit so a restart starts warm.
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryEmbeddingCache(
+            cache_model_name(EMBEDDING_MODEL), QUERY_CACHE_PATH
+        )
+        atexit.register(_query_cache.save)
+    return _query_cache
+
+
+def _get_result_cache():
+    # Results stay valid until an ingestion path bumps the generation.
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(IngestGeneration())
+    return _result_cache
+
+
+def query_cache_stats() -> dict:
+    """Hit and miss counts of the query-embedding and result caches."""
+    return {
+        "embeddings": _get_query_cache().stats(),
+        "results": _get_result_cache().stats(),
+    }
+
+
+def _to_memories(hits) -> List[Dict]:
+    # Points with slim payloads keep their text in the local content store.
+    contents = hit_contents(hits, _get_content_store)
+    memories = []
+    for hit, content in zip(hits, contents):
+        payload = hit.payload if hit.payload else {}
+        memories.append(
+            {
+                "id": str(hit.id),
+                "score": hit.score,
+                "content": content,
+                "timestamp": payload.get("timestamp"),
+                "source_file": payload.get("source_file"),
+                "commit_id": payload.get("commit_id"),
+                "event_type": payload.get("event_type"),
+            }
+        )
+    return memories
+
+
+def clean_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Drops unset filters and checks the rest. `since` and `until` are ISO
+    8601 timestamps or seconds since the epoch; the others match payload
+    fields exactly. Raises ValueError for an unknown filter or a bad date.
+    """
+    cleaned = {
+        name: value
+        for name, value in (filters or {}).items()
+        if value not in (None, "")
+    }
+    unknown = sorted(set(cleaned) - set(FILTER_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(unknown)}")
+    for name in ("since", "until"):
+        if name in cleaned and timestamp_epoch(cleaned[name]) is None:
+            raise ValueError(f"Invalid '{name}' date: {cleaned[name]!r}")
+    return cleaned
+
+
+def search_filter(filters: Optional[Dict[str, Any]]) -> Optional[models.Filter]:
+    """
+    Translates query filters into a Qdrant payload filter, so the search
+    only considers matching points. The date range applies to
+    `timestamp_epoch` and includes both ends.
+    """
+    filters = clean_filters(filters)
+    must = [
+        models.FieldCondition(
+            key=name, match=models.MatchValue(value=str(filters[name]))
+        )
+        for name in MATCH_FILTERS
+        if name in filters
+    ]
+    bounds = {}
+    if "since" in filters:
+        bounds["gte"] = timestamp_epoch(filters["since"])
+    if "until" in filters:
+        bounds["lte"] = timestamp_epoch(filters["until"])
+    if bounds:
+        must.append(
+            models.FieldCondition(key=TIMESTAMP_FIELD, range=models.Range(**bounds))
+        )
+    return models.Filter(must=must) if must else None
+
+
+def check_limit(limit) -> int:
+    """The number of memories to return; raises ValueError if out of range."""
+    if isinstance(limit, bool):
+        raise ValueError("'limit' must be an integer")
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"'limit' must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def search_memories(
+    query: str,
+    limit: int = DEFAULT_LIMIT,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[Dict]:
+    """
+    Searches the Codex and returns the best matching memories as dicts with
+    their id, score, content, timestamp, source_file, commit_id and
+    event_type, among the points that match `filters` (see clean_filters).
+    Repeated searches are answered from the result cache until something
+    new is ingested.
+    """
+    filters = clean_filters(filters)
+    cache = _get_result_cache()
+    key = result_key(query, limit, filters)
+    memories, generation = cache.get(key)
+    if memories is not None:
+        return memories
+
+    client = _get_client()
+    model = _get_model()
+    query_vector = _get_query_cache().encode(model, [query])[0].tolist()
+    search_result = client.query_points(
+        collection_name=COLLECTION_NAME,
+        query=query_vector,
+        query_filter=search_filter(filters),
+        limit=limit,
+        with_payload=True,
+    )
+    memories = _to_memories(search_result.points)
+    cache.put(key, memories, generation)
+    return memories
+
+
+def search_memories_batch(
+    queries: List[str],
+    limit: int = DEFAULT_LIMIT,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[List[Dict]]:
+    """
+    Searches the Codex for several queries at once and returns the memories
+    of each, in order, like search_memories. The queries that are not in the
+    result cache are embedded in one model call and searched with one
+    batched Qdrant request. `filters` applies to every query.
+    """
+    filters = clean_filters(filters)
+    query_filter = search_filter(filters)
+    cache = _get_result_cache()
+    keys = [result_key(query, limit, filters) for query in queries]
+    results = []
+    generation = None
+    for key in keys:
+        memories, current = cache.get(key)
+        if generation is None:
+            generation = current
+        results.append(memories)
+
+    # Repeated queries in the batch are searched once.
+    missing: Dict[tuple, List[int]] = {}
+    for i, memories in enumerate(results):
+        if memories is None:
+            missing.setdefault(keys[i], []).append(i)
+    if not missing:
+        return results
+
+    to_search = [queries[indexes[0]] for indexes in missing.values()]
+    vectors = _get_query_cache().encode(_get_model(), to_search)
+    responses = _get_client().query_batch_points(
+        collection_name=COLLECTION_NAME,
+        requests=[
+            models.QueryRequest(
+                query=vector.tolist(),
+                filter=query_filter,
+                limit=limit,
+                with_payload=True,
+            )
+            for vector in vectors
+        ],
+    )
+    for (key, indexes), response in zip(missing.items(), responses):
+        memories = _to_memories(response.points)
+        cache.put(key, memories, generation)
+        for i in indexes:
+            results[i] = memories
+    return results
+
+
+def format_memories(memories: List[Dict]) -> str:
+    """Formats memories as the text returned to the AI."""
+    if not memories:
+        return "I found no memories matching that query."
+
+    response_string = "I found the following relevant memories:\n\n"
+    for i, memory in enumerate(memories):
+        response_string += f"--- Memory {i + 1} (Score: {memory['score']:.4f}) ---\n"
+        response_string += f"Timestamp: {memory['timestamp']}\n"
+        response_string += f"Source: {memory['source_file']}\n"
+        response_string += f"Content: {memory['content']}\n\n"
+    return response_string
+
+
 # --- THE CUSTOM TOOL FUNCTION ---
 
 
-def query_my_memory(query: str) -> str:
+def query_my_memory(
+    query: str,
+    limit: int = DEFAULT_LIMIT,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    source_file: Optional[str] = None,
+    commit_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+) -> str:
     """
     This is the function that will be registered as a custom tool.
     It takes a string query, searches the Qdrant vector database (the Codex),
-    and returns the top 3 most relevant memories as a formatted string.
+    and returns the `limit` most relevant memories as a formatted string.
+    The search can be narrowed to a date range (`since`/`until`) and to a
+    source file, commit or event type.
     """
     try:
         if not query or not query.strip():
             return "Error: No query provided."
 
-        client = _get_client()
-        model = _get_model()
-
-        query_vector = model.encode(query).tolist()
-
-        search_result = client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_vector,
-            limit=3,
-            with_payload=True,
-        )
-
+        filters = {
+            "since": since,
+            "until": until,
+            "source_file": source_file,
+            "commit_id": commit_id,
+            "event_type": event_type,
+        }
+        memories = search_memories(query, check_limit(limit), filters)
         # Format the results into a single string to be returned to the AI.
-        response_string = ""
-        if not search_result:
-            return "I found no memories matching that query."
-
-        response_string += "I found the following relevant memories:\n\n"
-        for i, result in enumerate(search_result):
-            payload = result.payload if result.payload else {}
-            response_string += f"--- Memory {i + 1} (Score: {result.score:.4f}) ---\n"
-            response_string += f"Timestamp: {payload.get('timestamp')}\n"  # type: ignore
-            response_string += f"Source: {payload.get('source_file')}\n"  # type: ignore
-            response_string += f"Content: {payload.get('content')}\n\n"  # type: ignore
-
-        return response_string
+        return format_memories(memories)
 
     except Exception as e:
         return f"An error occurred while querying my memory: {e}"
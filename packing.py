@@ -0,0 +1,83 @@
+"""
+Packing of short consecutive messages into shared chunks.
+
+Every non-empty message normally becomes at least one point, so thousands of
+short "ok" / "thanks" turns each cost an encode, a vector and a payload.
+pack_messages() groups runs of consecutive short messages from the same
+session into one chunk that still fits the embedding model's input. A packed
+point's payload lists the messages it holds with their offsets in its
+content, so a search hit can be resolved back to the original messages.
+"""
+
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Tuple
+
+from chunking import single_chunk_limit, text_length
+
+PACK_SEPARATOR = "\n"
+# A message is short if it takes at most this fraction of a chunk.
+SHORT_MESSAGE_FRACTION = 0.25
+
+
+def pack_messages(
+    messages: Iterable[Tuple[Hashable, str, Any]],
+) -> Iterator[List[Tuple[str, Any]]]:
+    """
+    Groups consecutive short messages of the same session.
+
+    Args:
+        messages: (session, text, item) tuples in conversation order. `item` is
+            passed through untouched, e.g. the message entry and its index.
+
+    Yields:
+        Lists of (text, item). A list with a single message is chunked on its
+        own as usual; a longer list is a pack whose joined text is one chunk.
+    """
+    limit = single_chunk_limit()
+    short_limit = int(limit * SHORT_MESSAGE_FRACTION)
+    separator = text_length(PACK_SEPARATOR)
+
+    pack: List[Tuple[str, Any]] = []
+    pack_session = None
+    pack_length = 0
+    for session, text, item in messages:
+        length = text_length(text)
+        if length > short_limit:
+            # A long message ends the run of short ones.
+            if pack:
+                yield pack
+                pack = []
+            yield [(text, item)]
+            continue
+        if pack and (
+            session != pack_session or pack_length + separator + length > limit
+        ):
+            yield pack
+            pack = []
+        if not pack:
+            pack_session = session
+            pack_length = length
+        else:
+            pack_length += separator + length
+        pack.append((text, item))
+    if pack:
+        yield pack
+
+
+def join_pack(texts: List[str]) -> Tuple[str, List[Tuple[int, int]]]:
+    """Joins the texts of a pack, returning the content and each text's (start, end)."""
+    offsets = []
+    position = 0
+    for text in texts:
+        offsets.append((position, position + len(text)))
+        position += len(text) + len(PACK_SEPARATOR)
+    return PACK_SEPARATOR.join(texts), offsets
+
+
+def packed_message_refs(
+    message_ids: List[Any], timestamps: List[Any], offsets: List[Tuple[int, int]]
+) -> List[Dict[str, Any]]:
+    """Builds the payload entries locating each packed message in the content."""
+    return [
+        {"message_id": message_id, "timestamp": timestamp, "start": start, "end": end}
+        for message_id, timestamp, (start, end) in zip(message_ids, timestamps, offsets)
+    ]
@@ -0,0 +1,222 @@
+"""
+In-process caches for the query tools.
+
+Agents repeat the same memory queries within a session, and each one used to
+go through the embedding model again. QueryEmbeddingCache keeps the vectors
+of the most recently used queries, keyed by their normalized text, so a
+repeated query skips the transformer. It can be saved to disk and is loaded
+back on start-up, so a restarted API server answers repeat queries without
+warming up again.
+
+ResultCache goes one step further and keeps the search results themselves,
+keyed by the query, limit and filters. Results are only valid for the
+ingest generation they were computed at (see ingest_generation.py); once
+any ingestion path changes the collection, the whole cache is dropped.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Set PLUG_MEMORY_QUERY_CACHE to "" to keep the cache in memory only.
+QUERY_CACHE_PATH = os.environ.get(
+    "PLUG_MEMORY_QUERY_CACHE", os.path.expanduser("~/.plug_memory/query_cache.npz")
+)
+QUERY_CACHE_MAX_ENTRIES = 1024
+QUERY_CACHE_SAVE_EVERY = 32  # New entries between saves to disk
+RESULT_CACHE_MAX_ENTRIES = 256
+
+
+def query_key(query: str) -> str:
+    """
+    Queries that differ only in whitespace or case share an entry; the
+    model's tokenizer is uncased and ignores whitespace, so their vectors
+    are the same.
+    """
+    return normalize_text(query).casefold()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query vectors for one model, optionally on disk."""
+
+    def __init__(
+        self,
+        model_name: str,
+        path: Optional[str] = None,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        save_every: int = QUERY_CACHE_SAVE_EVERY,
+    ):
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._unsaved = 0
+        if path:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def _load(self) -> None:
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                vectors = data["vectors"]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable query cache {self.path}: {e}")
+            return
+        if meta.get("model") != self.model_name:
+            return
+        # Saved oldest first, so the LRU order survives a restart.
+        for key, vector in zip(
+            meta["keys"][-self.max_entries :], vectors[-self.max_entries :]
+        ):
+            self._vectors[key] = vector
+        logger.info(f"Loaded {len(self._vectors)} cached query vectors")
+
+    def save(self) -> None:
+        """Atomically writes the cache to its file, if it has one and changed."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._unsaved:
+                return
+            keys = list(self._vectors)
+            vectors = np.array(list(self._vectors.values()), dtype=np.float32)
+            self._unsaved = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        meta = json.dumps({"model": self.model_name, "keys": keys})
+        with open(tmp_path, "wb") as f:
+            np.savez(f, meta=np.array(meta), vectors=vectors)
+        os.replace(tmp_path, self.path)
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = query_key(query)
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, query: str, vector) -> None:
+        with self._lock:
+            key = query_key(query)
+            self._vectors[key] = np.asarray(vector, dtype=np.float32)
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+            self._unsaved += 1
+            due = self.path and self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def encode(self, model, queries: Sequence[str]) -> np.ndarray:
+        """
+        Encodes queries like model.encode(queries), sending only the ones
+        that are not cached through the model, in a single call.
+        """
+        vectors: List[Optional[np.ndarray]] = [self.get(q) for q in queries]
+        missing: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(query_key(queries[i]), []).append(i)
+        if missing:
+            to_encode = [queries[indexes[0]] for indexes in missing.values()]
+            encoded = model.encode(to_encode, show_progress_bar=False)
+            for indexes, vector in zip(missing.values(), encoded):
+                self.put(queries[indexes[0]], vector)
+                for i in indexes:
+                    vectors[i] = np.asarray(vector, dtype=np.float32)
+        return np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+
+def result_key(query: str, limit: int, filters: Optional[Dict] = None) -> Tuple:
+    """The result cache key of a search."""
+    return (
+        query_key(query),
+        limit,
+        json.dumps(filters or {}, sort_keys=True, default=str),
+    )
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of search results, dropped whenever the ingest
+    generation changes. Cached values are shared; callers must not modify
+    them.
+    """
+
+    def __init__(self, generation, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.generation = generation
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._generation: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Tuple) -> Tuple[Optional[Any], int]:
+        """
+        Returns (the cached results or None, the current generation). Read
+        the generation before searching, and put() the results with it, so
+        results that raced an ingest are not cached as current.
+        """
+        generation = self.generation.current()
+        with self._lock:
+            if generation != self._generation:
+                if self._results:
+                    self.invalidations += 1
+                self._results.clear()
+                self._generation = generation
+            value = self._results.get(key)
+            if value is None:
+                self.misses += 1
+                return None, generation
+            self._results.move_to_end(key)
+            self.hits += 1
+            return value, generation
+
+    def put(self, key: Tuple, value: Any, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return  # Computed before the latest ingest
+            self._results[key] = value
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": len(self),
+        }
@@ -2,6 +2,9 @@
 import sys
 from sentence_transformers import SentenceTransformer
 import qdrant_client
+from embedding_backend import backend_kwargs
+from embedding_daemon import connect_embedding_model
+from content_store import ContentStore, hit_contents
 
 # --- CONFIGURATION ---
 QDRANT_HOST = "localhost"
@@ -21,7 +24,8 @@ def search_codex(query: str):
         # 1. Initialize clients and models
         client = qdrant_client.QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
         print(f"⏳ Loading embedding model: {EMBEDDING_MODEL}...")
-        model = SentenceTransformer(EMBEDDING_MODEL)
+        model = connect_embedding_model(
+            lambda: SentenceTransformer(EMBEDDING_MODEL, **backend_kwargs()), EMBEDDING_MODEL)
         print("✅ Connection and models are ready.")
 
         # 2. Convert the query to a vector
@@ -29,12 +33,12 @@ def search_codex(query: str):
         query_vector = model.encode(query).tolist()
 
         # 3. Perform the search
-        search_result = client.search(
+        search_result = client.query_points(
             collection_name=COLLECTION_NAME,
-            query_vector=query_vector,
+            query=query_vector,
             limit=3,  # Return the top 3 most similar results
             with_payload=True  # Include the payload in the result
-        )
+        ).points
 
         # 4. Print the results
         print("\n--- Top 3 Memories Found ---")
@@ -42,12 +46,13 @@ def search_codex(query: str):
             print("No memories found matching your query.")
             return
 
+        contents = hit_contents(search_result, ContentStore)
         for i, result in enumerate(search_result):
             payload = result.payload
             print(f"\nResult {i+1} (Score: {result.score:.4f}):")
             print(f"  Timestamp: {payload.get('timestamp')}")
             print(f"  Source File: {payload.get('source_file')}")
-            print(f"  Content: \"...{payload.get('content')}...\"")
+            print(f"  Content: \"...{contents[i]}...\"")
 
     except Exception as e:
         print(f"\n❌ An error occurred: {e}")
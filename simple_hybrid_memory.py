@@ -5,6 +5,9 @@ Simplified Hybrid Memory System - Python 3.14 compatible
 from typing import List, Dict, Any, Optional
 import qdrant_client
 from sentence_transformers import SentenceTransformer
+from embedding_backend import backend_kwargs
+from embedding_daemon import connect_embedding_model
+from content_store import ContentStore, hit_contents
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,7 +19,16 @@ class SimpleHybridMemory:
     def __init__(self, qdrant_client, collection_name: str = "codex_history"):
         self.collection_name = collection_name
         self.qdrant_client = qdrant_client
-        self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedding_model = connect_embedding_model(
+            lambda: SentenceTransformer("all-MiniLM-L6-v2", **backend_kwargs()),
+            "all-MiniLM-L6-v2",
+        )
+        self._content_store: Optional[ContentStore] = None
+
+    def _get_content_store(self) -> ContentStore:
+        if self._content_store is None:
+            self._content_store = ContentStore()
+        return self._content_store
 
     def fast_query(self, query: str, limit: int = 3) -> Dict[str, Any]:
         """Fast vector search for precise queries."""
@@ -25,17 +37,21 @@ class SimpleHybridMemory:
             query_vector = self.embedding_model.encode(query).tolist()
 
             # Search Qdrant
-            search_result = self.qdrant_client.search(
+            search_result = self.qdrant_client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_vector,
+                query=query_vector,
                 limit=limit,
-            )
+                with_payload=True,
+            ).points
+
+            # Text of points with slim payloads, in one sidecar lookup
+            contents = hit_contents(search_result, self._get_content_store)
 
             results = []
-            for hit in search_result:
+            for hit, content in zip(search_result, contents):
                 results.append(
                     {
-                        "content": hit.payload.get("content", ""),
+                        "content": content,
                         "timestamp": hit.payload.get("timestamp"),
                         "source_file": hit.payload.get("source_file"),
                         "score": hit.score,
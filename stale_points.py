@@ -0,0 +1,155 @@
+"""
+Removal of points that no longer match their source files.
+
+Point ids are derived from the file, message and chunk, so re-ingesting a
+file overwrites the points it still has. Points for messages or chunks that
+are gone (a rewritten session, a re-chunked message, a deleted file) used to
+stay in the collection forever. Every point now records the file it came
+from (`source_relpath`, relative to the archive) and the version of that
+file it was built from (`source_version`, the file's sha256 when it was
+fully ingested). Once a file has been fully re-ingested, the points of that
+file with any other version are superseded and deleted; when a file is
+deleted, all of its points go. Points that the dedup index skipped another
+chunk in favour of are kept, since they hold that chunk's only copy.
+
+`source_file` and `commit_id` don't identify a file on their own (every
+logs.json has the commit "unknown"), which is why `source_relpath` is the
+key. Points ingested before it existed are matched by `source_file` and
+`commit_id` instead, for session files, whose commit is known.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from qdrant_client.http import models
+
+from upsert_writer import bump_generation
+
+SCROLL_LIMIT = 1000
+
+
+def with_source_version(records: Iterable[Dict], version: str) -> Iterator[Dict]:
+    """Stamps chunk records with the version of the file they were built from."""
+    for record in records:
+        record["payload"]["source_version"] = version
+        yield record
+
+
+def _match(key: str, value: str) -> models.FieldCondition:
+    return models.FieldCondition(key=key, match=models.MatchValue(value=value))
+
+
+def _legacy_filter(
+    source_file: str, commit_id: Optional[str]
+) -> Optional[models.Filter]:
+    """Points of the file from before `source_relpath` was recorded."""
+    if not commit_id or commit_id == "unknown":
+        return None
+    return models.Filter(
+        must=[
+            _match("source_file", source_file),
+            _match("commit_id", commit_id),
+            models.IsEmptyCondition(is_empty=models.PayloadField(key="source_relpath")),
+        ]
+    )
+
+
+def file_filter(
+    source_relpath: str, source_file: str, commit_id: Optional[str]
+) -> models.Filter:
+    """Every point of a file."""
+    current = models.Filter(must=[_match("source_relpath", source_relpath)])
+    legacy = _legacy_filter(source_file, commit_id)
+    return models.Filter(should=[current] + ([legacy] if legacy else []))
+
+
+def superseded_filter(
+    source_relpath: str, version: str, source_file: str, commit_id: Optional[str]
+) -> models.Filter:
+    """Points of a file that were not built from `version` of it."""
+    current = models.Filter(
+        must=[_match("source_relpath", source_relpath)],
+        must_not=[_match("source_version", version)],
+    )
+    legacy = _legacy_filter(source_file, commit_id)
+    return models.Filter(should=[current] + ([legacy] if legacy else []))
+
+
+class StalePointCleaner:
+    """
+    Deletes the points of superseded or deleted files from a collection,
+    along with their entries in the local content store and dedup index.
+    """
+
+    def __init__(
+        self,
+        client,
+        collection_name: str,
+        content_store=None,
+        dedup=None,
+        generation=None,
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self.content_store = content_store
+        self.dedup = dedup
+        self.generation = generation
+        self.deleted = 0
+
+    def _point_ids(self, points_filter: models.Filter) -> List:
+        ids, offset = [], None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=points_filter,
+                limit=SCROLL_LIMIT,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False,
+            )
+            ids.extend(point.id for point in points)
+            if offset is None:
+                return ids
+
+    def _delete(self, points_filter: models.Filter) -> int:
+        ids = self._point_ids(points_filter)
+        if self.dedup is not None and ids:
+            # A point that another chunk was skipped as a duplicate of is the
+            # only copy of that chunk's text; it stays.
+            kept = self.dedup.referenced(ids)
+            ids = [point_id for point_id in ids if str(point_id) not in kept]
+        for start in range(0, len(ids), SCROLL_LIMIT):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(
+                    points=ids[start : start + SCROLL_LIMIT]
+                ),
+                wait=True,
+            )
+        if not ids:
+            return 0
+        if self.generation is not None:
+            bump_generation(self.generation)
+        if self.content_store is not None:
+            self.content_store.delete(ids)
+        if self.dedup is not None:
+            self.dedup.remove(ids)
+        self.deleted += len(ids)
+        return len(ids)
+
+    def delete_superseded(
+        self,
+        source_relpath: str,
+        version: str,
+        source_file: str,
+        commit_id: Optional[str] = None,
+    ) -> int:
+        """Deletes a fully re-ingested file's points from other versions."""
+        return self._delete(
+            superseded_filter(source_relpath, version, source_file, commit_id)
+        )
+
+    def delete_file(
+        self, source_relpath: str, source_file: str, commit_id: Optional[str] = None
+    ) -> int:
+        """Deletes every point of a file that no longer exists."""
+        return self._delete(file_filter(source_relpath, source_file, commit_id))
@@ -0,0 +1,25 @@
+"""
+Shared fixtures for the tests.
+"""
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def tokenizer():
+    """A small WordPiece fast tokenizer, so the tests don't need the Hub."""
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["alpha", "beta", "gamma", "delta", "memory", "scroll", "codex"]
+    tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", ".", ","] + words
+    tokens += list(letters) + [f"##{c}" for c in letters]
+    wordpiece = Tokenizer(
+        models.WordPiece({t: i for i, t in enumerate(tokens)}, unk_token="[UNK]")
+    )
+    wordpiece.normalizer = normalizers.BertNormalizer(lowercase=True)
+    wordpiece.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=wordpiece, unk_token="[UNK]", pad_token="[PAD]"
+    )
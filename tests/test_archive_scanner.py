@@ -0,0 +1,145 @@
+"""
+Tests for archive_scanner.py
+"""
+
+import pytest
+import os
+import glob
+import time
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from archive_scanner import ArchiveScanner, classify, scan_archive
+
+
+@pytest.fixture
+def archive():
+    """An archive with every file kind, plus files the scanner must ignore."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        for relpath in [
+            "c1/chats/session-1.json",
+            "c1/chats/session-2.json",
+            "c1/checkpoint.json",
+            "c1/checkpoint-abc.json",
+            "c1/logs.json",
+            "c2/chats/session-3.json",
+            "c2/logs.json",
+            "c2/notes.json",
+            "c2/chats/readme.txt",
+            ".hidden/logs.json",
+        ]:
+            path = root / relpath
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("[]")
+        # Age the directories, so their listings are old enough to be cached.
+        old = time.time() - 3600
+        for directory, _, _ in os.walk(root):
+            os.utime(directory, (old, old))
+        yield str(root)
+
+
+def _globbed(root: str):
+    files = glob.glob(os.path.join(root, "**", "chats", "*.json"), recursive=True)
+    files += glob.glob(os.path.join(root, "**", "checkpoint*.json"), recursive=True)
+    files += glob.glob(os.path.join(root, "**", "logs.json"), recursive=True)
+    return sorted(files)
+
+
+class TestClassify:
+    """Test file classification."""
+
+    def test_kinds(self):
+        assert classify("/a/c1/chats", "session-1.json") == "session"
+        assert classify("/a/c1", "checkpoint-x.json") == "checkpoint"
+        assert classify("/a/c1", "logs.json") == "logs"
+        assert classify("/a/c1", "notes.json") is None
+        assert classify("/a/c1/chats", "notes.txt") is None
+
+
+class TestArchiveScanner:
+    """Test the one-pass scan and its listing cache."""
+
+    def test_matches_the_globs(self, archive):
+        scan = ArchiveScanner(archive).scan()
+
+        assert sorted(scan.all_files()) == _globbed(archive)
+        assert len(scan.session_files) == 3
+        assert len(scan.checkpoint_files) == 2
+        assert len(scan.logs_files) == 2
+
+    def test_rescan_reuses_unchanged_listings(self, archive):
+        scanner = ArchiveScanner(archive)
+        first = scanner.scan()
+        listed = scanner.directories_listed
+
+        second = scanner.scan()
+
+        assert scanner.directories_listed == listed
+        assert scanner.listings_reused == listed
+        assert second.fingerprint == first.fingerprint
+
+    def test_new_and_modified_files_are_seen(self, archive):
+        scanner = ArchiveScanner(archive)
+        before = scanner.scan()
+
+        Path(archive, "c2", "chats", "session-4.json").write_text("[]")
+        added = scanner.scan()
+        assert len(added.session_files) == 4
+        assert added.fingerprint != before.fingerprint
+
+        Path(archive, "c1", "logs.json").write_text("[1, 2, 3]")
+        modified = scanner.scan()
+        assert modified.all_files() == added.all_files()
+        assert modified.fingerprint != added.fingerprint
+
+    def test_removed_directory_is_forgotten(self, archive):
+        scanner = ArchiveScanner(archive)
+        scanner.scan()
+
+        for name in os.listdir(os.path.join(archive, "c2", "chats")):
+            os.remove(os.path.join(archive, "c2", "chats", name))
+        os.rmdir(os.path.join(archive, "c2", "chats"))
+        scan = scanner.scan()
+
+        assert len(scan.session_files) == 2
+        assert os.path.join(archive, "c2", "chats") not in scanner._listings
+
+    def test_recently_modified_directory_is_relisted(self, archive):
+        scanner = ArchiveScanner(archive)
+        Path(archive, "c1", "chats", "session-9.json").write_text("[]")
+        scanner.scan()
+        listed = scanner.directories_listed
+
+        # Same second, so the mtime alone could miss a change: list it again.
+        Path(archive, "c1", "chats", "session-10.json").write_text("[]")
+        scan = scanner.scan()
+
+        assert scanner.directories_listed == listed + 1
+        assert len(scan.session_files) == 5
+
+    def test_persisted_cache(self, archive):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_path = os.path.join(cache_dir, "scan.json")
+            first = scan_archive(archive, cache_path)
+
+            scanner = ArchiveScanner(archive, cache_path)
+            second = scanner.scan()
+
+        assert scanner.directories_listed == 0
+        assert second.all_files() == first.all_files()
+
+    def test_cache_for_another_root_is_ignored(self, archive):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_path = os.path.join(cache_dir, "scan.json")
+            scan_archive(archive, cache_path)
+            Path(cache_dir, "other").mkdir()
+
+            scanner = ArchiveScanner(os.path.join(cache_dir, "other"), cache_path)
+            assert len(scanner.scan()) == 0
+            assert scanner.directories_listed == 1
@@ -0,0 +1,436 @@
+"""
+Tests for batch_ingest.py
+"""
+
+import pytest
+import json
+import tempfile
+import numpy as np
+from pathlib import Path
+from unittest.mock import Mock
+from qdrant_client import QdrantClient, models
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch_ingest
+import chunking
+from content_store import ContentStore
+from dead_letter import DeadLetterQueue
+from dedup import DedupIndex
+from ingest_journal import IngestJournal
+from ingest_manifest import IngestManifest
+from stale_points import StalePointCleaner
+from batch_ingest import (
+    build_chunk_records,
+    embed_records,
+    extract_text,
+    get_commit_id,
+    message_key,
+    process_conversation_file,
+    delete_removed_files,
+    run_pipeline,
+)
+
+
+@pytest.fixture(autouse=True)
+def char_chunking(monkeypatch):
+    """Chunk by characters, so tests don't depend on downloading a tokenizer."""
+    monkeypatch.setattr(chunking, "CHUNK_MODE", "chars")
+
+
+def _fake_model():
+    """A model whose encode() returns one 3-d vector per input text."""
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 3))
+    return model
+
+
+def _write_session(directory: Path, name: str, messages) -> str:
+    chats_dir = directory / "commit123" / "chats"
+    chats_dir.mkdir(parents=True, exist_ok=True)
+    path = chats_dir / name
+    path.write_text(json.dumps({"messages": messages}))
+    return str(path)
+
+
+class TestHelpers:
+    """Test format helpers."""
+
+    def test_get_commit_id(self):
+        assert get_commit_id("/a/commit123/chats/session-1.json") == "commit123"
+        assert get_commit_id("/a/commit123/logs.json") == "unknown"
+
+    def test_message_key(self):
+        assert message_key({"id": "abc"}, 7) == "abc"
+        assert message_key({"sessionId": "s1", "messageId": 0}, 7) == "s1:0"
+        assert message_key({"role": "user"}, 7) == "#7"
+
+    def test_extract_text_formats(self):
+        assert extract_text({"content": "session"}) == "session"
+        assert extract_text({"message": "logs"}) == "logs"
+        assert extract_text({"parts": [{"text": "checkpoint"}]}) == "checkpoint"
+        assert extract_text({"parts": []}) == ""
+
+
+class TestBatchedEmbedding:
+    """Test that chunks are embedded in batches."""
+
+    def test_build_chunk_records(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = _write_session(
+                Path(temp_dir),
+                "session-1.json",
+                [
+                    {
+                        "id": "m1",
+                        "content": "hello",
+                        "type": "user",
+                        "timestamp": "2025-07-01T00:00:00Z",
+                    },
+                    {"content": ""},
+                ],
+            )
+            records = build_chunk_records(path, "commit123")
+
+        assert len(records) == 1
+        assert records[0]["payload"]["content"] == "hello"
+        assert records[0]["payload"]["original_message_id"] == "m1"
+        assert records[0]["payload"]["timestamp_epoch"] == 1751328000.0
+        assert "vector" not in records[0]
+
+    def test_point_ids_are_deterministic(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = _write_session(
+                Path(temp_dir), "session-1.json", [{"id": "m1", "content": "hello"}]
+            )
+            first = build_chunk_records(path, "commit123")
+            second = build_chunk_records(path, "commit123")
+
+        assert first[0]["id"] == second[0]["id"]
+
+    def test_pack_short_messages(self):
+        messages = [
+            {"id": "m1", "content": "ok", "type": "user", "timestamp": "t1"},
+            {"id": "m2", "content": "thanks", "type": "gemini", "timestamp": "t2"},
+            {"id": "m3", "content": "x" * 500, "type": "user"},
+            {"id": "m4", "content": "bye", "type": "user"},
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = _write_session(Path(temp_dir), "session-1.json", messages)
+            unpacked = build_chunk_records(path, "commit123")
+            packed = build_chunk_records(path, "commit123", pack=True)
+
+        assert len(unpacked) == 4
+        assert [r["payload"]["content"] for r in packed] == [
+            "ok\nthanks",
+            "x" * 500,
+            "bye",
+        ]
+        # Messages that were not packed keep their usual point IDs.
+        assert packed[1]["id"] == unpacked[2]["id"]
+        assert packed[2]["id"] == unpacked[3]["id"]
+
+        payload = packed[0]["payload"]
+        assert payload["event_type"] == ["user", "gemini"]
+        assert payload["timestamp"] == "t1"
+        refs = payload["packed_messages"]
+        assert [r["message_id"] for r in refs] == ["m1", "m2"]
+        assert [payload["content"][r["start"] : r["end"]] for r in refs] == [
+            "ok",
+            "thanks",
+        ]
+
+    def test_embed_records_single_encode_call(self):
+        model = _fake_model()
+        records = [{"id": str(i), "payload": {"content": f"c{i}"}} for i in range(5)]
+
+        points = embed_records(records, model, batch_size=16)
+
+        assert len(points) == 5
+        assert points[0]["vector"] == [1.0, 1.0, 1.0]
+        model.encode.assert_called_once()
+        assert model.encode.call_args.args[0] == ["c0", "c1", "c2", "c3", "c4"]
+
+    def test_process_conversation_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = _write_session(
+                Path(temp_dir), "session-1.json", [{"content": "x" * 2500}]
+            )
+            points = process_conversation_file(path, _fake_model(), "commit123")
+
+        assert [p["payload"]["chunk_index"] for p in points] == [0, 1, 2, 3]
+
+
+class TestPipeline:
+    """Test the parse/encode/upsert pipeline."""
+
+    def test_batches_span_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                _write_session(
+                    Path(temp_dir),
+                    f"session-{n}.json",
+                    [{"content": f"msg {n}-{i}"} for i in range(3)],
+                )
+                for n in range(4)
+            ]
+            model = _fake_model()
+            client = Mock()
+
+            total = run_pipeline(files, model, client, batch_size=5)
+
+        assert total == 12
+        # 12 chunks in batches of 5 -> 3 encode calls, 3 upserts
+        assert [len(c.args[0]) for c in model.encode.call_args_list] == [5, 5, 2]
+        assert client.upsert.call_count == 3
+
+    def test_worker_pool_matches_serial(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                _write_session(
+                    Path(temp_dir),
+                    f"session-{n}.json",
+                    [{"id": f"{n}-{i}", "content": f"msg {n}-{i}"} for i in range(3)],
+                )
+                for n in range(6)
+            ]
+            serial, pooled = Mock(), Mock()
+            run_pipeline(files, _fake_model(), serial, batch_size=4)
+            total = run_pipeline(files, _fake_model(), pooled, batch_size=4, workers=2)
+
+        def ids(client):
+            return sorted(
+                p.id for c in client.upsert.call_args_list for p in c.kwargs["points"]
+            )
+
+        assert total == 18
+        assert ids(pooled) == ids(serial)
+
+    def test_manifest_skips_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                _write_session(
+                    Path(temp_dir), f"session-{n}.json", [{"content": f"msg {n}"}]
+                )
+                for n in range(3)
+            ]
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+
+            first = run_pipeline(files, _fake_model(), Mock(), manifest=manifest)
+            assert first == 3
+            assert all(manifest.is_unchanged(f) for f in files)
+
+            Path(files[1]).write_text(json.dumps({"messages": [{"content": "new!"}]}))
+            reloaded = IngestManifest(manifest.path)
+            client = Mock()
+            second = run_pipeline(files, _fake_model(), client, manifest=reloaded)
+
+        assert second == 1
+        points = client.upsert.call_args.kwargs["points"]
+        assert [p.payload["content"] for p in points] == ["new!"]
+
+    def test_unparseable_file_is_not_recorded(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            good = _write_session(Path(temp_dir), "session-1.json", [{"content": "a"}])
+            bad = _write_session(Path(temp_dir), "session-2.json", [])
+            Path(bad).write_text('{"messages": [{"content": "b"},')
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+
+            run_pipeline([good, bad], _fake_model(), Mock(), manifest=manifest)
+
+        assert manifest.get(good) is not None
+        assert manifest.get(bad) is None
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_missing_file_is_skipped(self, workers):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                _write_session(
+                    Path(temp_dir), f"session-{n}.json", [{"content": f"msg {n}"}]
+                )
+                for n in range(3)
+            ]
+            missing = str(Path(temp_dir) / "commit123" / "chats" / "session-gone.json")
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+
+            total = run_pipeline(
+                [files[0], missing] + files[1:],
+                _fake_model(),
+                Mock(),
+                manifest=manifest,
+                workers=workers,
+            )
+
+            assert total == 3
+            assert all(manifest.get(f) is not None for f in files)
+            assert manifest.get(missing) is None
+
+    def test_upsert_error_propagates(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                _write_session(Path(temp_dir), "session-1.json", [{"content": "a"}])
+            ]
+            client = Mock()
+            client.upsert.side_effect = RuntimeError("qdrant down")
+
+            with pytest.raises(RuntimeError, match="qdrant down"):
+                run_pipeline(files, _fake_model(), client, batch_size=5)
+
+    def test_slim_payloads_keep_text_in_sidecar(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                _write_session(
+                    Path(temp_dir), "session-1.json", [{"id": "m1", "content": "hi"}]
+                )
+            ]
+            store = ContentStore(str(Path(temp_dir) / "content.db"))
+            client = Mock()
+
+            run_pipeline(files, _fake_model(), client, content_store=store)
+
+            point = client.upsert.call_args.kwargs["points"][0]
+            assert "content" not in point.payload
+            assert point.payload["original_message_id"] == "m1"
+            assert store.get_many([point.id]) == {point.id: "hi"}
+
+    def test_failed_batches_go_to_dead_letter(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                _write_session(Path(temp_dir), "session-1.json", [{"content": "a"}])
+            ]
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+            dead_letter = DeadLetterQueue(str(Path(temp_dir) / "dead_letter.db"))
+            client = Mock()
+            client.upsert.side_effect = RuntimeError("qdrant down")
+
+            total = run_pipeline(
+                files, _fake_model(), client, manifest=manifest, dead_letter=dead_letter
+            )
+
+            assert total == 0
+            assert len(dead_letter) == 1
+            # The vectors are saved for replay, so the file is not re-embedded.
+            assert manifest.is_unchanged(files[0])
+
+    def test_resume_skips_committed_chunks(self):
+        def upsert(collection_name, points, wait):
+            # Qdrant goes away after accepting the first four messages.
+            if any(p.payload["content"] not in first_four for p in points):
+                raise RuntimeError("qdrant restarted")
+
+        first_four = {f"m{i}" for i in range(4)}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            messages = [{"id": f"m{i}", "content": f"m{i}"} for i in range(12)]
+            files = [_write_session(Path(temp_dir), "session-1.json", messages)]
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+            journal = IngestJournal(str(Path(temp_dir) / "journal.db"))
+
+            client = Mock()
+            client.upsert.side_effect = upsert
+            with pytest.raises(RuntimeError, match="qdrant restarted"):
+                run_pipeline(
+                    files, _fake_model(), client, 4, manifest=manifest, journal=journal
+                )
+            assert manifest.get(files[0]) is None
+
+            model, client = _fake_model(), Mock()
+            total = run_pipeline(
+                files, model, client, 4, manifest=manifest, journal=journal, resume=True
+            )
+
+            assert total == 8
+            encoded = [t for c in model.encode.call_args_list for t in c.args[0]]
+            assert sorted(encoded) == sorted(f"m{i}" for i in range(4, 12))
+            assert manifest.is_unchanged(files[0])
+            # The file is complete, so its journal entries have been dropped.
+            assert len(journal) == 0
+
+    def test_dedup_skips_copies_before_encoding(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            messages = [{"id": f"m{i}", "content": f"message {i}"} for i in range(3)]
+            files = [
+                _write_session(Path(temp_dir), "session-1.json", messages),
+                _write_session(Path(temp_dir), "checkpoint-1.json", messages[:2]),
+            ]
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+            dedup = DedupIndex(str(Path(temp_dir) / "dedup.db"))
+            model = _fake_model()
+
+            total = run_pipeline(files, model, Mock(), manifest=manifest, dedup=dedup)
+
+            assert total == 3
+            encoded = [t for c in model.encode.call_args_list for t in c.args[0]]
+            assert sorted(encoded) == ["message 0", "message 1", "message 2"]
+            assert dedup.duplicates == 2
+            # A file whose chunks were all duplicates is still complete.
+            assert all(manifest.is_unchanged(f) for f in files)
+
+
+class TestStalePointCleanup:
+    """Test that rewritten and deleted files leave no points behind."""
+
+    @pytest.fixture
+    def qdrant(self):
+        client = QdrantClient(":memory:")
+        client.create_collection(
+            "codex_history",
+            vectors_config=models.VectorParams(size=3, distance=models.Distance.COSINE),
+        )
+        yield client
+        client.close()
+
+    def _contents(self, client):
+        points, _ = client.scroll("codex_history", limit=100)
+        return sorted(p.payload["content"] for p in points)
+
+    def test_rewritten_file_replaces_its_points(self, qdrant, monkeypatch):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            monkeypatch.setattr(batch_ingest, "ARCHIVE_PATH", temp_dir)
+            messages = [{"id": f"m{i}", "content": f"message {i}"} for i in range(4)]
+            files = [_write_session(Path(temp_dir), "session-1.json", messages)]
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+            cleaner = StalePointCleaner(qdrant, "codex_history")
+            run_pipeline(
+                files, _fake_model(), qdrant, manifest=manifest, cleaner=cleaner
+            )
+
+            rewritten = [
+                {"id": "m1", "content": "message 1"},
+                {"id": "x", "content": "new"},
+            ]
+            _write_session(Path(temp_dir), "session-1.json", rewritten)
+            run_pipeline(
+                files, _fake_model(), qdrant, manifest=manifest, cleaner=cleaner
+            )
+
+        assert self._contents(qdrant) == ["message 1", "new"]
+        assert cleaner.deleted == 3
+
+    def test_removed_files_are_deleted(self, qdrant, monkeypatch):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            monkeypatch.setattr(batch_ingest, "ARCHIVE_PATH", temp_dir)
+            files = [
+                _write_session(
+                    Path(temp_dir), f"session-{n}.json", [{"content": f"msg {n}"}]
+                )
+                for n in range(2)
+            ]
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+            cleaner = StalePointCleaner(qdrant, "codex_history")
+            run_pipeline(
+                files, _fake_model(), qdrant, manifest=manifest, cleaner=cleaner
+            )
+
+            Path(files[0]).unlink()
+            deleted = delete_removed_files(cleaner, manifest, files[1:])
+
+        assert deleted == 1
+        assert self._contents(qdrant) == ["msg 1"]
+        assert manifest.get(files[0]) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
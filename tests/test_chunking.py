@@ -0,0 +1,119 @@
+"""
+Tests for chunking.py
+"""
+
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import chunking
+from chunking import chunk_text, chunk_text_by_chars, chunk_text_by_tokens
+
+# Whole tokens in the `tokenizer` fixture (tests/conftest.py).
+WORDS = ["alpha", "beta", "gamma", "delta", "memory", "scroll", "codex"]
+
+
+def _token_count(tokenizer, text: str) -> int:
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+class TestCharChunking:
+    """Test the character-based chunker."""
+
+    def test_matches_original_slicing(self):
+        text = "x" * 2500
+        chunks = chunk_text_by_chars(text)
+        assert [len(c) for c in chunks] == [1000, 1000, 900, 100]
+        assert chunks[1] == text[800:1800]
+
+    def test_non_string(self):
+        assert chunk_text_by_chars(None) == []
+
+
+class TestTokenChunking:
+    """Test the tokenizer-aware chunker."""
+
+    def test_short_text_is_one_chunk(self, tokenizer):
+        assert chunk_text_by_tokens("alpha beta", tokenizer, max_tokens=10) == [
+            "alpha beta"
+        ]
+
+    def test_empty_and_non_string(self, tokenizer):
+        assert chunk_text_by_tokens("   ", tokenizer) == []
+        assert chunk_text_by_tokens(None, tokenizer) == []
+
+    def test_chunks_fit_the_token_budget(self, tokenizer):
+        text = " ".join(WORDS[i % len(WORDS)] for i in range(200))
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=30, overlap=5)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert _token_count(tokenizer, chunk) <= 30
+            assert chunk in text
+        # Consecutive chunks overlap, and together they cover the whole text.
+        assert chunks[1].split()[0] in chunks[0].split()[-5:]
+        assert text.startswith(chunks[0]) and text.endswith(chunks[-1])
+
+    def test_words_are_not_split(self, tokenizer):
+        # "zzzzz" is five word pieces, so a naive cut would land inside it.
+        text = " ".join(["alpha", "zzzzz"] * 20)
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=9, overlap=2)
+
+        for chunk in chunks:
+            assert set(chunk.split()) <= {"alpha", "zzzzz"}
+            assert _token_count(tokenizer, chunk) <= 9
+
+    def test_overlong_word_is_split(self, tokenizer):
+        text = "q" * 40
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=10, overlap=2)
+
+        assert len(chunks) > 1
+        assert all(_token_count(tokenizer, c) <= 10 for c in chunks)
+        # Pieces of a single word are not overlapped.
+        assert "".join(chunks) == text
+
+
+class TestChunkText:
+    """Test mode selection and the character fallback."""
+
+    def test_token_mode_uses_tokenizer(self, tokenizer):
+        text = " ".join(["memory"] * 600)
+        with patch("chunking.get_tokenizer", return_value=tokenizer):
+            chunks = chunk_text(text, mode="tokens")
+        assert all(
+            _token_count(tokenizer, c) <= chunking.MAX_CHUNK_TOKENS for c in chunks
+        )
+        assert len(chunks) == 3
+
+    def test_falls_back_to_chars_without_tokenizer(self):
+        text = "x" * 1500
+        with patch("chunking.get_tokenizer", return_value=None):
+            assert chunk_text(text, mode="tokens") == chunk_text_by_chars(text)
+
+    def test_char_mode(self):
+        with patch("chunking.get_tokenizer") as get_tokenizer:
+            assert chunk_text("abc", mode="chars") == ["abc"]
+        get_tokenizer.assert_not_called()
+
+    def test_unavailable_tokenizer_is_cached(self):
+        with patch.dict(chunking._tokenizers, clear=True), patch(
+            "transformers.AutoTokenizer.from_pretrained", side_effect=OSError("offline")
+        ) as from_pretrained:
+            assert chunking.get_tokenizer("some-model") is None
+            assert chunking.get_tokenizer("some-model") is None
+        from_pretrained.assert_called_once_with(
+            "sentence-transformers/some-model", use_fast=True
+        )
+
+    def test_missing_transformers_falls_back_to_chars(self):
+        with patch.dict(chunking._tokenizers, clear=True), patch.dict(
+            sys.modules, {"transformers": None}
+        ):
+            assert chunking.get_tokenizer("some-model") is None
+            assert chunk_text("x" * 1500, mode="tokens") == chunk_text_by_chars(
+                "x" * 1500
+            )
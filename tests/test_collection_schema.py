@@ -0,0 +1,119 @@
+"""
+Tests for collection_schema.py
+"""
+
+import pytest
+from pathlib import Path
+from unittest.mock import Mock
+from qdrant_client import QdrantClient, models
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from collection_schema import (
+    TIMESTAMP_FIELD,
+    backfill_timestamps,
+    ensure_collection,
+    ensure_payload_indexes,
+    migrate,
+    timestamp_epoch,
+    with_timestamp_epoch,
+)
+
+COLLECTION = "codex_history"
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    yield client
+    client.close()
+
+
+class TestTimestampEpoch:
+    """Test the conversion of message timestamps."""
+
+    def test_iso_strings(self):
+        assert timestamp_epoch("2025-07-01T00:00:00Z") == 1751328000.0
+        assert timestamp_epoch("2025-07-01T02:00:00+02:00") == 1751328000.0
+        assert timestamp_epoch("2025-07-01T00:00:00.500Z") == 1751328000.5
+        # Naive timestamps are UTC
+        assert timestamp_epoch("2025-07-01 00:00:00") == 1751328000.0
+
+    def test_numbers(self):
+        assert timestamp_epoch(1751328000) == 1751328000.0
+        assert timestamp_epoch(1751328000500) == 1751328000.5
+        assert timestamp_epoch("1751328000") == 1751328000.0
+
+    def test_unparseable(self):
+        for value in (None, "", "yesterday", True, {"t": 1}):
+            assert timestamp_epoch(value) is None
+
+    def test_payload(self):
+        assert with_timestamp_epoch({"timestamp": 10})[TIMESTAMP_FIELD] == 10.0
+        assert TIMESTAMP_FIELD not in with_timestamp_epoch({"timestamp": None})
+
+
+class TestBootstrap:
+    """Test collection creation, payload indexes and the backfill."""
+
+    def test_ensure_collection_is_idempotent(self, client):
+        assert ensure_collection(client, COLLECTION, vector_size=3)
+        assert not ensure_collection(client, COLLECTION, vector_size=3)
+        params = client.get_collection(COLLECTION).config.params.vectors
+        assert params.size == 3
+
+    def test_only_missing_indexes_are_created(self):
+        client = Mock()
+        client.get_collection.return_value.payload_schema = {"source_file": Mock()}
+
+        created = ensure_payload_indexes(client, COLLECTION)
+
+        assert created == [
+            "commit_id",
+            "event_type",
+            "source_relpath",
+            TIMESTAMP_FIELD,
+        ]
+        schemas = {
+            c.kwargs["field_name"]: c.kwargs["field_schema"]
+            for c in client.create_payload_index.call_args_list
+        }
+        assert schemas["commit_id"] == models.PayloadSchemaType.KEYWORD
+        assert schemas[TIMESTAMP_FIELD] == models.PayloadSchemaType.FLOAT
+
+    def test_backfill_sets_epochs(self, client):
+        ensure_collection(client, COLLECTION, vector_size=3)
+        client.upsert(
+            COLLECTION,
+            [
+                models.PointStruct(
+                    id=i,
+                    vector=[1.0, 0.0, 0.0],
+                    payload={"timestamp": f"2025-07-0{i + 1}T00:00:00Z"},
+                )
+                for i in range(3)
+            ]
+            + [
+                models.PointStruct(
+                    id=3, vector=[1.0, 0.0, 0.0], payload={"timestamp": "never"}
+                )
+            ],
+        )
+
+        assert backfill_timestamps(client, COLLECTION, batch_size=2) == 3
+        hits, _ = client.scroll(
+            COLLECTION,
+            scroll_filter=models.Filter(
+                must=[
+                    models.FieldCondition(
+                        key=TIMESTAMP_FIELD, range=models.Range(gte=1751414400.0)
+                    )
+                ]
+            ),
+        )
+        assert sorted(p.id for p in hits) == [1, 2]
+        # Already backfilled points are not touched again.
+        assert migrate(client, COLLECTION)["backfilled"] == 0
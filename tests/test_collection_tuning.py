@@ -0,0 +1,195 @@
+"""
+Tests for collection_tuning.py
+"""
+
+import pytest
+import numpy as np
+from pathlib import Path
+from unittest.mock import Mock
+from qdrant_client import QdrantClient, models
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import collection_tuning
+from ingest_generation import IngestGeneration
+from collection_tuning import (
+    aliased_collection,
+    apply_settings,
+    collection_settings,
+    describe,
+    overlap,
+    parse_args,
+    default_target,
+    ingest_is_recent,
+    rebuild,
+    tuned_settings,
+    wait_until_indexed,
+)
+
+COLLECTION = "codex_history"
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        COLLECTION,
+        vectors_config=models.VectorParams(size=8, distance=models.Distance.COSINE),
+    )
+    rng = np.random.default_rng(0)
+    client.upsert(
+        COLLECTION,
+        [
+            models.PointStruct(
+                id=i, vector=rng.normal(size=8).tolist(), payload={"content": str(i)}
+            )
+            for i in range(300)
+        ],
+    )
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def generation(tmp_path):
+    return IngestGeneration(str(tmp_path / "ingest_generation"))
+
+
+class TestSettings:
+    """Test how command-line options become collection settings."""
+
+    def test_quantization_settings(self):
+        settings = collection_settings(384, m=32, on_disk=True, quantization="int8")
+
+        assert settings["vectors_config"].on_disk
+        assert settings["hnsw_config"].m == 32
+        scalar = settings["quantization_config"].scalar
+        assert scalar.type == models.ScalarType.INT8
+        assert scalar.always_ram
+        assert "quantization_config" not in collection_settings(384)
+
+    def test_unset_options_keep_current_settings(self, client):
+        current = describe(client, COLLECTION)
+        args = parse_args(["rebuild", "--ef-construct", "200", "--on-disk"])
+
+        settings = tuned_settings(args, current)
+
+        assert settings == {
+            "m": 16,
+            "ef_construct": 200,
+            "on_disk": True,
+            "on_disk_payload": False,
+            "quantization": None,
+        }
+
+    def test_apply_only_sends_given_options(self):
+        client = Mock()
+
+        apply_settings(client, COLLECTION, parse_args(["apply", "--on-disk"]))
+
+        kwargs = client.update_collection.call_args.kwargs
+        assert kwargs["vectors_config"][""].on_disk is True
+        assert kwargs["hnsw_config"].m is None
+        assert kwargs["collection_params"].on_disk_payload is None
+        assert kwargs["quantization_config"] is None
+
+
+class TestRebuild:
+    """Test rebuilding the collection with new settings."""
+
+    def test_rebuild_into_new_collection(self, client, generation):
+        args = parse_args(["rebuild", "--on-disk", "--queries", "20"])
+
+        report = rebuild(client, COLLECTION, "tuned", args, generation)
+
+        assert report["copied"] == 300
+        assert report["after"]["points"] == 300
+        assert report["after"]["on_disk"] and not report["before"]["on_disk"]
+        # Exact search in local mode returns the same neighbours.
+        assert report["overlap"] == 1.0
+        assert client.collection_exists("tuned")
+
+    def test_rebuild_replace(self, client, generation):
+        args = parse_args(["rebuild", "--on-disk", "--queries", "5", "--replace"])
+
+        rebuild(client, COLLECTION, "tuned", args, generation)
+
+        assert aliased_collection(client, COLLECTION) == "tuned"
+        assert describe(client, COLLECTION)["on_disk"]
+        assert client.count(COLLECTION).count == 300
+        point = client.retrieve(COLLECTION, [7], with_vectors=True)[0]
+        assert point.payload == {"content": "7"}
+        assert len(point.vector) == 8
+
+    def test_second_replace_swaps_the_alias(self, client, generation):
+        args = parse_args(["rebuild", "--queries", "5", "--replace"])
+        rebuild(client, COLLECTION, "tuned", args, generation)
+        assert default_target(client, COLLECTION) == f"{COLLECTION}_tuned"
+
+        args = parse_args(["rebuild", "--on-disk", "--queries", "5", "--replace"])
+        report = rebuild(client, COLLECTION, "tuned_2", args, generation)
+
+        assert report["before"]["name"] == "tuned"
+        assert report["indexed"]
+        assert aliased_collection(client, COLLECTION) == "tuned_2"
+        assert not client.collection_exists("tuned")
+        assert describe(client, COLLECTION)["on_disk"]
+        assert client.count(COLLECTION).count == 300
+
+    def test_ingest_during_rebuild_blocks_the_switch(
+        self, client, generation, monkeypatch
+    ):
+        copy_points = collection_tuning.copy_points
+
+        def copy_while_ingesting(*args, **kwargs):
+            copied = copy_points(*args, **kwargs)
+            generation.bump()  # The Scribe wrote to the old collection
+            return copied
+
+        monkeypatch.setattr(collection_tuning, "copy_points", copy_while_ingesting)
+        args = parse_args(["rebuild", "--on-disk", "--queries", "5", "--replace"])
+
+        report = rebuild(client, COLLECTION, "tuned", args, generation)
+
+        assert not report["replaced"]
+        assert aliased_collection(client, COLLECTION) is None
+        assert not describe(client, COLLECTION)["on_disk"]
+        assert client.collection_exists("tuned")
+
+    def test_recent_ingest(self, generation):
+        assert not ingest_is_recent(generation)
+        generation.bump()
+        assert ingest_is_recent(generation)
+        assert not ingest_is_recent(generation, quiet=0)
+
+    def test_waits_for_indexing(self):
+        client = Mock()
+        statuses = iter(
+            [models.CollectionStatus.YELLOW, models.CollectionStatus.GREY]
+            + [models.CollectionStatus.GREEN]
+        )
+        client.get_collection.side_effect = lambda name: Mock(status=next(statuses))
+
+        assert wait_until_indexed(client, "tuned", timeout=5, poll=0)
+        assert client.get_collection.call_count == 3
+        # Pending optimizations are started by an empty config update.
+        client.update_collection.assert_called_once()
+
+        client.get_collection.side_effect = None
+        client.get_collection.return_value.status = models.CollectionStatus.YELLOW
+        assert not wait_until_indexed(client, "tuned", timeout=0, poll=0)
+
+    def test_default_target_skips_taken_names(self, client):
+        assert default_target(client, COLLECTION) == f"{COLLECTION}_tuned"
+        client.create_collection(
+            f"{COLLECTION}_tuned",
+            vectors_config=models.VectorParams(size=8, distance=models.Distance.COSINE),
+        )
+        assert default_target(client, COLLECTION) == f"{COLLECTION}_tuned_2"
+
+
+def test_overlap():
+    assert overlap([[1, 2], [3, 4]], [[2, 1], [3, 5]]) == 0.75
@@ -0,0 +1,126 @@
+"""
+Tests for content_store.py
+"""
+
+import pytest
+import random
+import tempfile
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import content_store
+from content_store import ContentStore, hit_contents, slim_points
+
+
+@pytest.fixture
+def store_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield str(Path(temp_dir) / "content.db")
+
+
+def _hit(point_id, payload):
+    hit = Mock()
+    hit.id = point_id
+    hit.payload = payload
+    return hit
+
+
+class TestContentStore:
+    """Test the compressed sidecar."""
+
+    def test_round_trip(self, store_path):
+        store = ContentStore(store_path)
+        store.put_many([("a", "hello"), ("b", "wörld " * 100)])
+        store.put_many([("a", "hello again")])
+
+        assert store.get_many(["a", "b", "missing"]) == {
+            "a": "hello again",
+            "b": "wörld " * 100,
+        }
+        assert len(store) == 2
+
+        store.delete(["a"])
+        assert store.get_many(["a"]) == {}
+
+    def test_dictionary_is_trained_and_persisted(self, store_path, monkeypatch):
+        monkeypatch.setattr(content_store, "DICTIONARY_TRAINING_CHUNKS", 300)
+        rng = random.Random(3)
+        words = [f"word{i}" for i in range(300)]
+        texts = {
+            f"p{i}": " ".join(rng.choice(words) for _ in range(60)) for i in range(600)
+        }
+        items = list(texts.items())
+
+        store = ContentStore(store_path)
+        store.put_many(items[:300])
+        assert store._dict_id == 0
+        store.put_many(items[300:])
+        assert store._dict_id == 1
+
+        # Rows written before and after training both read back.
+        reopened = ContentStore(store_path)
+        assert reopened.get_many(list(texts)) == texts
+
+    def test_dictionary_trained_by_another_instance(self, store_path, monkeypatch):
+        monkeypatch.setattr(content_store, "DICTIONARY_TRAINING_CHUNKS", 300)
+        rng = random.Random(5)
+        words = [f"word{i}" for i in range(300)]
+        texts = {
+            f"p{i}": " ".join(rng.choice(words) for _ in range(60)) for i in range(700)
+        }
+        items = list(texts.items())
+
+        # A reader and a second writer opened before any dictionary exists.
+        reader = ContentStore(store_path)
+        other = ContentStore(store_path)
+        writer = ContentStore(store_path)
+        writer.put_many(items[:300])
+        writer.put_many(items[300:600])
+        assert writer._dict_id == 1
+
+        assert reader.get_many(list(texts)[:600]) == dict(items[:600])
+        # The other writer adopts the dictionary instead of training its own.
+        other.put_many(items[600:])
+        assert other._dict_id == 1
+        count = other._conn.execute("SELECT COUNT(*) FROM dictionaries").fetchone()
+        assert count[0] == 1
+        assert reader.get_many(list(texts)) == texts
+
+
+class TestHelpers:
+    """Test slimming points and reading hits."""
+
+    def test_slim_points(self, store_path):
+        store = ContentStore(store_path)
+        points = [
+            {"id": "a", "vector": [1.0], "payload": {"content": "x", "commit_id": "c"}}
+        ]
+
+        slim = slim_points(points, store)
+
+        assert slim[0]["payload"] == {"commit_id": "c"}
+        assert points[0]["payload"]["content"] == "x"  # Input left alone
+        assert store.get_many(["a"]) == {"a": "x"}
+
+    def test_hit_contents_batches_lookups(self, store_path):
+        store = ContentStore(store_path)
+        store.put_many([("a", "from sidecar"), ("b", "also sidecar")])
+        get_store = Mock(return_value=store)
+        hits = [_hit("a", {}), _hit("c", {"content": "inline"}), _hit("b", {})]
+
+        assert hit_contents(hits, get_store) == [
+            "from sidecar",
+            "inline",
+            "also sidecar",
+        ]
+        get_store.assert_called_once()
+
+    def test_full_payloads_never_open_the_store(self):
+        get_store = Mock()
+        assert hit_contents([_hit("a", {"content": "x"})], get_store) == ["x"]
+        get_store.assert_not_called()
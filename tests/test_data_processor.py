@@ -14,6 +14,7 @@ import sys
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from chunking import MAX_CHUNK_TOKENS
 from data_processor import (
     ConversationDataProcessor,
     load_conversation_data,
@@ -121,7 +122,8 @@ class TestConversationDataProcessor:
         df = pd.DataFrame(test_data)
 
         processor = ConversationDataProcessor("/tmp")  # Dummy path
-        chunked_df = processor.chunk_text_efficiently(df, chunk_size=50, overlap=10)
+        with patch("chunking.CHUNK_MODE", "chars"):
+            chunked_df = processor.chunk_text_efficiently(df, chunk_size=50, overlap=10)
 
         # Should have more rows due to chunking
         assert len(chunked_df) >= len(df)
@@ -129,6 +131,21 @@ class TestConversationDataProcessor:
         assert "chunk_index" in chunked_df.columns
         assert "original_length" in chunked_df.columns
 
+    def test_chunk_text_efficiently_uses_model_tokens(self, tokenizer):
+        """Test that chunks fit the model's token budget by default."""
+        text = " ".join(["memory", "scroll", "codex"] * 300)
+        df = pd.DataFrame({"content": [text, "Short message"], "id": ["m1", "m2"]})
+
+        processor = ConversationDataProcessor("/tmp")  # Dummy path
+        with patch("chunking.get_tokenizer", return_value=tokenizer):
+            chunked_df = processor.chunk_text_efficiently(df)
+
+        assert len(chunked_df) > len(df)
+        for chunk in chunked_df["content"]:
+            token_ids = tokenizer(chunk, add_special_tokens=False)["input_ids"]
+            assert len(token_ids) <= MAX_CHUNK_TOKENS
+        assert chunked_df["content"].iloc[-1] == "Short message"
+
     def test_get_statistics_empty_df(self):
         """Test statistics for empty DataFrame."""
         df = pd.DataFrame()
@@ -0,0 +1,68 @@
+"""
+Tests for dead_letter.py
+"""
+
+import pytest
+import tempfile
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dead_letter import DeadLetterQueue
+
+
+def _points(n, start=0):
+    return [
+        {"id": f"p{i}", "vector": [0.5, float(i)], "payload": {"content": f"c{i}"}}
+        for i in range(start, start + n)
+    ]
+
+
+@pytest.fixture
+def queue():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield DeadLetterQueue(str(Path(temp_dir) / "dead_letter.db"))
+
+
+class TestDeadLetterQueue:
+    """Test persisting and replaying failed batches."""
+
+    def test_batches_round_trip(self, queue):
+        queue.add("codex_history", _points(2), RuntimeError("down"))
+        queue.add("other", _points(1, start=2), RuntimeError("down"))
+
+        batches = list(queue.batches())
+        assert [(c, [p["id"] for p in pts]) for _, c, pts in batches] == [
+            ("codex_history", ["p0", "p1"]),
+            ("other", ["p2"]),
+        ]
+        assert batches[0][2] == _points(2)
+        assert len(queue) == 2
+        assert queue.point_count() == 3
+
+    def test_replay_flushes_accepted_batches(self, queue):
+        queue.add("codex_history", _points(2), RuntimeError("down"))
+        client = Mock()
+
+        assert queue.replay(client, retries=0) == (2, 0)
+        assert len(queue) == 0
+        kwargs = client.upsert.call_args.kwargs
+        assert kwargs["wait"] is True
+        assert [p.id for p in kwargs["points"]] == ["p0", "p1"]
+        assert kwargs["points"][1].vector == [0.5, 1.0]
+
+    def test_failed_replay_stays_queued(self, queue):
+        queue.add("codex_history", _points(1), RuntimeError("down"))
+        client = Mock()
+        client.upsert.side_effect = RuntimeError("still down")
+
+        assert queue.replay(client, retries=0) == (0, 1)
+        assert len(queue) == 1
+        attempts, error = queue._conn.execute(
+            "SELECT attempts, error FROM batches"
+        ).fetchone()
+        assert (attempts, error) == (2, "still down")
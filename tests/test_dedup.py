@@ -0,0 +1,114 @@
+"""
+Tests for dedup.py
+"""
+
+import pytest
+import random
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dedup import DedupIndex, minhash, similarity
+
+random.seed(7)
+VOCAB = [f"word{i}" for i in range(500)]
+
+
+def _text(n_words: int = 60) -> str:
+    return " ".join(random.choice(VOCAB) for _ in range(n_words))
+
+
+def _record(point_id: str, text: str) -> dict:
+    return {"id": point_id, "payload": {"content": text}, "source_path": "/a.json"}
+
+
+@pytest.fixture
+def index():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield DedupIndex(str(Path(temp_dir) / "dedup.db"))
+
+
+class TestMinHash:
+    """Test the MinHash signature."""
+
+    def test_stable_and_normalized(self):
+        text = _text()
+        assert (minhash(text) == minhash(text)).all()
+        assert (minhash(text) == minhash("  " + text.upper().replace(" ", "\n"))).all()
+
+    def test_near_texts_are_similar(self):
+        words = _text(80).split()
+        edited = words[:40] + ["changed"] + words[41:]
+
+        near = similarity(minhash(" ".join(words)), minhash(" ".join(edited)))
+        far = similarity(minhash(" ".join(words)), minhash(_text(80)))
+        assert near >= 0.8
+        assert far < 0.2
+
+    def test_short_text_has_no_signature(self):
+        assert minhash("ok thanks") is None
+
+
+class TestDedupIndex:
+    """Test duplicate suppression."""
+
+    def test_exact_duplicates_are_skipped(self, index):
+        text = _text()
+        kept = list(index.filter([_record("a", text), _record("b", text + "  ")]))
+
+        assert [r["id"] for r in kept] == ["a"]
+        assert index.duplicates == 1
+        assert index.duplicate_of("b") == "a"
+
+    def test_near_duplicates_are_skipped(self, index):
+        words = _text(80).split()
+        copy = " ".join(words[:40] + ["changed"] + words[41:])
+        # One changed word in 80 -> Jaccard similarity of the shingles ~0.93
+        kept = list(index.filter([_record("a", " ".join(words)), _record("b", copy)]))
+
+        assert [r["id"] for r in kept] == ["a"]
+
+    def test_distinct_chunks_are_kept(self, index):
+        kept = list(index.filter([_record(str(i), _text()) for i in range(20)]))
+        assert len(kept) == 20
+        assert len(index) == 20
+
+    def test_short_chunks_match_exactly_only(self, index):
+        records = [_record("a", "ok"), _record("b", "ok"), _record("c", "ok!")]
+        kept = list(index.filter(records))
+        assert [r["id"] for r in kept] == ["a", "c"]
+
+    def test_own_point_is_not_a_duplicate(self, index):
+        text = _text()
+        list(index.filter([_record("a", text)]))
+
+        # Re-ingesting the same chunk overwrites its own point.
+        assert [r["id"] for r in index.filter([_record("a", text)])] == ["a"]
+        assert index.find_duplicate("a", text) is None
+        assert index.find_duplicate("b", text) == "a"
+
+    def test_removed_points_are_forgotten(self, index):
+        text = _text()
+        list(index.filter([_record("a", text), _record("b", text)]))
+        assert index.referenced(["a"]) == {"a"}
+        # "b" is deleted along with "a", so "a" no longer stands in for it.
+        assert index.referenced(["a", "b"]) == set()
+
+        index.remove(["a", "b"])
+
+        assert len(index) == 0
+        assert index.duplicate_of("b") is None
+        assert [r["id"] for r in index.filter([_record("c", text)])] == ["c"]
+
+    def test_index_is_persisted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = str(Path(temp_dir) / "dedup.db")
+            text = _text()
+            list(DedupIndex(path).filter([_record("a", text)]))
+
+            reopened = DedupIndex(path)
+            assert list(reopened.filter([_record("b", text)])) == []
@@ -0,0 +1,76 @@
+"""
+Tests for embedding_backend.py
+"""
+
+import pytest
+import numpy as np
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from embedding_backend import (
+    ONNX_INT8_MODEL_FILE,
+    backend_kwargs,
+    benchmark,
+    cache_model_name,
+    parity_check,
+)
+
+
+def _model(vectors: np.ndarray):
+    """A model whose encode() returns fixed vectors, one per input text."""
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: (
+        vectors[: len(texts)] if isinstance(texts, list) else vectors[0]
+    )
+    return model
+
+
+class TestBackendSelection:
+    """Test how backends map onto SentenceTransformer arguments."""
+
+    def test_torch_is_the_plain_model(self):
+        assert backend_kwargs("torch") == {}
+        assert cache_model_name("all-MiniLM-L6-v2", "torch") == "all-MiniLM-L6-v2"
+
+    def test_onnx_int8(self):
+        assert backend_kwargs("onnx-int8") == {
+            "backend": "onnx",
+            "model_kwargs": {"file_name": ONNX_INT8_MODEL_FILE},
+        }
+        # Quantized vectors must not be served as torch vectors from the cache.
+        assert cache_model_name("m", "onnx-int8") == "m@onnx-int8"
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Unknown embedding backend"):
+            backend_kwargs("tensorrt")
+
+
+class TestParityAndBenchmark:
+    """Test the backend comparison helpers."""
+
+    def test_parity_check(self):
+        rng = np.random.RandomState(0)
+        expected = rng.randn(20, 8)
+        close = expected + rng.randn(20, 8) * 0.01
+        texts = [f"t{i}" for i in range(20)]
+
+        result = parity_check(_model(expected), _model(close), texts)
+        assert result["passed"]
+        assert result["texts"] == 20
+        assert 0.99 < result["min_cosine"] <= result["mean_cosine"] <= 1.0
+
+        result = parity_check(_model(expected), _model(rng.randn(20, 8)), texts)
+        assert not result["passed"]
+
+    def test_benchmark(self):
+        model = _model(np.ones((30, 4)))
+        result = benchmark(model, [f"t{i}" for i in range(30)], queries=5)
+
+        assert set(result) == {"query_p50_ms", "query_p95_ms", "texts_per_sec"}
+        # Warm-up, five single-text queries and one batched pass.
+        assert model.encode.call_count == 7
@@ -0,0 +1,99 @@
+"""
+Tests for embedding_cache.py
+"""
+
+import pytest
+import tempfile
+import numpy as np
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from embedding_cache import EmbeddingCache, chunk_hash, encode_with_cache
+
+
+def _counting_model():
+    """A model that encodes a text as [len(text), 1.0] and records its inputs."""
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[len(t), 1.0] for t in texts], dtype=np.float32
+    )
+    return model
+
+
+@pytest.fixture
+def cache_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield str(Path(temp_dir) / "cache" / "embeddings.db")
+
+
+class TestChunkHash:
+    """Test cache keys."""
+
+    def test_whitespace_is_normalized(self):
+        assert chunk_hash("hello   world\n") == chunk_hash("hello world")
+
+    def test_case_is_preserved(self):
+        assert chunk_hash("Hello") != chunk_hash("hello")
+
+
+class TestEmbeddingCache:
+    """Test cases for EmbeddingCache."""
+
+    def test_round_trip(self, cache_path):
+        cache = EmbeddingCache("model-a", path=cache_path)
+        cache.put_many(["a", "bb"], [np.array([1, 2]), np.array([3, 4])])
+
+        result = cache.get_many(["bb", "missing", "a"])
+
+        assert result[0].tolist() == [3.0, 4.0]
+        assert result[1] is None
+        assert result[2].tolist() == [1.0, 2.0]
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    def test_keyed_by_model(self, cache_path):
+        EmbeddingCache("model-a", path=cache_path).put_many(["a"], [np.ones(2)])
+
+        assert EmbeddingCache("model-b", path=cache_path).get_many(["a"]) == [None]
+        assert EmbeddingCache("model-a", path=cache_path).get_many(["a"])[0] is not None
+
+    def test_eviction_drops_least_recently_used(self, cache_path):
+        cache = EmbeddingCache("model-a", path=cache_path, max_entries=10)
+        cache.put_many([f"old{i}" for i in range(5)], [np.ones(2)] * 5)
+        cache.put_many([f"new{i}" for i in range(5)], [np.ones(2)] * 5)
+        cache.get_many(["old0"])  # Touch one old entry
+
+        cache.put_many(["overflow"], [np.ones(2)])
+
+        assert len(cache) == 9
+        survivors = cache.get_many([f"old{i}" for i in range(1, 5)])
+        assert sum(v is not None for v in survivors) == 2
+        kept = cache.get_many(["old0", "overflow"] + [f"new{i}" for i in range(5)])
+        assert all(v is not None for v in kept)
+
+
+class TestEncodeWithCache:
+    """Test cached encoding."""
+
+    def test_without_cache(self):
+        model = _counting_model()
+        vectors = encode_with_cache(model, ["ab", "c"])
+        assert vectors.tolist() == [[2.0, 1.0], [1.0, 1.0]]
+
+    def test_only_misses_are_encoded(self, cache_path):
+        cache = EmbeddingCache("model-a", path=cache_path)
+        model = _counting_model()
+        encode_with_cache(model, ["ab", "c"], cache)
+
+        vectors = encode_with_cache(model, ["c", "ddd", "ddd"], cache)
+
+        assert vectors.tolist() == [[1.0, 1.0], [3.0, 1.0], [3.0, 1.0]]
+        assert model.encode.call_args.args[0] == ["ddd"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
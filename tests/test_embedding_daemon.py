@@ -0,0 +1,123 @@
+"""
+Tests for embedding_daemon.py
+"""
+
+import pytest
+import tempfile
+import threading
+import numpy as np
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from embedding_daemon import (
+    EmbeddingClient,
+    EmbeddingDaemon,
+    _daemon_info,
+    connect_embedding_model,
+)
+
+
+def _fake_model():
+    """A model that encodes a text as [len(text), 1, 2]."""
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[len(t), 1.0, 2.0] for t in texts], dtype=np.float32
+    )
+    return model
+
+
+@pytest.fixture
+def socket_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield str(Path(temp_dir) / "embedding.sock")
+
+
+@pytest.fixture
+def daemon(socket_path):
+    server = EmbeddingDaemon(_fake_model(), socket_path, "model-a", "torch")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestEmbeddingDaemon:
+    """Test encoding through the daemon."""
+
+    def test_encode_matches_sentence_transformer_shapes(self, daemon, socket_path):
+        client = EmbeddingClient(Mock(), socket_path)
+
+        vectors = client.encode(["a", "bbb"], batch_size=8, show_progress_bar=False)
+        assert vectors.shape == (2, 3)
+        assert vectors[:, 0].tolist() == [1.0, 3.0]
+        assert client.encode("hello").tolist() == [5.0, 1.0, 2.0]
+
+    def test_concurrent_requests(self, daemon, socket_path):
+        client = EmbeddingClient(Mock(), socket_path)
+        results = {}
+
+        def query(n):
+            results[n] = client.encode(["x" * n] * n)
+
+        threads = [threading.Thread(target=query, args=(n,)) for n in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for n, vectors in results.items():
+            assert vectors.shape == (n, 3)
+            assert (vectors[:, 0] == n).all()
+        # Requests that queued up together shared an encode call.
+        assert daemon.encoder.calls <= 8
+
+    def test_stale_socket_is_replaced(self, socket_path):
+        first = EmbeddingDaemon(_fake_model(), socket_path, "model-a", "torch")
+        first.socket.close()  # Dies without cleaning up its socket file
+        assert Path(socket_path).exists()
+
+        second = EmbeddingDaemon(_fake_model(), socket_path, "model-a", "torch")
+        second.server_close()
+        assert not Path(socket_path).exists()
+
+
+class TestFallback:
+    """Test in-process encoding when the daemon is not usable."""
+
+    def test_no_daemon_loads_locally(self, socket_path):
+        local = _fake_model()
+        assert (
+            connect_embedding_model(lambda: local, "model-a", "torch", socket_path)
+            is local
+        )
+
+    def test_daemon_with_other_model_is_not_used(self, daemon, socket_path):
+        local = _fake_model()
+        assert _daemon_info(socket_path) == {"model": "model-a", "backend": "torch"}
+        assert (
+            connect_embedding_model(lambda: local, "model-a", "onnx", socket_path)
+            is local
+        )
+        assert (
+            connect_embedding_model(lambda: local, "model-b", "torch", socket_path)
+            is local
+        )
+
+    def test_client_falls_back_when_daemon_stops(self, daemon, socket_path):
+        local = _fake_model()
+        client = connect_embedding_model(lambda: local, "model-a", "torch", socket_path)
+        assert isinstance(client, EmbeddingClient)
+        client.encode(["a"])
+        local.encode.assert_not_called()
+
+        daemon.shutdown()
+        daemon.server_close()
+
+        assert client.encode(["abcd"])[0, 0] == 4.0
+        local.encode.assert_called_once()
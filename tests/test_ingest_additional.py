@@ -0,0 +1,93 @@
+"""
+Tests for ingest_additional.py
+"""
+
+import json
+import types
+import numpy as np
+import pytest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import chunking
+import ingest_additional
+from ingest_manifest import file_content_hash
+
+
+@pytest.fixture(autouse=True)
+def char_chunking(monkeypatch):
+    """Chunk by characters, so tests don't depend on downloading a tokenizer."""
+    monkeypatch.setattr(chunking, "CHUNK_MODE", "chars")
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    """A logs.json under <archive>/<commit>/, found by a stubbed scan."""
+    logs = tmp_path / "abc123" / "logs.json"
+    logs.parent.mkdir()
+    logs.write_text(
+        json.dumps(
+            [
+                {"type": "user", "message": f"message {i}", "messageId": i}
+                for i in range(10)
+            ]
+        )
+    )
+    scan = types.SimpleNamespace(checkpoint_files=[], logs_files=[str(logs)])
+    monkeypatch.setattr(ingest_additional, "ARCHIVE_PATH", str(tmp_path))
+    with patch.object(ingest_additional, "scan_archive", return_value=scan):
+        yield logs
+
+
+def _fake_model():
+    """A model whose encode() returns one 3-d vector per input text."""
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 3))
+    return model
+
+
+@pytest.mark.parametrize("pack", [False, True])
+def test_files_stream_to_the_writer_with_their_version(archive, pack):
+    writer = Mock()
+
+    versions = ingest_additional.process_additional_files(
+        _fake_model(), writer, pack=pack, batch_size=4
+    )
+
+    version = file_content_hash(str(archive))
+    assert versions == {str(archive): version}
+    batches = [call.args[0] for call in writer.submit.call_args_list]
+    assert all(len(batch) <= 4 for batch in batches)
+    points = [point for batch in batches for point in batch]
+    assert points
+    for point in points:
+        assert point["payload"]["source_relpath"] == "abc123/logs.json"
+        assert point["payload"]["source_version"] == version
+    if pack:
+        assert len(points) == 1
+        assert len(points[0]["payload"]["packed_messages"]) == 10
+    else:
+        assert len(points) == 10
+
+
+def test_packed_records_are_streamed(archive):
+    records = ingest_additional._packed_records(str(archive), "abc123/logs.json")
+    assert isinstance(records, types.GeneratorType)
+    assert next(records)["payload"]["source_relpath"] == "abc123/logs.json"
+
+
+def test_delete_superseded_uses_each_files_version(archive):
+    cleaner = Mock()
+    cleaner.delete_superseded.return_value = 2
+
+    deleted = ingest_additional.delete_superseded(cleaner, {str(archive): "v2"})
+
+    assert deleted == 2
+    cleaner.delete_superseded.assert_called_once_with(
+        "abc123/logs.json", "v2", "logs.json", "unknown"
+    )
@@ -0,0 +1,63 @@
+"""
+Tests for ingest_journal.py
+"""
+
+import pytest
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ingest_journal import IngestJournal, _runs
+
+
+@pytest.fixture
+def journal_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield str(Path(temp_dir) / "journal.db")
+
+
+class TestRuns:
+    """Test collapsing sequence numbers into ranges."""
+
+    def test_runs(self):
+        assert _runs([5, 1, 2, 3, 7, 6, 2]) == [(1, 3), (5, 7)]
+        assert _runs([]) == []
+
+
+class TestIngestJournal:
+    """Test recording and reading committed chunks."""
+
+    def test_record_and_read_back(self, journal_path):
+        journal = IngestJournal(journal_path)
+        journal.record({("/a/logs.json", "sha1"): [0, 1, 2, 5]})
+        journal.record({("/a/logs.json", "sha1"): [3, 4], ("/a/b.json", "sha2"): [0]})
+
+        assert journal.committed("/a/logs.json", "sha1") == {0, 1, 2, 3, 4, 5}
+        assert journal.committed("/a/b.json", "sha2") == {0}
+        assert len(journal) == 4
+
+    def test_other_file_version_is_not_committed(self, journal_path):
+        journal = IngestJournal(journal_path)
+        journal.record({("/a/logs.json", "old"): [0, 1]})
+
+        assert journal.committed("/a/logs.json", "new") == set()
+
+    def test_survives_reopening(self, journal_path):
+        IngestJournal(journal_path).record({("/a/logs.json", "sha1"): [0, 1]})
+
+        assert IngestJournal(journal_path).committed("/a/logs.json", "sha1") == {0, 1}
+
+    def test_forget_and_clear(self, journal_path):
+        journal = IngestJournal(journal_path)
+        journal.record({("/a/x.json", "s"): [0], ("/a/y.json", "s"): [0]})
+
+        journal.forget(["/a/x.json"])
+        assert journal.committed("/a/x.json", "s") == set()
+        assert journal.committed("/a/y.json", "s") == {0}
+
+        journal.clear()
+        assert len(journal) == 0
@@ -0,0 +1,91 @@
+"""
+Tests for ingest_manifest.py
+"""
+
+import pytest
+import os
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ingest_manifest import IngestManifest, make_point_id
+
+
+class TestMakePointId:
+    """Test deterministic point IDs."""
+
+    def test_stable(self):
+        assert make_point_id("a/logs.json", "s1:3", 0) == make_point_id(
+            "a/logs.json", "s1:3", 0
+        )
+
+    def test_distinct(self):
+        ids = {
+            make_point_id("a/logs.json", "s1:3", 0),
+            make_point_id("a/logs.json", "s1:3", 1),
+            make_point_id("a/logs.json", "s2:3", 0),
+            make_point_id("b/logs.json", "s1:3", 0),
+        }
+        assert len(ids) == 4
+
+
+class TestIngestManifest:
+    """Test the persistent ingest manifest."""
+
+    def test_new_file_is_changed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = Path(temp_dir) / "session-1.json"
+            data_file.write_text("{}")
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+
+            assert not manifest.is_unchanged(str(data_file))
+
+    def test_round_trip_and_unchanged(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = Path(temp_dir) / "session-1.json"
+            data_file.write_text('{"messages": []}')
+            manifest_path = str(Path(temp_dir) / "state" / "manifest.json")
+
+            manifest = IngestManifest(manifest_path)
+            manifest.record(str(data_file), manifest.fingerprint(str(data_file)))
+            manifest.save()
+
+            reloaded = IngestManifest(manifest_path)
+            assert reloaded.is_unchanged(str(data_file))
+
+    def test_modified_file_is_changed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = Path(temp_dir) / "session-1.json"
+            data_file.write_text('{"messages": []}')
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+            manifest.record(str(data_file), manifest.fingerprint(str(data_file)))
+
+            data_file.write_text('{"messages": [1]}')
+            assert not manifest.is_unchanged(str(data_file))
+
+    def test_touched_file_is_unchanged(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = Path(temp_dir) / "session-1.json"
+            data_file.write_text('{"messages": []}')
+            manifest = IngestManifest(str(Path(temp_dir) / "manifest.json"))
+            manifest.record(str(data_file), manifest.fingerprint(str(data_file)))
+
+            stat = os.stat(data_file)
+            os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            assert manifest.is_unchanged(str(data_file))
+            assert manifest.get(str(data_file))["mtime_ns"] == stat.st_mtime_ns + 10**9
+
+    def test_corrupt_manifest_starts_empty(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest_path = Path(temp_dir) / "manifest.json"
+            manifest_path.write_text("not json")
+
+            assert IngestManifest(str(manifest_path)).entries == {}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,99 @@
+"""
+Tests for json_stream.py
+"""
+
+import pytest
+import io
+import json
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import json_stream
+from json_stream import _StreamReader, iter_messages, stream_messages
+
+LOGS = [
+    {"sessionId": "s1", "messageId": 0, "type": "user", "message": "hi [x] {y}"},
+    {"sessionId": "s1", "messageId": 12345, "type": "user", "message": 'q"uote\\n'},
+    {"role": "model", "parts": [{"text": "ünïcødé"}], "score": 1.5e-3},
+    123456789,
+    None,
+]
+
+
+def _write(temp_dir: str, data, name: str = "logs.json", indent=None) -> str:
+    path = Path(temp_dir) / name
+    path.write_text(json.dumps(data, indent=indent), encoding="utf-8")
+    return str(path)
+
+
+class TestStreamReader:
+    """Test incremental decoding across tiny read blocks."""
+
+    @pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64])
+    def test_array_matches_json_load(self, read_size):
+        text = json.dumps(LOGS, indent=2)
+        reader = _StreamReader(io.StringIO(text), read_size=read_size)
+        assert list(reader.iter_array()) == LOGS
+
+    def test_empty_array(self):
+        assert list(_StreamReader(io.StringIO(" [ ] ")).iter_array()) == []
+
+    def test_truncated_array_raises(self):
+        reader = _StreamReader(io.StringIO('[{"a": 1}, {"b":'), read_size=4)
+        with pytest.raises(json.JSONDecodeError):
+            list(reader.iter_array())
+
+
+class TestStreamMessages:
+    """Test message extraction from whole files."""
+
+    def test_top_level_array(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            assert list(stream_messages(_write(temp_dir, LOGS))) == LOGS
+
+    def test_messages_object(self):
+        data = {
+            "sessionId": "abc",
+            "meta": {"messages": ["not these"], "n": [1, 2]},
+            "messages": LOGS,
+            "lastUpdated": "2025-01-01",
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = _write(temp_dir, data, "session-1.json", indent=1)
+            assert list(stream_messages(path)) == LOGS
+
+    def test_object_without_messages(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = _write(temp_dir, {"sessionId": "abc"}, "session-1.json")
+            assert list(stream_messages(path)) == []
+
+    def test_small_files_use_json_load(self, monkeypatch):
+        monkeypatch.setattr(json_stream, "stream_messages", None)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            assert list(iter_messages(_write(temp_dir, LOGS))) == LOGS
+
+    def test_large_file_memory_stays_flat(self):
+        message = {"sessionId": "s", "messageId": 0, "message": "x" * 1000}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "logs.json"
+            with open(path, "w") as f:
+                f.write("[" + ",".join([json.dumps(message)] * 5000) + "]")
+            file_size = path.stat().st_size
+
+            tracemalloc.start()
+            count = sum(1 for _ in iter_messages(str(path), threshold=0))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        assert count == 5000
+        assert peak < file_size / 10
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
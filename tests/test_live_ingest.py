@@ -0,0 +1,291 @@
+"""
+Tests for live_ingest.py
+"""
+
+import pytest
+import json
+import time
+import tempfile
+import threading
+import numpy as np
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import live_ingest
+import chunking
+from ingest_manifest import IngestManifest
+
+
+@pytest.fixture
+def scribe(monkeypatch):
+    """Runs live_ingest against a temp archive with a fake model and client."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive = Path(temp_dir) / "archive"
+        chats_dir = archive / "commit123" / "chats"
+        chats_dir.mkdir(parents=True)
+
+        model = Mock()
+        model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 3))
+        client = Mock()
+        client.scroll.return_value = ([], None)
+
+        monkeypatch.setattr(chunking, "CHUNK_MODE", "chars")
+        monkeypatch.setattr(live_ingest, "ARCHIVE_PATH", str(archive))
+        monkeypatch.setattr(live_ingest, "_embedding_model", model)
+        monkeypatch.setattr(live_ingest, "_qdrant_client", client)
+        monkeypatch.setattr(live_ingest, "_embedding_cache", None)
+        monkeypatch.setattr(live_ingest, "_stale_point_cleaner", None)
+        monkeypatch.setattr(
+            live_ingest,
+            "_scribe_state",
+            IngestManifest(str(Path(temp_dir) / "scribe_state.json")),
+        )
+        with patch("live_ingest.get_embedding_cache", return_value=None), patch(
+            "live_ingest.get_dedup_index", return_value=None
+        ), patch("live_ingest.get_dead_letter_queue", return_value=None), patch(
+            "live_ingest.get_ingest_generation", return_value=None
+        ):
+            yield chats_dir / "session-1.json", model, client
+
+
+def _write(path: Path, n_messages: int):
+    messages = [{"id": f"m{i}", "content": f"message {i}"} for i in range(n_messages)]
+    path.write_text(json.dumps({"messages": messages}))
+
+
+def _upserted_contents(client):
+    return [
+        p.payload["content"]
+        for c in client.upsert.call_args_list
+        for p in c.kwargs["points"]
+    ]
+
+
+class TestTailIngestion:
+    """Test that growing session files are ingested incrementally."""
+
+    def test_new_file_is_fully_ingested(self, scribe):
+        session_file, model, client = scribe
+        _write(session_file, 3)
+
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        assert _upserted_contents(client) == ["message 0", "message 1", "message 2"]
+        state = live_ingest.get_scribe_state().get(str(session_file))
+        assert state["messages_ingested"] == 3
+
+    def test_only_new_messages_are_embedded(self, scribe):
+        session_file, model, client = scribe
+        _write(session_file, 3)
+        live_ingest.process_and_ingest_file(str(session_file))
+        client.reset_mock()
+
+        _write(session_file, 5)
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        # The last previously seen message is re-checked, plus the two new ones.
+        assert _upserted_contents(client) == ["message 2", "message 3", "message 4"]
+
+    def test_unchanged_file_is_skipped(self, scribe):
+        session_file, model, client = scribe
+        _write(session_file, 2)
+        live_ingest.process_and_ingest_file(str(session_file))
+        client.reset_mock()
+
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        client.upsert.assert_not_called()
+
+    def test_shrunk_file_is_reingested(self, scribe):
+        session_file, model, client = scribe
+        _write(session_file, 4)
+        live_ingest.process_and_ingest_file(str(session_file))
+        client.reset_mock()
+
+        _write(session_file, 2)
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        assert _upserted_contents(client) == ["message 0", "message 1"]
+
+
+class TestStalePoints:
+    """Test that points of rewritten and deleted files are removed."""
+
+    def test_rewritten_file_deletes_previous_version(self, scribe):
+        session_file, model, client = scribe
+        _write(session_file, 4)
+        live_ingest.process_and_ingest_file(str(session_file))
+        first_version = client.upsert.call_args.kwargs["points"][0].payload[
+            "source_version"
+        ]
+        client.reset_mock()
+        client.scroll.return_value = ([Mock(id="old-1"), Mock(id="old-2")], None)
+
+        _write(session_file, 2)
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        payload = client.upsert.call_args.kwargs["points"][0].payload
+        assert payload["source_relpath"] == "commit123/chats/session-1.json"
+        assert payload["source_version"] != first_version
+        scroll_filter = client.scroll.call_args.kwargs["scroll_filter"]
+        assert scroll_filter.should[0].must_not[0].match.value == (
+            payload["source_version"]
+        )
+        deleted = client.delete.call_args.kwargs["points_selector"].points
+        assert deleted == ["old-1", "old-2"]
+
+    def test_appended_messages_keep_the_version(self, scribe):
+        session_file, model, client = scribe
+        _write(session_file, 2)
+        live_ingest.process_and_ingest_file(str(session_file))
+        first_version = client.upsert.call_args.kwargs["points"][0].payload[
+            "source_version"
+        ]
+        client.reset_mock()
+
+        _write(session_file, 3)
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        points = client.upsert.call_args.kwargs["points"]
+        assert {p.payload["source_version"] for p in points} == {first_version}
+        client.scroll.assert_not_called()
+        client.delete.assert_not_called()
+
+    def test_deleted_file_deletes_its_points(self, scribe):
+        session_file, model, client = scribe
+        _write(session_file, 2)
+        live_ingest.process_and_ingest_file(str(session_file))
+        client.scroll.return_value = ([Mock(id="a"), Mock(id="b")], None)
+
+        session_file.unlink()
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        assert client.delete.call_args.kwargs["points_selector"].points == ["a", "b"]
+        assert live_ingest.get_scribe_state().get(str(session_file)) is None
+
+    def test_missing_file_without_scribe_state_deletes_its_points(self, scribe):
+        # Ingested by batch_ingest.py, so the Scribe has no state for it.
+        session_file, model, client = scribe
+        client.scroll.return_value = ([Mock(id="a")], None)
+
+        live_ingest.process_and_ingest_file(str(session_file))
+
+        scroll_filter = client.scroll.call_args.kwargs["scroll_filter"]
+        assert scroll_filter.should[0].must[0].match.value == (
+            "commit123/chats/session-1.json"
+        )
+        assert client.delete.call_args.kwargs["points_selector"].points == ["a"]
+
+
+class TestIngestQueue:
+    """Test the debounced, coalescing ingestion queue."""
+
+    def test_repeated_events_coalesce(self):
+        ingest_queue = live_ingest.IngestQueue(debounce=0.05)
+        for _ in range(5):
+            ingest_queue.put("/a/session-1.json")
+        ingest_queue.put("/a/session-2.json")
+
+        assert ingest_queue.stats()["depth"] == 2
+        first = ingest_queue.get()
+        second = ingest_queue.get()
+        assert {first[0], second[0]} == {"/a/session-1.json", "/a/session-2.json"}
+        assert ingest_queue.stats()["in_progress"] == 2
+
+    def test_job_waits_for_debounce_window(self):
+        ingest_queue = live_ingest.IngestQueue(debounce=0.2)
+        ingest_queue.put("/a/session-1.json")
+        start = time.monotonic()
+
+        path, _ = ingest_queue.get()
+
+        assert path == "/a/session-1.json"
+        assert time.monotonic() - start >= 0.15
+
+    def test_active_path_is_not_handed_out_twice(self):
+        ingest_queue = live_ingest.IngestQueue(debounce=0)
+        ingest_queue.put("/a/session-1.json")
+        path, first_seen = ingest_queue.get()
+        ingest_queue.put("/a/session-1.json")  # Event while being processed
+
+        got = []
+        getter = threading.Thread(target=lambda: got.append(ingest_queue.get()))
+        getter.start()
+        getter.join(timeout=0.2)
+        assert getter.is_alive()
+
+        ingest_queue.task_done(path, first_seen)
+        getter.join(timeout=2)
+        assert got[0][0] == "/a/session-1.json"
+        assert ingest_queue.stats()["processed"] == 1
+
+    def test_close_releases_workers(self):
+        ingest_queue = live_ingest.IngestQueue()
+        workers = live_ingest.start_workers(ingest_queue, count=2)
+        ingest_queue.close()
+        for worker in workers:
+            worker.join(timeout=2)
+            assert not worker.is_alive()
+
+    @patch("live_ingest.process_and_ingest_file")
+    def test_workers_drain_queue(self, mock_process):
+        ingest_queue = live_ingest.IngestQueue(debounce=0)
+        workers = live_ingest.start_workers(ingest_queue, count=2)
+        for n in range(4):
+            ingest_queue.put(f"/a/session-{n}.json")
+
+        deadline = time.monotonic() + 5
+        while ingest_queue.stats()["processed"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        ingest_queue.close()
+        for worker in workers:
+            worker.join(timeout=2)
+
+        assert mock_process.call_count == 4
+
+
+class TestSessionFileHandler:
+    """Test the watchdog event handler."""
+
+    def test_events_are_queued(self):
+        ingest_queue = live_ingest.IngestQueue()
+        handler = live_ingest.SessionFileHandler(ingest_queue)
+        handler.on_created(Mock(is_directory=False, src_path="/a/chats/session-1.json"))
+        handler.on_modified(
+            Mock(is_directory=False, src_path="/a/chats/session-1.json")
+        )
+        handler.on_modified(Mock(is_directory=False, src_path="/a/chats/notes.json"))
+
+        stats = ingest_queue.stats()
+        assert stats["events"] == 2
+        assert stats["depth"] == 1
+
+    def test_deleted_and_moved_files_are_queued(self):
+        ingest_queue = live_ingest.IngestQueue()
+        handler = live_ingest.SessionFileHandler(ingest_queue)
+        handler.on_deleted(Mock(is_directory=False, src_path="/a/chats/session-1.json"))
+        handler.on_moved(
+            Mock(
+                is_directory=False,
+                src_path="/a/chats/session-2.json",
+                dest_path="/b/chats/session-2.json",
+            )
+        )
+        handler.on_moved(
+            Mock(
+                is_directory=False,
+                src_path="/a/chats/session-3.json",
+                dest_path="/a/chats/session-3.json.bak",
+            )
+        )
+
+        assert ingest_queue.stats()["depth"] == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -3,6 +3,9 @@ Tests for memory_tools.py
 """
 
 import pytest
+import tempfile
+import numpy as np
+from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 import sys
 import os
@@ -10,7 +13,31 @@ import os
 # Add the parent directory to the path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import memory_tools
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
 from memory_tools import query_my_memory, _get_model, _get_client
+from collection_schema import with_timestamp_epoch
+from ingest_generation import IngestGeneration
+from query_cache import QueryEmbeddingCache, ResultCache
+
+
+@pytest.fixture(autouse=True)
+def query_cache(monkeypatch):
+    """A fresh in-memory query cache per test."""
+    cache = QueryEmbeddingCache("test-model")
+    monkeypatch.setattr(memory_tools, "_query_cache", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def result_cache(monkeypatch):
+    """A fresh result cache per test, with its own ingest generation."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        generation = IngestGeneration(str(Path(temp_dir) / "ingest_generation"))
+        cache = ResultCache(generation)
+        monkeypatch.setattr(memory_tools, "_result_cache", cache)
+        yield cache
 
 
 class TestMemoryTools:
@@ -43,8 +70,8 @@ class TestMemoryTools:
             mock_get_model.return_value = mock_model
 
             # Mock empty search results
-            mock_client.search.return_value = []
-            mock_model.encode.return_value.tolist.return_value = [0.1, 0.2, 0.3]
+            mock_client.query_points.return_value.points = []
+            mock_model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
 
             result = query_my_memory("test query")
             assert "I found no memories matching that query" in result
@@ -69,14 +96,296 @@ class TestMemoryTools:
                 "source_file": "test.json",
                 "content": "Test memory content",
             }
-            mock_client.search.return_value = [mock_result]
-            mock_model.encode.return_value.tolist.return_value = [0.1, 0.2, 0.3]
+            mock_client.query_points.return_value.points = [mock_result]
+            mock_model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
 
             result = query_my_memory("test query")
             assert "I found the following relevant memories" in result
             assert "Test memory content" in result
             assert "Score: 0.9500" in result
 
+    def test_query_my_memory_with_slim_payloads(self):
+        """Test that text missing from the payload comes from the content store."""
+        with (
+            patch("memory_tools._get_client") as mock_get_client,
+            patch("memory_tools._get_model") as mock_get_model,
+            patch("memory_tools._get_content_store") as mock_get_store,
+        ):
+            mock_client = Mock()
+            mock_get_client.return_value = mock_client
+            mock_get_model.return_value.encode.return_value = np.array([[0.1]])
+            mock_get_store.return_value.get_many.return_value = {
+                "p1": "Sidecar content"
+            }
+
+            mock_result = Mock()
+            mock_result.id = "p1"
+            mock_result.score = 0.9
+            mock_result.payload = {"timestamp": "t", "source_file": "test.json"}
+            mock_client.query_points.return_value.points = [mock_result]
+
+            result = query_my_memory("test query")
+            assert "Content: Sidecar content" in result
+            mock_get_store.return_value.get_many.assert_called_once_with(["p1"])
+
+    def test_repeat_query_skips_the_model(self, query_cache, result_cache):
+        """Test that a repeated query is answered from the query cache."""
+        with (
+            patch("memory_tools._get_client") as mock_get_client,
+            patch("memory_tools._get_model") as mock_get_model,
+        ):
+            mock_get_client.return_value.query_points.return_value.points = []
+            mock_model = mock_get_model.return_value
+            mock_model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+
+            query_my_memory("What did we decide?")
+            result_cache.generation.bump()  # Search again, but embed once
+            query_my_memory("  what did we   decide? ")
+
+            mock_model.encode.assert_called_once()
+            assert query_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+            second = mock_get_client.return_value.query_points.call_args_list[1]
+            assert second.kwargs["query"] == pytest.approx([0.1, 0.2, 0.3])
+
+    def test_repeat_search_is_cached_until_next_ingest(self, result_cache):
+        """Test that results are reused until the ingest generation changes."""
+        with (
+            patch("memory_tools._get_client") as mock_get_client,
+            patch("memory_tools._get_model") as mock_get_model,
+        ):
+            mock_client = mock_get_client.return_value
+            mock_get_model.return_value.encode.return_value = np.array([[0.1]])
+            mock_result = Mock()
+            mock_result.id = "p1"
+            mock_result.score = 0.9
+            mock_result.payload = {"content": "First", "source_file": "a.json"}
+            mock_client.query_points.return_value.points = [mock_result]
+
+            first = query_my_memory("test query")
+            assert query_my_memory("Test  query") == first
+            assert mock_client.query_points.call_count == 1
+            # A different limit is a different search.
+            memory_tools.search_memories("test query", limit=5)
+            assert mock_client.query_points.call_count == 2
+
+            result_cache.generation.bump()
+            mock_result.payload = {"content": "Second", "source_file": "a.json"}
+
+            assert "Content: Second" in query_my_memory("test query")
+            assert mock_client.query_points.call_count == 3
+            assert result_cache.stats()["invalidations"] == 1
+
+    def test_search_memories_batch_encodes_and_searches_once(self, result_cache):
+        """Test that a batch is embedded in one call and searched in one request."""
+        with (
+            patch("memory_tools._get_client") as mock_get_client,
+            patch("memory_tools._get_model") as mock_get_model,
+        ):
+            mock_client = mock_get_client.return_value
+            mock_model = mock_get_model.return_value
+            mock_model.encode.return_value = np.array([[0.1, 0.2], [0.3, 0.4]])
+
+            def hit(point_id, content):
+                result = Mock()
+                result.id = point_id
+                result.score = 0.9
+                result.payload = {"content": content, "source_file": "a.json"}
+                return result
+
+            mock_client.query_batch_points.return_value = [
+                Mock(points=[hit("p1", "First")]),
+                Mock(points=[hit("p2", "Second")]),
+            ]
+
+            results = memory_tools.search_memories_batch(
+                ["first query", "second query", "First  query"], limit=2
+            )
+
+            assert [[m["content"] for m in r] for r in results] == [
+                ["First"],
+                ["Second"],
+                ["First"],
+            ]
+            mock_model.encode.assert_called_once()
+            assert mock_model.encode.call_args.args[0] == [
+                "first query",
+                "second query",
+            ]
+            mock_client.query_batch_points.assert_called_once()
+            requests = mock_client.query_batch_points.call_args.kwargs["requests"]
+            assert [r.limit for r in requests] == [2, 2]
+            assert requests[1].query == pytest.approx([0.3, 0.4])
+
+            # Cached per query: a repeat only searches for the new one.
+            mock_model.encode.return_value = np.array([[0.5, 0.6]])
+            mock_client.query_batch_points.return_value = [
+                Mock(points=[hit("p3", "Third")])
+            ]
+            results = memory_tools.search_memories_batch(
+                ["second query", "third query"], limit=2
+            )
+            assert [[m["content"] for m in r] for r in results] == [
+                ["Second"],
+                ["Third"],
+            ]
+            requests = mock_client.query_batch_points.call_args.kwargs["requests"]
+            assert len(requests) == 1
+
+    def test_search_memories_batch_all_cached(self, result_cache):
+        """Test that a fully cached batch touches neither the model nor Qdrant."""
+        with (
+            patch("memory_tools._get_client") as mock_get_client,
+            patch("memory_tools._get_model") as mock_get_model,
+        ):
+            mock_get_model.return_value.encode.return_value = np.array([[0.1]])
+            mock_get_client.return_value.query_batch_points.return_value = [
+                Mock(points=[])
+            ]
+            memory_tools.search_memories_batch(["test query"])
+            assert memory_tools.search_memories_batch(["test query"]) == [[]]
+            mock_get_model.return_value.encode.assert_called_once()
+            mock_get_client.return_value.query_batch_points.assert_called_once()
+
+    def test_search_filter(self):
+        """Test that query filters become a Qdrant payload filter."""
+        assert memory_tools.search_filter(None) is None
+        assert memory_tools.search_filter({"source_file": None}) is None
+
+        query_filter = memory_tools.search_filter(
+            {
+                "since": "2024-01-01T00:00:00Z",
+                "until": 1706745600,
+                "source_file": "session-1.json",
+                "event_type": "user",
+            }
+        )
+        conditions = {c.key: c for c in query_filter.must}
+        assert conditions["source_file"].match.value == "session-1.json"
+        assert conditions["event_type"].match.value == "user"
+        assert "commit_id" not in conditions
+        assert conditions["timestamp_epoch"].range.gte == 1704067200.0
+        assert conditions["timestamp_epoch"].range.lte == 1706745600.0
+
+    def test_invalid_filters_and_limits(self):
+        """Test that bad filters and limits are rejected."""
+        with pytest.raises(ValueError, match="since"):
+            memory_tools.clean_filters({"since": "last tuesday"})
+        with pytest.raises(ValueError, match="Unknown"):
+            memory_tools.clean_filters({"author": "me"})
+        for limit in (0, 1000, "many", None, True):
+            with pytest.raises(ValueError):
+                memory_tools.check_limit(limit)
+        assert memory_tools.check_limit("5") == 5
+
+        with patch("memory_tools._get_client") as mock_get_client:
+            result = query_my_memory("test query", until="someday")
+            assert "Invalid 'until' date" in result
+            result = query_my_memory("test query", limit=0)
+            assert "'limit' must be between" in result
+            mock_get_client.assert_not_called()
+
+    def test_query_my_memory_passes_limit_and_filter(self, result_cache):
+        """Test that the limit and filters go to Qdrant and into the cache key."""
+        with (
+            patch("memory_tools._get_client") as mock_get_client,
+            patch("memory_tools._get_model") as mock_get_model,
+        ):
+            mock_client = mock_get_client.return_value
+            mock_client.query_points.return_value.points = []
+            mock_get_model.return_value.encode.return_value = np.array([[0.1]])
+
+            query_my_memory("test query", limit=7, commit_id="abc123")
+            kwargs = mock_client.query_points.call_args.kwargs
+            assert kwargs["limit"] == 7
+            condition = kwargs["query_filter"].must[0]
+            assert (condition.key, condition.match.value) == ("commit_id", "abc123")
+
+            query_my_memory("test query", limit=7, commit_id="abc123")
+            assert mock_client.query_points.call_count == 1
+            query_my_memory("test query", limit=7, commit_id="def456")
+            assert mock_client.query_points.call_count == 2
+
+    def test_search_memories_batch_passes_filter(self, result_cache):
+        """Test that batch filters reach every request and the cache key."""
+        with (
+            patch("memory_tools._get_client") as mock_get_client,
+            patch("memory_tools._get_model") as mock_get_model,
+        ):
+            mock_client = mock_get_client.return_value
+            mock_get_model.return_value.encode.return_value = np.array([[0.1], [0.2]])
+            mock_client.query_batch_points.return_value = [
+                Mock(points=[]),
+                Mock(points=[]),
+            ]
+
+            memory_tools.search_memories_batch(
+                ["first query", "second query"], filters={"source_file": "f3.json"}
+            )
+            requests = mock_client.query_batch_points.call_args.kwargs["requests"]
+            for request in requests:
+                condition = request.filter.must[0]
+                assert (condition.key, condition.match.value) == (
+                    "source_file",
+                    "f3.json",
+                )
+
+            # The unfiltered search is not answered from the filtered results.
+            mock_client.query_points.return_value.points = []
+            memory_tools.search_memories("first query")
+            mock_client.query_points.assert_called_once()
+            assert mock_client.query_points.call_args.kwargs["query_filter"] is None
+
+    def test_filters_are_applied_by_qdrant(self):
+        """Test the filters against a local Qdrant collection."""
+        client = QdrantClient(":memory:")
+        client.create_collection(
+            memory_tools.COLLECTION_NAME,
+            vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+        )
+        points = [
+            (1, "2024-01-10T00:00:00Z", "a.json", "user"),
+            (2, "2024-02-10T00:00:00Z", "a.json", "model"),
+            (3, "2024-03-10T00:00:00Z", "b.json", "user"),
+        ]
+        client.upsert(
+            memory_tools.COLLECTION_NAME,
+            [
+                models.PointStruct(
+                    id=point_id,
+                    vector=[1.0, 0.1 * point_id],
+                    payload=with_timestamp_epoch(
+                        {
+                            "content": f"Memory {point_id}",
+                            "timestamp": timestamp,
+                            "source_file": source_file,
+                            "event_type": event_type,
+                        }
+                    ),
+                )
+                for point_id, timestamp, source_file, event_type in points
+            ],
+        )
+        with (
+            patch("memory_tools._get_client", return_value=client),
+            patch("memory_tools._get_model") as mock_get_model,
+        ):
+            mock_get_model.return_value.encode.return_value = np.array([[1.0, 0.0]])
+
+            def ids(**filters):
+                memories = memory_tools.search_memories("q", limit=10, filters=filters)
+                return sorted(int(m["id"]) for m in memories)
+
+            assert ids() == [1, 2, 3]
+            assert ids(source_file="a.json") == [1, 2]
+            assert ids(event_type="user", since="2024-02-01") == [3]
+            assert ids(since="2024-01-10T00:00:00Z", until="2024-02-10") == [1, 2]
+            batch = memory_tools.search_memories_batch(
+                ["q2"], limit=10, filters={"source_file": "b.json"}
+            )
+            assert [int(m["id"]) for m in batch[0]] == [3]
+            assert len(memory_tools.search_memories("q", limit=1)) == 1
+            assert len(memory_tools.search_memories("q", limit=2)) == 2
+
     def test_query_my_memory_exception_handling(self):
         """Test that exceptions are properly handled."""
         with patch("memory_tools._get_client") as mock_get_client:
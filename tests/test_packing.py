@@ -0,0 +1,76 @@
+"""
+Tests for packing.py
+"""
+
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import chunking
+from packing import join_pack, pack_messages, packed_message_refs
+
+
+@pytest.fixture(autouse=True)
+def char_chunking(monkeypatch):
+    """Budgets in characters: a chunk holds 800, a short message at most 200."""
+    monkeypatch.setattr(chunking, "CHUNK_MODE", "chars")
+
+
+def _groups(messages):
+    return [[item for _, item in group] for group in pack_messages(messages)]
+
+
+class TestPackMessages:
+    """Test grouping of consecutive short messages."""
+
+    def test_short_messages_are_packed(self):
+        messages = [("s1", "ok", 0), ("s1", "thanks", 1), ("s1", "sure", 2)]
+        assert _groups(messages) == [[0, 1, 2]]
+
+    def test_long_message_breaks_the_run(self):
+        long_text = "x" * 500
+        messages = [
+            ("s1", "ok", 0),
+            ("s1", "yes", 1),
+            ("s1", long_text, 2),
+            ("s1", "done", 3),
+        ]
+        assert _groups(messages) == [[0, 1], [2], [3]]
+
+    def test_sessions_are_not_mixed(self):
+        messages = [("s1", "a", 0), ("s1", "b", 1), ("s2", "c", 2), ("s2", "d", 3)]
+        assert _groups(messages) == [[0, 1], [2, 3]]
+
+    def test_pack_respects_the_budget(self):
+        messages = [("s1", "y" * 150, i) for i in range(12)]
+        groups = list(pack_messages(messages))
+
+        assert [len(g) for g in groups] == [5, 5, 2]
+        for group in groups:
+            content, _ = join_pack([text for text, _ in group])
+            assert len(chunking.chunk_text(content)) == 1
+
+    def test_empty_input(self):
+        assert list(pack_messages([])) == []
+
+
+class TestJoinPack:
+    """Test pack content and offsets."""
+
+    def test_offsets_resolve_to_the_messages(self):
+        texts = ["ok", "thanks!", "see you"]
+        content, offsets = join_pack(texts)
+
+        assert content == "ok\nthanks!\nsee you"
+        assert [content[start:end] for start, end in offsets] == texts
+
+    def test_packed_message_refs(self):
+        refs = packed_message_refs(["a", "b"], ["t1", "t2"], [(0, 2), (3, 5)])
+        assert refs == [
+            {"message_id": "a", "timestamp": "t1", "start": 0, "end": 2},
+            {"message_id": "b", "timestamp": "t2", "start": 3, "end": 5},
+        ]
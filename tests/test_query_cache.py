@@ -0,0 +1,129 @@
+"""
+Tests for query_cache.py
+"""
+
+import pytest
+import tempfile
+import threading
+import numpy as np
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ingest_generation import IngestGeneration
+from query_cache import QueryEmbeddingCache, ResultCache, query_key, result_key
+
+
+def _fake_model():
+    """A model that encodes a text as [len(text), 1]."""
+    model = Mock()
+    model.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[len(t), 1.0] for t in texts], dtype=np.float32
+    )
+    return model
+
+
+class TestQueryEmbeddingCache:
+    """Test the LRU cache of query vectors."""
+
+    def test_query_key_normalizes(self):
+        assert query_key("  Hello   World\n") == query_key("hello world")
+
+    def test_only_misses_are_encoded_in_one_call(self):
+        cache = QueryEmbeddingCache("model-a")
+        model = _fake_model()
+        cache.encode(model, ["a"])
+
+        vectors = cache.encode(model, ["a", "bb", "BB", "ccc"])
+
+        assert vectors[:, 0].tolist() == [1.0, 2.0, 2.0, 3.0]
+        assert model.encode.call_count == 2
+        assert model.encode.call_args.args[0] == ["bb", "ccc"]
+        assert cache.hits == 1
+
+    def test_least_recently_used_is_evicted(self):
+        cache = QueryEmbeddingCache("model-a", max_entries=2)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        cache.get("a")
+        cache.put("c", [3.0])
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert len(cache) == 2
+
+    def test_persisted_across_restarts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = str(Path(temp_dir) / "query_cache.npz")
+            cache = QueryEmbeddingCache("model-a", path, save_every=2)
+            cache.put("first", [1.0, 2.0])
+            assert not Path(path).exists()
+            cache.put("second", [3.0, 4.0])  # Saved after two new entries
+
+            reopened = QueryEmbeddingCache("model-a", path, max_entries=1)
+            assert reopened.get("first") is None  # Oldest entry dropped on load
+            assert reopened.get("second").tolist() == [3.0, 4.0]
+            # Vectors of another model are not used.
+            assert len(QueryEmbeddingCache("model-b", path)) == 0
+
+    def test_unreadable_file_is_ignored(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "query_cache.npz"
+            path.write_bytes(b"not a cache")
+            assert len(QueryEmbeddingCache("model-a", str(path))) == 0
+
+
+class TestResultCache:
+    """Test the search result cache and its invalidation."""
+
+    @pytest.fixture
+    def generation(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield IngestGeneration(str(Path(temp_dir) / "ingest_generation"))
+
+    def test_results_are_dropped_when_generation_changes(self, generation):
+        cache = ResultCache(generation)
+        key = result_key("Query", 3, {"commit_id": "c1"})
+        assert cache.get(key) == (None, 0)
+        cache.put(key, ["hit"], 0)
+
+        assert cache.get(result_key(" query ", 3, {"commit_id": "c1"}))[0] == ["hit"]
+        assert cache.get(result_key("query", 3))[0] is None
+
+        generation.bump()
+        assert cache.get(key) == (None, 1)
+        assert cache.stats()["invalidations"] == 1
+
+    def test_results_of_an_older_generation_are_not_stored(self, generation):
+        cache = ResultCache(generation)
+        key = result_key("query", 3)
+        _, seen = cache.get(key)
+        generation.bump()  # An ingest lands while the search runs
+        cache.get(result_key("other", 3))
+
+        cache.put(key, ["stale"], seen)
+
+        assert cache.get(key)[0] is None
+
+
+class TestIngestGeneration:
+    """Test the shared ingest generation counter."""
+
+    def test_concurrent_bumps_are_not_lost(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            generation = IngestGeneration(str(Path(temp_dir) / "ingest_generation"))
+            assert generation.current() == 0
+            threads = [
+                threading.Thread(target=lambda: [generation.bump() for _ in range(10)])
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert generation.current() == 40
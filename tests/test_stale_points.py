@@ -0,0 +1,109 @@
+"""
+Tests for stale_points.py
+"""
+
+import pytest
+import tempfile
+from pathlib import Path
+from qdrant_client import QdrantClient, models
+
+# Add the parent directory to the path so we can import our modules
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from content_store import ContentStore
+from dedup import DedupIndex
+from stale_points import StalePointCleaner, with_source_version
+
+COLLECTION = "codex_history"
+
+
+def _point(point_id: int, **payload) -> models.PointStruct:
+    return models.PointStruct(id=point_id, vector=[1.0, 0.0, 0.0], payload=payload)
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        COLLECTION,
+        vectors_config=models.VectorParams(size=3, distance=models.Distance.COSINE),
+    )
+    client.upsert(
+        COLLECTION,
+        [
+            _point(1, source_relpath="c1/chats/s.json", source_version="v1"),
+            _point(2, source_relpath="c1/chats/s.json", source_version="v2"),
+            _point(3, source_relpath="c1/chats/other.json", source_version="v1"),
+            # Ingested before source_relpath existed
+            _point(4, source_file="s.json", commit_id="c1"),
+            _point(5, source_file="s.json", commit_id="c2"),
+            _point(6, source_file="logs.json", commit_id="unknown"),
+        ],
+    )
+    yield client
+    client.close()
+
+
+def _ids(client) -> list:
+    points, _ = client.scroll(COLLECTION, limit=100)
+    return sorted(p.id for p in points)
+
+
+class TestStalePointCleaner:
+    """Test deletion of superseded and deleted files' points."""
+
+    def test_superseded_versions_are_deleted(self, client):
+        cleaner = StalePointCleaner(client, COLLECTION)
+
+        deleted = cleaner.delete_superseded("c1/chats/s.json", "v2", "s.json", "c1")
+
+        assert deleted == 2
+        assert _ids(client) == [2, 3, 5, 6]
+
+    def test_deleted_file_loses_every_point(self, client):
+        cleaner = StalePointCleaner(client, COLLECTION)
+
+        assert cleaner.delete_file("c1/chats/s.json", "s.json", "c1") == 3
+        assert _ids(client) == [3, 5, 6]
+
+    def test_unknown_commit_matches_no_legacy_points(self, client):
+        cleaner = StalePointCleaner(client, COLLECTION)
+
+        assert cleaner.delete_file("logs.json", "logs.json", "unknown") == 0
+        assert _ids(client) == [1, 2, 3, 4, 5, 6]
+
+    def test_local_stores_are_cleaned_up(self, client):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = ContentStore(str(Path(temp_dir) / "content.db"))
+            store.put_many([("1", "old"), ("2", "new")])
+            dedup = DedupIndex(str(Path(temp_dir) / "dedup.db"))
+            list(dedup.filter([{"id": "1", "payload": {"content": "old"}}]))
+            cleaner = StalePointCleaner(client, COLLECTION, store, dedup)
+
+            cleaner.delete_superseded("c1/chats/s.json", "v2", "s.json")
+
+            assert store.get_many(["1", "2"]) == {"2": "new"}
+            assert len(dedup) == 0
+            assert cleaner.deleted == 1
+
+    def test_points_standing_in_for_duplicates_are_kept(self, client):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dedup = DedupIndex(str(Path(temp_dir) / "dedup.db"))
+            records = [
+                {"id": "1", "payload": {"content": "shared text"}},
+                {"id": "copy", "payload": {"content": "shared text"}},
+            ]
+            list(dedup.filter(records))
+            cleaner = StalePointCleaner(client, COLLECTION, dedup=dedup)
+
+            cleaner.delete_superseded("c1/chats/s.json", "v2", "s.json")
+
+            assert _ids(client) == [1, 2, 3, 4, 5, 6]
+
+
+def test_with_source_version():
+    records = [{"id": "a", "payload": {}}, {"id": "b", "payload": {}}]
+    stamped = list(with_source_version(records, "sha"))
+    assert [r["payload"]["source_version"] for r in stamped] == ["sha", "sha"]
@@ -12,7 +12,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import the Flask app
-from universal_api_server import app
+from universal_api_server import app, query_memory_batch
 
 
 class TestUniversalAPIServer:
@@ -79,6 +79,62 @@ class TestUniversalAPIServer:
         assert data["result"] == "POST memory result"
         assert data["limit_used"] == 5
 
+    @patch("universal_api_server.query_my_memory")
+    def test_query_memory_post_limit_and_filters(self, mock_query):
+        """Test the limit and filters of a POST query reach the search."""
+        mock_query.return_value = "Filtered result"
+
+        payload = {
+            "query": "test post query",
+            "limit": 8,
+            "since": "2024-01-01",
+            "source_file": "session-1.json",
+            "commit_id": None,
+        }
+        response = self.client.post(
+            "/query", data=json.dumps(payload), content_type="application/json"
+        )
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        mock_query.assert_called_once_with(
+            "test post query", 8, since="2024-01-01", source_file="session-1.json"
+        )
+        assert data["limit_used"] == 8
+        assert data["filters"] == {
+            "since": "2024-01-01",
+            "source_file": "session-1.json",
+        }
+
+    @patch("universal_api_server.query_my_memory")
+    def test_query_memory_invalid_options(self, mock_query):
+        """Test invalid limits and filters are rejected before searching."""
+        for payload in (
+            {"query": "q", "limit": 0},
+            {"query": "q", "limit": "lots"},
+            {"query": "q", "until": "not a date"},
+        ):
+            response = self.client.post(
+                "/query", data=json.dumps(payload), content_type="application/json"
+            )
+            assert response.status_code == 400
+            assert "error" in json.loads(response.data)
+
+        response = self.client.get("/query?q=test&limit=500")
+        assert response.status_code == 400
+        mock_query.assert_not_called()
+
+    @patch("universal_api_server.query_my_memory")
+    def test_query_memory_get_limit_and_filters(self, mock_query):
+        """Test GET queries take the limit and filters as parameters."""
+        mock_query.return_value = "Filtered result"
+
+        response = self.client.get("/query?q=test+query&limit=2&event_type=user")
+        assert response.status_code == 200
+
+        mock_query.assert_called_once_with("test query", 2, event_type="user")
+        assert json.loads(response.data)["limit_used"] == 2
+
     def test_query_memory_post_empty_body(self):
         """Test POST query with empty body."""
         response = self.client.post(
@@ -97,9 +153,66 @@ class TestUniversalAPIServer:
         )
         assert response.status_code == 400
 
+    @patch("universal_api_server.search_memories_batch")
+    def test_query_memory_batch_post_success(self, mock_search):
+        """Test a batch query returns the memories of each query."""
+        mock_search.return_value = [[{"content": "First"}], []]
+
+        payload = {"queries": ["first query", " second query "], "limit": 4}
+        response = self.client.post(
+            "/query/batch", data=json.dumps(payload), content_type="application/json"
+        )
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        mock_search.assert_called_once_with(["first query", "second query"], 4, {})
+        assert data["results"] == [
+            {"query": "first query", "memories": [{"content": "First"}]},
+            {"query": "second query", "memories": []},
+        ]
+        assert data["limit_used"] == 4
+
+    @patch("universal_api_server.search_memories_batch")
+    def test_query_memory_batch_post_invalid(self, mock_search):
+        """Test invalid batch queries are rejected before searching."""
+        for payload in (
+            {},
+            {"queries": []},
+            {"queries": "not a list"},
+            {"queries": ["ok", "  "]},
+            {"queries": ["ok"] * 100},
+            {"queries": ["ok"], "limit": 0},
+        ):
+            response = self.client.post(
+                "/query/batch",
+                data=json.dumps(payload),
+                content_type="application/json",
+            )
+            assert response.status_code == 400
+            assert "error" in json.loads(response.data)
+        mock_search.assert_not_called()
+
+    @patch("universal_api_server.search_memories_batch")
+    def test_query_memory_batch_tool(self, mock_search):
+        """Test the MCP batch tool returns structured results."""
+        mock_search.return_value = [[{"content": "First"}]]
+
+        result = query_memory_batch(["first query"], limit=2)
+        assert result == {
+            "results": [{"query": "first query", "memories": [{"content": "First"}]}]
+        }
+        mock_search.assert_called_once_with(["first query"], 2, {})
+
+        assert "error" in query_memory_batch([])
+
+    @patch("universal_api_server.query_cache_stats")
     @patch("universal_api_server.get_data_processor")
-    def test_stats_success(self, mock_get_processor):
+    def test_stats_success(self, mock_get_processor, mock_cache_stats):
         """Test successful stats endpoint."""
+        mock_cache_stats.return_value = {
+            "embeddings": {"hits": 3, "misses": 1, "size": 1},
+            "results": {"hits": 2, "misses": 2, "invalidations": 0, "size": 2},
+        }
         # Mock the processor and dataframe
         mock_processor = MagicMock()
         mock_df = MagicMock()
@@ -118,6 +231,8 @@ class TestUniversalAPIServer:
         assert "memory_stats" in data
         assert data["memory_stats"]["total_messages"] == 100
         assert data["memory_stats"]["total_sessions"] == 5
+        assert data["query_cache"]["embeddings"]["hits"] == 3
+        assert data["query_cache"]["results"]["hits"] == 2
 
     @patch("universal_api_server.get_data_processor")
     def test_sources_success(self, mock_get_processor):
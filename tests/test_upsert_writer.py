@@ -0,0 +1,237 @@
+"""
+Tests for upsert_writer.py
+"""
+
+import pytest
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add the parent directory to the path so we can import our modules
+import sys
+import tempfile
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dead_letter import DeadLetterQueue
+from upsert_writer import AdaptiveBatchSizer, UpsertWriter, is_retryable, point_bytes
+
+
+def _points(n, start=0):
+    return [
+        {"id": i, "vector": [0.1, 0.2], "payload": {"content": f"c{i}"}}
+        for i in range(start, start + n)
+    ]
+
+
+class TestUpsertWriter:
+    """Test cases for UpsertWriter."""
+
+    def test_only_last_batch_waits(self):
+        client = Mock()
+        with UpsertWriter(client, "codex_history") as writer:
+            writer.submit(_points(2))
+            writer.submit(_points(2, start=2))
+            writer.submit(_points(1, start=4))
+
+        waits = [c.kwargs["wait"] for c in client.upsert.call_args_list]
+        assert sorted(waits) == [False, False, True]
+        # The barrier is sent last, after everything else was acknowledged.
+        assert client.upsert.call_args_list[-1].kwargs["wait"] is True
+        assert writer.points_written == 5
+        assert writer.batches_written == 3
+
+    def test_empty_writer_sends_nothing(self):
+        client = Mock()
+        with UpsertWriter(client, "codex_history"):
+            pass
+        client.upsert.assert_not_called()
+
+    def test_in_flight_is_bounded(self):
+        release = threading.Event()
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_upsert(**kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            release.wait(timeout=5)
+            with lock:
+                active[0] -= 1
+
+        client = Mock()
+        client.upsert.side_effect = slow_upsert
+        writer = UpsertWriter(client, "codex_history", max_in_flight=2)
+
+        submitter = threading.Thread(
+            target=lambda: [writer.submit(_points(1, start=i)) for i in range(6)]
+        )
+        submitter.start()
+        time.sleep(0.2)
+        # Two batches in flight, one held back: the submitter must be blocked.
+        assert submitter.is_alive()
+        assert writer.in_flight == 2
+
+        release.set()
+        submitter.join(timeout=5)
+        writer.close()
+        assert peak[0] == 2
+        assert client.upsert.call_count == 6
+
+    def test_error_is_raised(self):
+        client = Mock()
+        client.upsert.side_effect = RuntimeError("qdrant down")
+        writer = UpsertWriter(client, "codex_history")
+        writer.submit(_points(1))
+        writer.submit(_points(1, start=1))
+
+        with pytest.raises(RuntimeError, match="qdrant down"):
+            writer.close()
+
+    def test_on_error_swallows_failures(self):
+        client = Mock()
+        client.upsert.side_effect = [RuntimeError("boom"), None]
+        failed, committed = [], []
+
+        with UpsertWriter(
+            client,
+            "codex_history",
+            max_in_flight=1,
+            on_commit=committed.append,
+            on_error=lambda batch, e: failed.append((batch, e)),
+        ) as writer:
+            writer.submit(_points(1))
+            writer.submit(_points(1, start=1))
+
+        assert len(failed) == 1 and str(failed[0][1]) == "boom"
+        assert [p["id"] for batch in committed for p in batch] == [1]
+
+    def test_accepted_batches_bump_the_generation(self):
+        client, generation = Mock(), Mock()
+        client.upsert.side_effect = [None, RuntimeError("rejected")]
+        writer = UpsertWriter(
+            client, "codex_history", on_error=Mock(), generation=generation
+        )
+        writer.submit(_points(2))
+        writer.submit(_points(2, start=2))
+        writer.close()
+
+        generation.bump.assert_called_once()
+
+    def test_failed_batch_is_retried(self):
+        client = Mock()
+        client.upsert.side_effect = [
+            RuntimeError("timeout"),
+            RuntimeError("timeout"),
+            None,
+        ]
+
+        with UpsertWriter(client, "codex_history", retries=3, backoff=0) as writer:
+            writer.submit(_points(2))
+
+        assert client.upsert.call_count == 3
+        assert writer.points_written == 2
+
+    def test_client_errors_are_not_retried(self):
+        error = RuntimeError("bad vector size")
+        error.status_code = 400
+        assert not is_retryable(error)
+        error.status_code = 429
+        assert is_retryable(error)
+        assert is_retryable(ConnectionError("refused"))
+
+        client = Mock()
+        client.upsert.side_effect = RuntimeError("bad vector size")
+        client.upsert.side_effect.status_code = 400
+        writer = UpsertWriter(client, "codex_history", retries=3, backoff=0)
+        writer.submit(_points(1))
+        with pytest.raises(RuntimeError, match="bad vector size"):
+            writer.close()
+        assert client.upsert.call_count == 1
+
+    def test_exhausted_batch_goes_to_dead_letter(self):
+        client = Mock()
+        client.upsert.side_effect = [RuntimeError("down")] * 3 + [None]
+        dead, committed = [], []
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            queue = DeadLetterQueue(str(Path(temp_dir) / "dead_letter.db"))
+            with UpsertWriter(
+                client,
+                "codex_history",
+                max_in_flight=1,
+                on_commit=committed.append,
+                retries=2,
+                backoff=0,
+                dead_letter=queue,
+                on_dead_letter=lambda batch, e: dead.append(batch),
+            ) as writer:
+                writer.submit(_points(2))
+                writer.submit(_points(1, start=2))
+
+            assert [p["id"] for p in dead[0]] == [0, 1]
+            assert [p["id"] for batch in committed for p in batch] == [2]
+            assert writer.points_dead_lettered == 2
+            assert len(queue) == 1
+
+
+class TestAdaptiveBatchSizer:
+    """Test adaptive upsert batch sizing."""
+
+    def test_cut_respects_size_and_bytes(self):
+        points = _points(10)
+        one = point_bytes(points[0])
+        sizer = AdaptiveBatchSizer(
+            target_bytes=10 * one, min_points=1, initial_points=4
+        )
+        assert sizer.cut(points) == (4, 4 * one)
+
+        sizer = AdaptiveBatchSizer(target_bytes=3 * one, min_points=1, initial_points=8)
+        assert sizer.cut(points)[0] == 3
+        # A point larger than the budget still goes out, on its own.
+        sizer = AdaptiveBatchSizer(target_bytes=1, min_points=1)
+        assert sizer.cut(points)[0] == 1
+
+    def test_size_follows_latency(self):
+        sizer = AdaptiveBatchSizer(
+            target_bytes=10**9, target_latency=1.0, initial_points=100
+        )
+        # 100 points of 1 KB in 0.1s: ten times faster than the target.
+        sizer.record(100, 100 * 1024, 0.0, 0.1)
+        assert sizer.size == 200  # At most doubled per measurement
+        for _ in range(10):
+            sizer.record(sizer.size, sizer.size * 1024, 0.0, sizer.size / 1000)
+        assert 900 <= sizer.size <= 1100
+
+        # Qdrant slows down tenfold.
+        for _ in range(10):
+            sizer.record(sizer.size, sizer.size * 1024, 0.0, sizer.size / 100)
+        assert 80 <= sizer.size <= 120
+
+    def test_size_follows_byte_budget(self):
+        sizer = AdaptiveBatchSizer(target_bytes=64 * 1024, initial_points=256)
+        for _ in range(5):
+            sizer.record(sizer.size, sizer.size * 1024, 0.0, 0.001)
+        assert sizer.size == 64
+
+    def test_writer_cuts_batches(self):
+        client = Mock()
+        sizer = AdaptiveBatchSizer(min_points=1, initial_points=4)
+
+        with UpsertWriter(client, "codex_history", batch_sizer=sizer) as writer:
+            writer.submit(_points(10))
+            # Two full batches were cut; the last two points wait for more.
+            assert len(writer._buffer) == 2
+            writer.submit(_points(3, start=10))
+
+        sent = [p.id for c in client.upsert.call_args_list for p in c.kwargs["points"]]
+        assert sorted(sent) == list(range(13))
+        assert all(len(c.kwargs["points"]) <= 8 for c in client.upsert.call_args_list)
+        assert client.upsert.call_args_list[-1].kwargs["wait"] is True
+        assert writer.points_written == 13
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -4,11 +4,20 @@ Universal Memory API Server - REST API + MCP for any LLM
 
 from flask import Flask, request, jsonify
 from mcp.server.fastmcp import FastMCP
-from memory_tools import query_my_memory
+from memory_tools import (
+    DEFAULT_LIMIT,
+    FILTER_KEYS,
+    MAX_BATCH_QUERIES,
+    check_limit,
+    clean_filters,
+    query_cache_stats,
+    query_my_memory,
+    search_memories_batch,
+)
 from data_processor import ConversationDataProcessor, get_data_statistics
 import logging
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 from pathlib import Path
 
@@ -42,6 +51,16 @@ def get_data_processor() -> ConversationDataProcessor:
     return data_processor
 
 
+def parse_query_options(data) -> Tuple[int, Dict[str, Any]]:
+    """
+    Reads the limit and filters of a query request (a JSON body or query
+    string); raises ValueError if they are invalid.
+    """
+    limit = check_limit(data.get("limit", DEFAULT_LIMIT))
+    filters = clean_filters({name: data.get(name) for name in FILTER_KEYS})
+    return limit, filters
+
+
 # --- REST API Endpoints ---
 
 
@@ -65,8 +84,21 @@ def query_memory_get():
         ), 400
 
     try:
-        result = query_my_memory(query)
-        return jsonify({"query": query, "result": result, "source": "vector_database"})
+        limit, filters = parse_query_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e), "query": query}), 400
+
+    try:
+        result = query_my_memory(query, limit, **filters)
+        return jsonify(
+            {
+                "query": query,
+                "result": result,
+                "source": "vector_database",
+                "limit_used": limit,
+                "filters": filters,
+            }
+        )
     except Exception as e:
         logger.error(f"Query error: {e}")
         return jsonify({"error": f"Query failed: {str(e)}", "query": query}), 500
@@ -82,19 +114,29 @@ def query_memory_post():
             return jsonify(
                 {
                     "error": "JSON body with 'query' field is required",
-                    "usage": {"query": "your search query", "limit": 5},
+                    "usage": {
+                        "query": "your search query",
+                        "limit": 5,
+                        "since": "2024-01-01T00:00:00Z",
+                        "until": "2024-02-01T00:00:00Z",
+                        "source_file": "session-1.json",
+                        "commit_id": "abc123",
+                        "event_type": "user",
+                    },
                 }
             ), 400
 
         query = data["query"].strip()
-        limit = data.get("limit", 3)  # Allow custom limit
 
         if not query:
             return jsonify({"error": "Query cannot be empty"}), 400
 
-        # For now, we'll use the existing query function
-        # TODO: Implement custom limit in future
-        result = query_my_memory(query)
+        try:
+            limit, filters = parse_query_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        result = query_my_memory(query, limit, **filters)
 
         return jsonify(
             {
@@ -102,6 +144,7 @@ def query_memory_post():
                 "result": result,
                 "source": "vector_database",
                 "limit_used": limit,
+                "filters": filters,
             }
         )
 
@@ -110,6 +153,51 @@ def query_memory_post():
         return jsonify({"error": f"Query failed: {str(e)}"}), 500
 
 
+def parse_batch_queries(data) -> List[str]:
+    """Validates the queries of a batch request; raises ValueError if invalid."""
+    queries = data.get("queries") if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("JSON body with a non-empty 'queries' list is required")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per batch")
+    if not all(isinstance(q, str) and q.strip() for q in queries):
+        raise ValueError("Every query must be a non-empty string")
+    return [q.strip() for q in queries]
+
+
+@app.route("/query/batch", methods=["POST"])
+def query_memory_batch_post():
+    """Query memory for several queries in one request."""
+    data = request.get_json(silent=True)
+    try:
+        queries = parse_batch_queries(data)
+        limit, filters = parse_query_options(data)
+    except ValueError as e:
+        return jsonify(
+            {
+                "error": str(e),
+                "usage": {"queries": ["first query", "second query"], "limit": 3},
+            }
+        ), 400
+
+    try:
+        results = search_memories_batch(queries, limit, filters)
+        return jsonify(
+            {
+                "results": [
+                    {"query": query, "memories": memories}
+                    for query, memories in zip(queries, results)
+                ],
+                "source": "vector_database",
+                "limit_used": limit,
+                "filters": filters,
+            }
+        )
+    except Exception as e:
+        logger.error(f"Batch query error: {e}")
+        return jsonify({"error": f"Batch query failed: {str(e)}"}), 500
+
+
 @app.route("/stats", methods=["GET"])
 def get_stats():
     """Get memory statistics."""
@@ -133,6 +221,7 @@ def get_stats():
         return jsonify(
             {
                 "memory_stats": stats,
+                "query_cache": query_cache_stats(),
                 "service_info": {
                     "archive_path": str(processor.archive_path),
                     "api_version": "2.0",
@@ -192,12 +281,26 @@ mcp = FastMCP("PlugMemory")
 
 
 @mcp.tool()
-def query_memory(query: str) -> str:
+def query_memory(
+    query: str,
+    limit: int = DEFAULT_LIMIT,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    source_file: Optional[str] = None,
+    commit_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+) -> str:
     """
     Query the memory database for relevant information.
 
     Args:
         query: The search query to find relevant memories
+        limit: The number of memories to return
+        since: Only memories from this time on (ISO 8601)
+        until: Only memories up to this time (ISO 8601)
+        source_file: Only memories from this session file
+        commit_id: Only memories from this commit
+        event_type: Only memories of this event type
 
     Returns:
         Formatted string containing relevant memories and their scores
@@ -206,7 +309,15 @@ def query_memory(query: str) -> str:
         if not query or not query.strip():
             return "Error: Query cannot be empty. Please provide a search query."
 
-        result = query_my_memory(query.strip())
+        result = query_my_memory(
+            query.strip(),
+            limit,
+            since=since,
+            until=until,
+            source_file=source_file,
+            commit_id=commit_id,
+            event_type=event_type,
+        )
         return result
 
     except Exception as e:
@@ -214,6 +325,56 @@ def query_memory(query: str) -> str:
         return f"An error occurred while querying memory: {e}"
 
 
+@mcp.tool()
+def query_memory_batch(
+    queries: List[str],
+    limit: int = DEFAULT_LIMIT,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    source_file: Optional[str] = None,
+    commit_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Query the memory database for several queries at once.
+
+    Args:
+        queries: The search queries to find relevant memories for
+        limit: The number of memories to return per query
+        since: Only memories from this time on (ISO 8601)
+        until: Only memories up to this time (ISO 8601)
+        source_file: Only memories from this session file
+        commit_id: Only memories from this commit
+        event_type: Only memories of this event type
+
+    Returns:
+        The memories of each query, with their scores and sources
+    """
+    try:
+        queries = parse_batch_queries({"queries": queries})
+        limit, filters = parse_query_options(
+            {
+                "limit": limit,
+                "since": since,
+                "until": until,
+                "source_file": source_file,
+                "commit_id": commit_id,
+                "event_type": event_type,
+            }
+        )
+        results = search_memories_batch(queries, limit, filters)
+        return {
+            "results": [
+                {"query": query, "memories": memories}
+                for query, memories in zip(queries, results)
+            ]
+        }
+
+    except Exception as e:
+        logger.error(f"MCP batch query error: {e}")
+        return {"error": f"An error occurred while querying memory: {e}"}
+
+
 @mcp.tool()
 def get_memory_stats() -> str:
     """
@@ -274,14 +435,16 @@ if __name__ == "__main__":
     if args.mode in ["rest", "both"]:
         print("🌐 REST API available at: http://localhost:{args.port}")
         print("   GET  /health - Health check")
-        print("   GET  /query?q=search+query - Query memory")
+        print("   GET  /query?q=search+query&limit=5 - Query memory")
         print("   POST /query - Query memory (JSON)")
+        print("   POST /query/batch - Query memory for several queries (JSON)")
         print("   GET  /stats - Memory statistics")
         print("   GET  /sources - Data sources info")
 
     if args.mode in ["mcp", "both"]:
         print("🤖 MCP Server available for compatible LLMs")
         print("   Tool: query_memory(query) - Search memory")
+        print("   Tool: query_memory_batch(queries) - Search memory in one batch")
         print("   Tool: get_memory_stats() - Get statistics")
 
     if args.mode == "rest":
@@ -0,0 +1,444 @@
+"""
+Asynchronous Qdrant upsert writer shared by the ingestion scripts.
+
+Batches are sent with wait=False from a small thread pool, so ingestion is
+not capped by Qdrant's indexing latency. The number of requests in flight is
+bounded: submit() blocks when the limit is reached, which applies
+backpressure to whoever is producing embeddings. The most recent batch is
+held back and sent with wait=True on close(); Qdrant applies updates in
+order, so that final request acts as a consistency barrier for the run.
+
+A failed batch can be retried with exponential backoff. A batch that still
+fails can be handed to a dead-letter queue (see dead_letter.py), which keeps
+its vectors on disk so it can be replayed later without re-embedding.
+
+With an AdaptiveBatchSizer, the writer cuts the points it is given into
+batches itself: as large as a byte budget and a latency target allow, as
+measured from the most recent upserts, instead of one request per submit().
+"""
+
+import json
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import qdrant_client
+
+logger = logging.getLogger(__name__)
+
+UPSERT_MAX_IN_FLIGHT = 4  # Concurrent upsert requests before submit() blocks
+UPSERT_RETRIES = 4  # Retries of a failed batch before giving up on it
+UPSERT_BACKOFF_SECONDS = 0.5  # Delay before the first retry; doubles each time
+UPSERT_MAX_BACKOFF_SECONDS = 8.0
+UPSERT_TARGET_BYTES = 4 * 1024 * 1024  # Request body budget (Qdrant's limit is 32 MB)
+UPSERT_TARGET_LATENCY = 1.0  # Seconds an upsert request should take
+UPSERT_MIN_BATCH = 16  # Points per batch, however slow Qdrant is
+UPSERT_MAX_BATCH = 4096
+UPSERT_INITIAL_BATCH = 256
+VECTOR_VALUE_BYTES = 20  # A float as JSON text, e.g. "-0.03186894208192825,"
+
+
+def to_point_struct(point: Dict) -> qdrant_client.http.models.PointStruct:
+    """Converts an {"id", "vector", "payload"} point dict into a PointStruct."""
+    return qdrant_client.http.models.PointStruct(
+        id=point["id"], vector=point["vector"], payload=point["payload"]
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether an upsert error may go away on its own. Qdrant rejecting the
+    request itself (a 4xx other than 429 Too Many Requests) will not.
+    """
+    status = getattr(error, "status_code", None)
+    return not (status is not None and 400 <= status < 500 and status != 429)
+
+
+def upsert_with_retry(
+    client,
+    collection_name: str,
+    points: List[qdrant_client.http.models.PointStruct],
+    wait: bool,
+    retries: int = UPSERT_RETRIES,
+    backoff: float = UPSERT_BACKOFF_SECONDS,
+) -> None:
+    """Upserts `points`, retrying failures with exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            client.upsert(collection_name=collection_name, points=points, wait=wait)
+            return
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = min(backoff * 2**attempt, UPSERT_MAX_BACKOFF_SECONDS)
+            attempt += 1
+            logger.warning(
+                f"Upsert of {len(points)} points failed ({e}); "
+                f"retry {attempt}/{retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+
+def bump_generation(generation) -> None:
+    """Bumps the ingest generation; a failure is logged, not raised."""
+    try:
+        generation.bump()
+    except Exception as e:
+        logger.error(f"Could not bump the ingest generation: {e}")
+
+
+def point_bytes(point: Dict) -> int:
+    """Approximate size of a point in an upsert request body."""
+    return (
+        len(json.dumps(point["payload"], ensure_ascii=False, default=str))
+        + VECTOR_VALUE_BYTES * len(point["vector"])
+        + 64  # Id and JSON framing
+    )
+
+
+class AdaptiveBatchSizer:
+    """
+    Chooses how many points go into each upsert. Keeps moving averages of
+    the bytes per point and of the seconds per byte of recent upserts, and
+    aims for the largest batch that fits both the byte budget and the
+    latency target. The size changes by at most 2x per measurement.
+    """
+
+    def __init__(
+        self,
+        target_bytes: int = UPSERT_TARGET_BYTES,
+        target_latency: float = UPSERT_TARGET_LATENCY,
+        min_points: int = UPSERT_MIN_BATCH,
+        max_points: int = UPSERT_MAX_BATCH,
+        initial_points: int = UPSERT_INITIAL_BATCH,
+        smoothing: float = 0.3,
+    ):
+        self.target_bytes = target_bytes
+        self.target_latency = target_latency
+        self.min_points = min_points
+        self.max_points = max_points
+        self.size = max(min_points, min(initial_points, max_points))
+        self.smoothing = smoothing
+
+        self.batches = 0
+        self.points = 0
+        self.bytes = 0
+        self.min_size: Optional[int] = None
+        self.max_size: Optional[int] = None
+        self._latency_sum = 0.0
+        self._bytes_per_point: Optional[float] = None
+        self._seconds_per_byte: Optional[float] = None
+        self._first_sent: Optional[float] = None
+        self._last_done: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def cut(self, points: List[Dict]) -> Tuple[int, int]:
+        """
+        Returns (count, bytes) of the batch to cut from the front of
+        `points`: at most `size` points and, unless a single point exceeds
+        it, at most `target_bytes`.
+        """
+        count, total = 0, 0
+        for point in points[: self.size]:
+            size = point_bytes(point)
+            if count and total + size > self.target_bytes:
+                break
+            count += 1
+            total += size
+        return count, total
+
+    def _average(self, current: Optional[float], value: float) -> float:
+        if current is None:
+            return value
+        return current + self.smoothing * (value - current)
+
+    def record(self, points: int, nbytes: int, started: float, seconds: float) -> None:
+        """Feeds back one acknowledged upsert and adjusts the batch size."""
+        with self._lock:
+            self.batches += 1
+            self.points += points
+            self.bytes += nbytes
+            self._latency_sum += seconds
+            self.min_size = (
+                points if self.min_size is None else min(self.min_size, points)
+            )
+            self.max_size = (
+                points if self.max_size is None else max(self.max_size, points)
+            )
+            if self._first_sent is None or started < self._first_sent:
+                self._first_sent = started
+            self._last_done = max(self._last_done or 0.0, started + seconds)
+
+            self._bytes_per_point = self._average(
+                self._bytes_per_point, nbytes / points
+            )
+            if seconds > 0:
+                self._seconds_per_byte = self._average(
+                    self._seconds_per_byte, seconds / nbytes
+                )
+            budget = float(self.target_bytes)
+            if self._seconds_per_byte:
+                budget = min(budget, self.target_latency / self._seconds_per_byte)
+            wanted = int(budget / self._bytes_per_point)
+            size = max(self.size // 2, min(wanted, self.size * 2))
+            size = max(self.min_points, min(size, self.max_points))
+            if size != self.size:
+                logger.info(
+                    f"Upsert batch size {self.size} -> {size} points "
+                    f"({self._bytes_per_point / 1024:.1f} KB/point, "
+                    f"last batch {points} points in {seconds:.2f}s, "
+                    f"{self.throughput():.0f} points/s)"
+                )
+                self.size = size
+
+    def throughput(self) -> float:
+        """Points acknowledged per second of wall time since the first upsert."""
+        if self._first_sent is None or not self._last_done:
+            return 0.0
+        elapsed = self._last_done - self._first_sent
+        return self.points / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "points": self.points,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "mean_size": self.points / self.batches if self.batches else 0,
+                "final_size": self.size,
+                "mean_latency": (
+                    self._latency_sum / self.batches if self.batches else 0.0
+                ),
+                "mb_per_sec": (
+                    self.bytes / 1e6 / (self._last_done - self._first_sent)
+                    if self.batches and self._last_done > self._first_sent
+                    else 0.0
+                ),
+                "points_per_sec": self.throughput(),
+            }
+
+
+class UpsertWriter:
+    """Sends upsert batches to Qdrant with a bounded number of requests in flight."""
+
+    def __init__(
+        self,
+        client,
+        collection_name: str,
+        max_in_flight: int = UPSERT_MAX_IN_FLIGHT,
+        on_commit: Optional[Callable[[List[Dict]], None]] = None,
+        on_error: Optional[Callable[[List[Dict], Exception], None]] = None,
+        retries: int = 0,
+        backoff: float = UPSERT_BACKOFF_SECONDS,
+        dead_letter=None,
+        on_dead_letter: Optional[Callable[[List[Dict], Exception], None]] = None,
+        batch_sizer: Optional[AdaptiveBatchSizer] = None,
+        generation=None,
+    ):
+        """
+        Args:
+            client: Qdrant client used for the upserts
+            collection_name: Collection to write to
+            max_in_flight: Maximum number of unacknowledged upsert requests
+            on_commit: Called with each batch once Qdrant has accepted it
+            on_error: Called with a failed batch and its error. Without it,
+                the first error is re-raised by the next submit() or close().
+            retries: Times a failed batch is retried, with exponential
+                backoff starting at `backoff` seconds
+            dead_letter: DeadLetterQueue that keeps batches which still fail
+                after the retries; they then count as handled, not as errors
+            on_dead_letter: Called with each batch put in the dead-letter queue
+            batch_sizer: Cuts submitted points into adaptively sized batches.
+                Without it, every submit() is sent as one batch.
+            generation: IngestGeneration bumped after every accepted batch,
+                so readers drop the search results they cached
+        """
+        self.client = client
+        self.collection_name = collection_name
+        self.on_commit = on_commit
+        self.on_error = on_error
+        self.retries = retries
+        self.backoff = backoff
+        self.dead_letter = dead_letter
+        self.on_dead_letter = on_dead_letter
+        self.batch_sizer = batch_sizer
+        self.generation = generation
+        self.points_written = 0
+        self.batches_written = 0
+        self.points_dead_lettered = 0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="upsert"
+        )
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._futures: Set[Future] = set()
+        self._errors: List[Exception] = []
+        self._held: Optional[Tuple[List[Dict], Optional[int]]] = None
+        self._buffer: List[Dict] = []  # Points not yet cut into a batch
+        self._closed = False
+
+    @property
+    def in_flight(self) -> int:
+        """Number of batches sent but not yet acknowledged."""
+        with self._lock:
+            return len(self._futures)
+
+    def submit(self, points: List[Dict]) -> None:
+        """Queue a batch of point dicts, blocking while too many are in flight."""
+        if self._closed:
+            raise RuntimeError("UpsertWriter is closed")
+        self._raise_if_failed()
+        if not points:
+            return
+        if self.batch_sizer is None:
+            self._hold(list(points), None)
+            return
+        self._buffer.extend(points)
+        self._cut(final=False)
+
+    def _cut(self, final: bool) -> None:
+        """Cuts full batches off the buffer; with `final`, the rest too."""
+        while self._buffer:
+            count, nbytes = self.batch_sizer.cut(self._buffer)
+            full = count < len(self._buffer) or count >= self.batch_sizer.size
+            if not full and not final:
+                return  # Could still grow with the next submit()
+            batch, self._buffer = self._buffer[:count], self._buffer[count:]
+            self._hold(batch, nbytes)
+
+    def _hold(self, points: List[Dict], nbytes: Optional[int]) -> None:
+        if self._held is not None:
+            self._dispatch(*self._held, wait=False)
+        self._held = (points, nbytes)
+
+    def close(self) -> None:
+        """Send the held batch as a wait=True barrier and wait for everything."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._buffer and not self._errors:
+                self._cut(final=True)
+            self._drain()
+            if self._held is not None and not self._errors:
+                held, self._held = self._held, None
+                self._dispatch(*held, wait=True)
+                self._drain()
+        finally:
+            self._executor.shutdown(wait=True)
+        if self.batch_sizer is not None and self.batch_sizer.batches:
+            stats = self.batch_sizer.summary()
+            logger.info(
+                f"Upserted {stats['points']} points in {stats['batches']} batches "
+                f"of {stats['min_size']}-{stats['max_size']} points "
+                f"(mean {stats['mean_size']:.0f}, {stats['mean_latency']:.2f}s each), "
+                f"{stats['points_per_sec']:.0f} points/s"
+            )
+        self._raise_if_failed()
+
+    def abort(self) -> None:
+        """Drop the held batch and stop, without sending the barrier."""
+        if self._closed:
+            return
+        self._closed = True
+        self._held = None
+        self._buffer = []
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "UpsertWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't send the barrier for a run that is already failing.
+            self.abort()
+
+    def _dispatch(self, points: List[Dict], nbytes: Optional[int], wait: bool) -> None:
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._send, points, nbytes, wait)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._finished)
+
+    def _send(self, points: List[Dict], nbytes: Optional[int], wait: bool) -> None:
+        started = time.monotonic()
+        try:
+            upsert_with_retry(
+                self.client,
+                self.collection_name,
+                [to_point_struct(p) for p in points],
+                wait,
+                self.retries,
+                self.backoff,
+            )
+        except Exception as e:
+            if self._dead_letter(points, e):
+                return
+            if self.on_error is None:
+                raise
+            self.on_error(points, e)
+            return
+        # The barrier's latency includes indexing, so it is not a sample.
+        if self.batch_sizer is not None and nbytes is not None and not wait:
+            self.batch_sizer.record(
+                len(points), nbytes, started, time.monotonic() - started
+            )
+        with self._lock:
+            self.points_written += len(points)
+            self.batches_written += 1
+        if self.generation is not None:
+            bump_generation(self.generation)
+        if self.on_commit is not None:
+            self.on_commit(points)
+
+    def _dead_letter(self, points: List[Dict], error: Exception) -> bool:
+        if self.dead_letter is None:
+            return False
+        try:
+            self.dead_letter.add(self.collection_name, points, error)
+        except Exception as e:
+            logger.error(f"Could not write batch to the dead-letter queue: {e}")
+            return False
+        with self._lock:
+            self.points_dead_lettered += len(points)
+        if self.on_dead_letter is not None:
+            self.on_dead_letter(points, error)
+        return True
+
+    def _finished(self, future: Future) -> None:
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Upsert batch failed: {error}")
+        with self._lock:
+            if error is not None:
+                self._errors.append(error)
+            self._futures.discard(future)
+        self._slots.release()
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                pending = list(self._futures)
+            if not pending:
+                return
+            for future in pending:
+                try:
+                    future.result()
+                except Exception:
+                    pass  # Recorded by _finished()
+
+    def _raise_if_failed(self) -> None:
+        with self._lock:
+            if self._errors:
+                raise self._errors[0]